@@ -144,16 +144,36 @@ class Fahrtdurchfuehrung(db.Model):
     )
 
     abfahrt_zeit: so.Mapped[datetime] = so.mapped_column(sa.DateTime(), nullable=False)
+    # = letzte Ankunft (max FahrtHalt.ankunft_zeit), wird beim Anlegen/Neuaufbauen der Halte gesetzt
+    ende_zeit: so.Mapped[Optional[datetime]] = so.mapped_column(sa.DateTime(), nullable=True)
     price_factor: so.Mapped[float] = so.mapped_column(sa.Float, nullable=False, default=1.0)
 
     __table_args__ = (
         sa.CheckConstraint("price_factor >= 1", name="ck_fahrt_price_factor_ge1"),
+        # Overlap-Check: zug_id = ? AND abfahrt_zeit < ende AND ende_zeit > start
+        sa.Index("ix_fahrtdurchfuehrung_zug_zeitraum", "zug_id", "abfahrt_zeit", "ende_zeit"),
     )
 
     def __repr__(self):
         return f"<Fahrt {self.fahrt_id} status={self.status.value}>"
 
 
+class FahrtAenderung(db.Model):
+    """
+    Änderungsprotokoll für Fahrten (für den Delta-Snapshot ?since=<version>)
+    jede Zeile = "Fahrt fahrt_id wurde angelegt/geändert/gelöscht", seq ist die Version
+    (kein FK, weil gelöschte Fahrten drin bleiben müssen)
+    """
+    __tablename__ = "fahrt_aenderung"
+
+    seq: so.Mapped[int] = so.mapped_column(primary_key=True)
+    fahrt_id: so.Mapped[int] = so.mapped_column(sa.Integer, nullable=False, index=True)
+    zeitpunkt: so.Mapped[datetime] = so.mapped_column(sa.DateTime(), nullable=False, default=datetime.utcnow)
+
+    # seq darf nie wiederverwendet werden
+    __table_args__ = {"sqlite_autoincrement": True}
+
+
 class FahrtHalt(db.Model):
     __tablename__ = "fahrt_halt"
 
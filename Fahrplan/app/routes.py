@@ -9,11 +9,10 @@ from app.forms import (
     HalteplanCreateForm
 )
 
-from flask import render_template, flash, redirect, url_for, request, abort, jsonify
+from flask import render_template, flash, redirect, url_for, request, abort, jsonify, Response, stream_with_context
 from flask_login import current_user, login_user, logout_user, login_required
 from datetime import datetime, date, time, timedelta, timezone
 import sqlalchemy as sa
-from sqlalchemy.orm import aliased
 from app.models import (
     User,
     Mitarbeiter,
@@ -35,7 +34,6 @@ from app.models import (
 )
 from urllib.parse import urlsplit
 from functools import wraps
-from sqlalchemy import func, and_
 from app.services.strecken_import import sync_from_strecken
 from app.services.fahrt_refresh import refresh_fahrt_snapshot
 from app.services.halteplan_pricing import compute_min_cost_map, compute_min_duration_map, to_json_keyed_map
@@ -44,15 +42,20 @@ from app.services.fahrt_builder import rebuild_fahrt_halte_und_segmente
 from app.services.sync_flotte import sync_from_flotte
 from app.services.sync_wartungen import sync_wartungen_from_flotte
 from app.services.wartung_check import has_wartung_overlap, find_zug_fahrt_overlap
+from app.services.fahrt_aenderungen import aktuelle_version, geaendert_seit
+from app.services.fahrten_bulk import GeplanteFahrt, fahrten_bulk_anlegen
+from app.services.halteplan_vorlage import halteplan_vorlage, vorlage_verwerfen
+from app.services.snapshot_kompakt import KOMPAKT_MIMETYPE, encode_snapshot
 
 from app.services.fahrplan_helper import (
     generate_datetimes_interval,
     compute_fahrt_window,
     auto_assign_trains,
-    auto_assign_crew,
 )
+from app.services.crew_planung import crew_einteilen
 
 import requests
+import json
 
 def admin_required(view_func):
     @wraps(view_func)
@@ -287,136 +290,17 @@ def create_fahrt_internal(
     price_factor: float,
 ) -> Fahrtdurchfuehrung:
     """
-    Interne Create-Logik für eine Fahrtdurchführung.
-    Identisch zur bisherigen fahrten_new-Logik, aber:
+    Interne Create-Logik für eine Fahrtdurchführung (fahrten_bulk_anlegen mit einer Fahrt):
     - keine flash/redirect
     - Fehler via Exceptions (ValueError/RuntimeError)
     - KEIN commit (Caller entscheidet commit/rollback)
     """
-
-    if price_factor < 1.0:
-        raise ValueError("Preisfaktor muss ≥ 1.0 sein.")
-
-    # 1) Fahrtdurchführung anlegen
-    f = Fahrtdurchfuehrung(
+    [fahrt_id] = fahrten_bulk_anlegen(
         halteplan_id=halteplan_id,
-        zug_id=zug_id,
-        status=FahrtdurchfuehrungStatus.PLANMAESSIG,
-        verspaetung_min=0,
-        abfahrt_zeit=abfahrt_dt,
+        fahrten=[GeplanteFahrt(zug_id=zug_id, abfahrt=abfahrt_dt, mitarbeiter_ids=list(mitarbeiter_ids or []))],
         price_factor=price_factor,
     )
-    db.session.add(f)
-    db.session.flush()  # f.fahrt_id verfügbar
-
-    # 2) Dienstzuweisungen speichern
-    for mid in (mitarbeiter_ids or []):
-        db.session.add(Dienstzuweisung(fahrt_id=f.fahrt_id, mitarbeiter_id=mid))
-
-    # 3) Haltepunkte + Segmente aus Halteplan holen
-    hp_stops = (
-        db.session.query(Haltepunkt)
-        .filter(Haltepunkt.halteplan_id == f.halteplan_id)
-        .order_by(Haltepunkt.position)
-        .all()
-    )
-    if len(hp_stops) < 2:
-        raise ValueError("Der ausgewählte Halteplan hat zu wenige Haltepunkte.")
-
-    hp_segs = (
-        db.session.query(HalteplanSegment)
-        .filter(HalteplanSegment.halteplan_id == f.halteplan_id)
-        .order_by(HalteplanSegment.position)
-        .all()
-    )
-    if len(hp_segs) != (len(hp_stops) - 1):
-        raise ValueError("Halteplan-Segmente passen nicht zur Anzahl der Haltepunkte.")
-
-    # 4) FahrtHalt erzeugen
-    fahrt_halte: list[FahrtHalt] = []
-    for idx, hp_h in enumerate(hp_stops, start=1):
-        fh = FahrtHalt(
-            fahrt_id=f.fahrt_id,
-            bahnhof_id=hp_h.bahnhof_id,
-            position=idx,
-            ankunft_zeit=None,
-            abfahrt_zeit=None,
-        )
-        db.session.add(fh)
-        fahrt_halte.append(fh)
-
-    db.session.flush()  # IDs für von_halt_id / nach_halt_id
-
-    # 5) Zeiten berechnen + FahrtSegment erzeugen
-    current = f.abfahrt_zeit
-    fahrt_halte[0].ankunft_zeit = current
-    fahrt_halte[0].abfahrt_zeit = current
-
-    for i, hp_seg in enumerate(hp_segs):
-        from_h = fahrt_halte[i]
-        to_h = fahrt_halte[i + 1]
-
-        travel_min = int(hp_seg.duration_min or 0)
-        seg_arrival = current + timedelta(minutes=travel_min)
-
-        # next stop arrival
-        to_h.ankunft_zeit = seg_arrival
-
-        # dwell at "to" (außer letzter Halt)
-        is_last_stop = (i + 1) == (len(fahrt_halte) - 1)
-        if not is_last_stop:
-            dwell = int(hp_stops[i + 1].halte_dauer_min or 0)
-            to_h.abfahrt_zeit = seg_arrival + timedelta(minutes=dwell)
-        else:
-            to_h.abfahrt_zeit = None
-
-        # Segment speichern (Preis = base_price * price_factor)
-        base = float(hp_seg.base_price or 0.0)
-        final_price = round(base * float(f.price_factor or 1.0), 2)
-
-        db.session.add(
-            FahrtSegment(
-                fahrt_id=f.fahrt_id,
-                von_halt_id=from_h.id,
-                nach_halt_id=to_h.id,
-                position=i + 1,
-                final_price=final_price,
-                duration_min=travel_min,
-            )
-        )
-
-        # next loop current time = departure from "to" (oder arrival wenn letzter)
-        current = to_h.abfahrt_zeit or to_h.ankunft_zeit
-
-    fahrt_start = f.abfahrt_zeit
-    fahrt_end = current  # nach Loop: letzte Ankunft
-
-    # 6) Wartungs-Check
-    zug = db.session.get(Zug, f.zug_id)
-    if zug and has_wartung_overlap(zug.external_id, fahrt_start, fahrt_end):
-        raise RuntimeError(
-            "Konflikt: Der ausgewählte Zug hat in diesem Zeitraum eine Wartung."
-        )
-
-    # 7) Overlap-Check mit anderen Fahrtdurchführungen
-    with db.session.no_autoflush:
-        conflict = find_zug_fahrt_overlap(
-            zug_id=f.zug_id,
-            start_dt=fahrt_start,
-            end_dt=fahrt_end,
-            exclude_fahrt_id=f.fahrt_id,
-        )
-
-    if conflict:
-        raise RuntimeError(
-            f"Konflikt: Zug ist bereits in Fahrtdurchführung #{conflict.fahrt_id} "
-            f"({conflict.abfahrt_zeit}) belegt."
-        )
-
-    return f
-
-
-
+    return db.session.get(Fahrtdurchfuehrung, fahrt_id)
 
 
 @app.route("/fahrten/new", methods=["GET", "POST"])
@@ -608,12 +492,9 @@ def fahrt_edit(fahrt_id: int):
             flash(f"Fehler beim Neubauen der Fahrt-Halte/Segmente: {e}", "danger")
             return redirect(url_for("fahrt_edit", fahrt_id=fahrt_id))
 
-        # 7) Zeitraum bestimmen (ohne extra Endzeit-Spalte)
+        # 7) Zeitraum bestimmen (ende_zeit setzt der Neuaufbau)
         fahrt_start = fahrt.abfahrt_zeit
-        with db.session.no_autoflush:
-            fahrt_end = db.session.scalar(
-                sa.select(sa.func.max(FahrtHalt.ankunft_zeit)).where(FahrtHalt.fahrt_id == fahrt_id)
-            )
+        fahrt_end = fahrt.ende_zeit
         db.session.flush()
 
         if not fahrt_start or not fahrt_end:
@@ -716,10 +597,11 @@ def fahrten_bulk_preview():
     suggested_zug_ids = auto_assign_trains(windows, zuege)
 
     mitarbeiter_ids = [m.id for m in Mitarbeiter.query.order_by(Mitarbeiter.name).all()]
-    crew_assignments = auto_assign_crew(
-        mitarbeiter_ids=mitarbeiter_ids,
-        crew_size=crew_size,
-        num_fahrten=len(windows),
+    crew_assignments = crew_einteilen(
+        windows,
+        mitarbeiter_ids,
+        crew_size,
+        ruhezeit_min=int(app.config.get("CREW_RUHEZEIT_MIN", 30)),
         seed=42,
     )
 
@@ -730,6 +612,8 @@ def fahrten_bulk_preview():
 
         if zug_id is None:
             errors.append("Kein Zug verfügbar")
+        if len(crew_assignments[idx]) < crew_size:
+            errors.append("Nicht genug Personal frei")
 
         preview_rows.append({
             "index": idx,
@@ -768,9 +652,9 @@ def fahrten_bulk_create():
     if price_factor < 1.0:
         price_factor = 1.0
 
-    created = 0
-
     try:
+        # erst alle Zeilen lesen, dann alles in einem Rutsch anlegen
+        geplant: list[GeplanteFahrt] = []
         i = 0
         while True:
             start_key = f"start_{i}"
@@ -788,17 +672,15 @@ def fahrten_bulk_create():
 
             crew_ids = [int(x) for x in request.form.getlist(f"crew_{i}")]
 
-            create_fahrt_internal(
-                halteplan_id=halteplan_id,
-                zug_id=zug_id,
-                abfahrt_dt=start_dt,
-                mitarbeiter_ids=crew_ids,
-                price_factor=price_factor,
-            )
-
-            created += 1
+            geplant.append(GeplanteFahrt(zug_id=zug_id, abfahrt=start_dt, mitarbeiter_ids=crew_ids))
             i += 1
 
+        created = len(fahrten_bulk_anlegen(
+            halteplan_id=halteplan_id,
+            fahrten=geplant,
+            price_factor=price_factor,
+        ))
+
         if created == 0:
             raise ValueError("Keine Fahrten zum Anlegen übergeben.")
 
@@ -896,6 +778,36 @@ def fahrt_mitarbeiter(fahrt_id):
         form=form,
     )
 
+def _start_ende_pro_fahrt(fahrten: list[Fahrtdurchfuehrung]) -> dict[int, tuple]:
+    """
+    fahrt_id -> (Start-Bahnhof, Abfahrt, End-Bahnhof, Ankunft)
+    Zeiten = abfahrt_zeit/ende_zeit der Fahrt, Bahnhöfe = erster/letzter Haltepunkt vom Halteplan
+    (ändern sich beim Bearbeiten nicht). Statt Start-/End-Halt per MIN/MAX(position) Subquery
+    über alle FahrtHalte nur noch eine Query für die Bahnhofsnamen.
+    Fahrten ohne Halte (ende_zeit leer) oder mit kaputtem Halteplan fehlen, wie vorher.
+    """
+    enden: dict[int, tuple[int, int]] = {}
+    for f in fahrten:
+        if f.ende_zeit is None:
+            continue
+        try:
+            v = halteplan_vorlage(f.halteplan_id)
+        except ValueError:
+            continue
+        enden[f.fahrt_id] = (v.bahnhof_ids[0], v.bahnhof_ids[-1])
+
+    bahnhof_ids = {b for paar in enden.values() for b in paar}
+    namen = dict(db.session.execute(
+        sa.select(Bahnhof.id, Bahnhof.name).where(Bahnhof.id.in_(bahnhof_ids))
+    ).all()) if bahnhof_ids else {}
+
+    return {
+        f.fahrt_id: (namen.get(enden[f.fahrt_id][0]), f.abfahrt_zeit, namen.get(enden[f.fahrt_id][1]), f.ende_zeit)
+        for f in fahrten
+        if f.fahrt_id in enden
+    }
+
+
 @app.route("/meine_fahrten")
 @login_required
 def meine_fahrten():
@@ -913,61 +825,12 @@ def meine_fahrten():
         .all()
     )
 
-    fahrt_ids = [f.fahrt_id for f in fahrten]
+    # Start/Ende: Zeiten stehen an der Fahrt, Bahnhöfe aus der Halteplan-Vorlage
     start_info = {}
     end_info = {}
-
-    if fahrt_ids:
-        # START: position == 1
-        start_rows = (
-            db.session.query(
-                FahrtHalt.fahrt_id,
-                Bahnhof.name,
-                FahrtHalt.abfahrt_zeit,
-                FahrtHalt.ankunft_zeit,
-            )
-            .join(Bahnhof, Bahnhof.id == FahrtHalt.bahnhof_id)
-            .filter(FahrtHalt.fahrt_id.in_(fahrt_ids))
-            .filter(FahrtHalt.position == 1)
-            .all()
-        )
-
-        for fid, bname, abf, ank in start_rows:
-            start_info[fid] = {
-                "bahnhof": bname,
-                "zeit": abf or ank,  # fallback falls abfahrt_zeit NULL wäre
-            }
-
-        # ENDE: max(position) pro fahrt
-        subq = (
-            db.session.query(
-                FahrtHalt.fahrt_id.label("fahrt_id"),
-                func.max(FahrtHalt.position).label("max_pos"),
-            )
-            .filter(FahrtHalt.fahrt_id.in_(fahrt_ids))
-            .group_by(FahrtHalt.fahrt_id)
-            .subquery()
-        )
-
-        end_rows = (
-            db.session.query(
-                FahrtHalt.fahrt_id,
-                Bahnhof.name,
-                FahrtHalt.ankunft_zeit,
-            )
-            .join(subq, and_(
-                FahrtHalt.fahrt_id == subq.c.fahrt_id,
-                FahrtHalt.position == subq.c.max_pos
-            ))
-            .join(Bahnhof, Bahnhof.id == FahrtHalt.bahnhof_id)
-            .all()
-        )
-
-        for fid, bname, ank in end_rows:
-            end_info[fid] = {
-                "bahnhof": bname,
-                "zeit": ank,
-            }
+    for fid, (start_b, start_zeit, end_b, end_zeit) in _start_ende_pro_fahrt(fahrten).items():
+        start_info[fid] = {"bahnhof": start_b, "zeit": start_zeit}
+        end_info[fid] = {"bahnhof": end_b, "zeit": end_zeit}
 
     return render_template(
         "meine_fahrten.html",
@@ -1001,68 +864,14 @@ def fahrten_alle():
     }
 
     # 3) Start-/Endhalt pro Fahrt
-    FH_start = aliased(FahrtHalt)
-    FH_end = aliased(FahrtHalt)
-    B_start = aliased(Bahnhof)
-    B_end = aliased(Bahnhof)
-
-    # min/max Position je fahrt_id
-    pos_subq = (
-        db.session.query(
-            FahrtHalt.fahrt_id.label("fahrt_id"),
-            sa.func.min(FahrtHalt.position).label("min_pos"),
-            sa.func.max(FahrtHalt.position).label("max_pos"),
-        )
-        .group_by(FahrtHalt.fahrt_id)
-        .subquery()
-    )
-
-    rows = (
-        db.session.query(
-            Fahrtdurchfuehrung.fahrt_id.label("fahrt_id"),
-
-            # Start
-            B_start.name.label("start_bahnhof"),
-            FH_start.abfahrt_zeit.label("start_abfahrt_zeit"),
-
-            # Ende
-            B_end.name.label("end_bahnhof"),
-            FH_end.ankunft_zeit.label("end_ankunft_zeit"),
-        )
-        .join(pos_subq, pos_subq.c.fahrt_id == Fahrtdurchfuehrung.fahrt_id)
-
-        # Start-Halt (Position = min_pos)
-        .join(
-            FH_start,
-            sa.and_(
-                FH_start.fahrt_id == Fahrtdurchfuehrung.fahrt_id,
-                FH_start.position == pos_subq.c.min_pos,
-            ),
-        )
-        .join(B_start, B_start.id == FH_start.bahnhof_id)
-
-        # End-Halt (Position = max_pos)
-        .join(
-            FH_end,
-            sa.and_(
-                FH_end.fahrt_id == Fahrtdurchfuehrung.fahrt_id,
-                FH_end.position == pos_subq.c.max_pos,
-            ),
-        )
-        .join(B_end, B_end.id == FH_end.bahnhof_id)
-
-        .all()
-    )
-
-    # Map: fahrt_id -> start/end infos
     start_end_map = {
-        r.fahrt_id: {
-            "start_bahnhof": r.start_bahnhof,
-            "start_abfahrt_zeit": r.start_abfahrt_zeit,
-            "end_bahnhof": r.end_bahnhof,
-            "end_ankunft_zeit": r.end_ankunft_zeit,
+        fid: {
+            "start_bahnhof": start_b,
+            "start_abfahrt_zeit": start_zeit,
+            "end_bahnhof": end_b,
+            "end_ankunft_zeit": end_zeit,
         }
-        for r in rows
+        for fid, (start_b, start_zeit, end_b, end_zeit) in _start_ende_pro_fahrt(fahrten).items()
     }
 
     return render_template(
@@ -1426,6 +1235,7 @@ def halteplan_edit(halteplan_id: int):
             )
 
         db.session.commit()
+        vorlage_verwerfen(halteplan_id)
         flash("Halteplan wurde aktualisiert.", "success")
         return redirect(url_for("halteplaene_list"))
 
@@ -1495,6 +1305,7 @@ def halteplan_delete(halteplan_id: int):
 
     db.session.delete(hp)
     db.session.commit()
+    vorlage_verwerfen(halteplan_id)
     flash("Halteplan wurde gelöscht (inkl. Haltepunkte, Segmente, Fahrten).", "success")
     return redirect(url_for("halteplaene_list"))
 
@@ -1546,70 +1357,195 @@ def api_sync_wartungen():
 
 # API by Daniel
 
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def _snapshot_halt_json(halt_id, pos, bahnhof_id, bahnhof_name, ankunft, abfahrt, final_price) -> dict:
+    return {
+        "haltId": int(halt_id),
+        "order": int(pos),
+        "bahnhofId": int(bahnhof_id),
+        "bahnhofName": bahnhof_name,
+        "planAnkunft": ankunft.isoformat() if ankunft else None,
+        "planAbfahrt": abfahrt.isoformat() if abfahrt else None,
+        # tarif = Preis vom Segment, das an diesem Halt ankommt (erster Halt: 0)
+        "tarif": 0.0 if int(pos) == 1 else float(final_price or 0.0),
+    }
+
+
+def _snapshot_ndjson(fahrt_filter: list, version: int, since: int | None, geaendert: set[int]) -> Response:
+    """
+    Snapshot als NDJSON (eine Fahrt pro Zeile), gestreamt aus EINER Query mit Server-Side-Cursor
+    -> Speicher bleibt konstant, erste Fahrt geht raus bevor die letzte gelesen ist
+    letzte Zeile = Meta: {"version", "total"} (+ "since", "deleted" beim Delta)
+    """
+    stmt = (
+        sa.select(
+            Fahrtdurchfuehrung.fahrt_id,
+            Fahrtdurchfuehrung.halteplan_id,
+            Fahrtdurchfuehrung.zug_id,
+            FahrtHalt.id.label("halt_id"),
+            FahrtHalt.bahnhof_id,
+            FahrtHalt.position.label("pos"),
+            Bahnhof.name.label("bahnhof_name"),
+            FahrtHalt.ankunft_zeit.label("ankunft"),
+            FahrtHalt.abfahrt_zeit.label("abfahrt"),
+            FahrtSegment.final_price,
+        )
+        .outerjoin(FahrtHalt, FahrtHalt.fahrt_id == Fahrtdurchfuehrung.fahrt_id)
+        .outerjoin(Bahnhof, Bahnhof.id == FahrtHalt.bahnhof_id)
+        .outerjoin(FahrtSegment, FahrtSegment.nach_halt_id == FahrtHalt.id)
+        .where(*fahrt_filter)
+        .order_by(Fahrtdurchfuehrung.fahrt_id.asc(), FahrtHalt.position.asc())
+        .execution_options(yield_per=1000)
+    )
+
+    def generate():
+        gesendet: set[int] = set()
+        fahrt = None
+        for r in db.session.execute(stmt):
+            if fahrt is None or fahrt["fahrtdurchfuehrungId"] != r.fahrt_id:
+                if fahrt is not None:
+                    yield json.dumps(fahrt, separators=(",", ":")) + "\n"
+                gesendet.add(int(r.fahrt_id))
+                fahrt = {
+                    "fahrtdurchfuehrungId": int(r.fahrt_id),
+                    "halteplanId": int(r.halteplan_id),
+                    "zugId": int(r.zug_id or 0),
+                    "haltepunkte": [],
+                }
+            if r.halt_id is not None:
+                fahrt["haltepunkte"].append(_snapshot_halt_json(
+                    r.halt_id, r.pos, r.bahnhof_id, r.bahnhof_name, r.ankunft, r.abfahrt, r.final_price,
+                ))
+        if fahrt is not None:
+            yield json.dumps(fahrt, separators=(",", ":")) + "\n"
+
+        meta = {"version": version, "total": len(gesendet)}
+        if since is not None:
+            meta["since"] = since
+            meta["deleted"] = sorted(geaendert - gesendet)
+        yield json.dumps(meta, separators=(",", ":")) + "\n"
+
+    resp = Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+    resp.headers["X-Fahrplan-Version"] = str(version)
+    return resp
+
+
 @app.route("/api/fahrtdurchfuehrungen/snapshot", methods=["GET"])
 def api_fahrtdurchfuehrungen_snapshot():
-    def dt(v):
-        return v.isoformat() if v else None
+    """
+    Snapshot aller Fahrten inkl. Halte + Tarif
+    Optionale Parameter:
+        from=YYYY-MM-DD, to=YYYY-MM-DD  nur Fahrten mit Abfahrt in dem Zeitraum (inklusive)
+        since=<version>                 Delta: nur Fahrten die seit version angelegt/geändert wurden,
+                                        gelöschte (bzw. nicht mehr im Zeitraum) stehen in "deleted"
+    "version" in der Antwort ist beim nächsten Delta als since mitzugeben
+    Mit "Accept: application/x-ndjson" (oder ?format=ndjson) kommt der Snapshot gestreamt als NDJSON,
+    mit "Accept: application/vnd.fahrplan.kompakt" (oder ?format=kompakt) spaltenweise binär
+    (Format siehe services/snapshot_kompakt.py)
+    """
+    try:
+        von = date.fromisoformat(request.args["from"]) if request.args.get("from") else None
+        bis = date.fromisoformat(request.args["to"]) if request.args.get("to") else None
+        since = int(request.args["since"]) if request.args.get("since") else None
+    except ValueError:
+        return jsonify({"error": "from/to müssen YYYY-MM-DD sein, since eine Zahl"}), 400
+
+    # Version VOR den Daten lesen: was danach passiert, kommt beim nächsten Delta nochmal
+    version = aktuelle_version()
+    if since is not None and since > version:
+        return jsonify({"error": f"since={since} ist neuer als die aktuelle Version {version}"}), 400
+
+    fahrt_filter = []
+    if von:
+        fahrt_filter.append(Fahrtdurchfuehrung.abfahrt_zeit >= datetime.combine(von, time.min))
+    if bis:
+        fahrt_filter.append(Fahrtdurchfuehrung.abfahrt_zeit < datetime.combine(bis + timedelta(days=1), time.min))
+
+    geaendert: set[int] = set()
+    if since is not None:
+        geaendert = geaendert_seit(since)
+        fahrt_filter.append(Fahrtdurchfuehrung.fahrt_id.in_(geaendert))
+
+    formate = {"json": "application/json", "ndjson": NDJSON_MIMETYPE, "kompakt": KOMPAKT_MIMETYPE}
+    mimetype = formate.get(request.args.get("format") or "") \
+        or request.accept_mimetypes.best_match(list(formate.values())) \
+        or "application/json"
+    if mimetype == NDJSON_MIMETYPE:
+        return _snapshot_ndjson(fahrt_filter, version, since, geaendert)
+
+    # Halte/Segmente nur für die ausgewählten Fahrten
+    fahrt_ids_subq = sa.select(Fahrtdurchfuehrung.fahrt_id).where(*fahrt_filter)
+
+    # 3 Queries statt 2 pro Fahrt (+ Version): Fahrten, alle Halte (+Bahnhof), alle Segmente
+    fahrten = db.session.execute(
+        sa.select(
+            Fahrtdurchfuehrung.fahrt_id,
+            Fahrtdurchfuehrung.halteplan_id,
+            Fahrtdurchfuehrung.zug_id,
+        )
+        .where(*fahrt_filter)
+        .order_by(Fahrtdurchfuehrung.fahrt_id.asc())
+    ).all()
+
+    # Halte (mit Bahnhofnamen), sortiert nach Fahrt + Position
+    halte_rows = db.session.execute(
+        sa.select(
+            FahrtHalt.fahrt_id.label("fahrt_id"),
+            FahrtHalt.id.label("halt_id"),
+            FahrtHalt.bahnhof_id.label("bahnhof_id"),
+            FahrtHalt.position.label("pos"),
+            Bahnhof.name.label("bahnhof_name"),
+            FahrtHalt.ankunft_zeit.label("ankunft"),
+            FahrtHalt.abfahrt_zeit.label("abfahrt"),
+        )
+        .join(Bahnhof, Bahnhof.id == FahrtHalt.bahnhof_id)
+        .where(FahrtHalt.fahrt_id.in_(fahrt_ids_subq))
+        .order_by(FahrtHalt.fahrt_id.asc(), FahrtHalt.position.asc())
+    ).all()
 
-    # alle Fahrten laden
-    fahrten = db.session.scalars(
-        sa.select(Fahrtdurchfuehrung).order_by(Fahrtdurchfuehrung.fahrt_id.asc())
+    # Segmente (Preis je Segment), map: nach_halt_id -> final_price
+    seg_rows = db.session.execute(
+        sa.select(
+            FahrtSegment.nach_halt_id,
+            FahrtSegment.final_price,
+        ).where(FahrtSegment.fahrt_id.in_(fahrt_ids_subq))
     ).all()
 
-    items = []
+    price_by_nach_halt = {int(r.nach_halt_id): float(r.final_price or 0.0) for r in seg_rows}
 
-    for f in fahrten:
-        # Halte (mit Bahnhofnamen)
-        halte_rows = db.session.execute(
-            sa.select(
-                FahrtHalt.id.label("halt_id"),
-                FahrtHalt.bahnhof_id.label("bahnhof_id"),
-                FahrtHalt.position.label("pos"),
-                Bahnhof.name.label("bahnhof_name"),
-                FahrtHalt.ankunft_zeit.label("ankunft"),
-                FahrtHalt.abfahrt_zeit.label("abfahrt"),
-            )
-            .join(Bahnhof, Bahnhof.id == FahrtHalt.bahnhof_id)
-            .where(FahrtHalt.fahrt_id == f.fahrt_id)
-            .order_by(FahrtHalt.position.asc())
-        ).all()
-
-        # Segmente (Preis je Segment), map: nach_halt_id -> final_price
-        seg_rows = db.session.execute(
-            sa.select(
-                FahrtSegment.nach_halt_id,
-                FahrtSegment.final_price,
-                FahrtSegment.position,
-            )
-            .where(FahrtSegment.fahrt_id == f.fahrt_id)
-            .order_by(FahrtSegment.position.asc())
-        ).all()
-
-        price_by_nach_halt = {int(r.nach_halt_id): float(r.final_price or 0.0) for r in seg_rows}
-
-        haltepunkte = []
-        for r in halte_rows:
-            halt_id = int(r.halt_id)
-            pos = int(r.pos)
-
-            haltepunkte.append({
-                "haltId": halt_id,
-                "order": pos,
-                "bahnhofId": int(r.bahnhof_id),
-                "bahnhofName": r.bahnhof_name,
-                "planAnkunft": dt(r.ankunft),
-                "planAbfahrt": dt(r.abfahrt),
-                "tarif": 0.0 if pos == 1 else float(price_by_nach_halt.get(halt_id, 0.0)),
-            })
+    meta: dict = {"version": version}
+    if since is not None:
+        meta["since"] = since
+        meta["deleted"] = sorted(geaendert - {int(f.fahrt_id) for f in fahrten})
+
+    if mimetype == KOMPAKT_MIMETYPE:
+        resp = Response(encode_snapshot(fahrten, halte_rows, price_by_nach_halt, meta), mimetype=KOMPAKT_MIMETYPE)
+        resp.add_etag()
+        return resp.make_conditional(request)
 
+    # in Python nach Fahrt gruppieren
+    haltepunkte_by_fahrt: dict[int, list[dict]] = {}
+    for r in halte_rows:
+        haltepunkte_by_fahrt.setdefault(int(r.fahrt_id), []).append(_snapshot_halt_json(
+            r.halt_id, r.pos, r.bahnhof_id, r.bahnhof_name, r.ankunft, r.abfahrt,
+            price_by_nach_halt.get(int(r.halt_id), 0.0),
+        ))
+
+    items = []
+    for f in fahrten:
         items.append({
             "fahrtdurchfuehrungId": int(f.fahrt_id),
             "halteplanId": int(f.halteplan_id),
             "zugId": int(f.zug_id or 0),
-            "haltepunkte": haltepunkte,
+            "haltepunkte": haltepunkte_by_fahrt.get(int(f.fahrt_id), []),
         })
 
-    return jsonify({"total": len(items), "items": items}), 200
+    resp = jsonify({**meta, "total": len(items), "items": items})
+    # ETag über den Inhalt: Ticket-Cache fragt mit If-None-Match und bekommt ggf. 304
+    resp.add_etag()
+    return resp.make_conditional(request)
 
 # API by Daniel Aktion Halteplan
 
@@ -0,0 +1,105 @@
+"""
+Personal-Einteilung für geplante Fahrten (Bulk-Preview)
+
+Bisher (auto_assign_crew): pro Fahrt alle Mitarbeiter nach (Anzahl, Zufall) sortieren und die
+ersten crew_size nehmen - egal ob die Person gleichzeitig schon auf einer anderen Fahrt sitzt.
+
+Jetzt:
+    - bestehende Dienstzuweisungen im Zeitraum einmal laden (eine Query), pro Mitarbeiter
+      als sortierte Intervalle (Intervalle aus wartung_check)
+    - Fahrten nach Start abarbeiten, zwei Heaps:
+        frei:   (Anzahl Fahrten, Zufall, mid)  -> wer am wenigsten hat kommt zuerst dran
+        belegt: (frei_ab, Anzahl, mid)         -> frei_ab = Ende der letzten neuen Fahrt + Ruhezeit
+      vor jeder Fahrt wandert aus "belegt" zurück nach "frei", wer bis zum Start wieder frei ist
+    - bestehende Zuweisungen: Überschneidung inkl. Ruhezeit davor/danach -> Person überspringen
+Pro Fahrt also O(crew_size * log n) statt alle Mitarbeiter sortieren.
+"""
+
+from __future__ import annotations
+
+import heapq
+import random
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+from app import db
+from app.models import Dienstzuweisung, Fahrtdurchfuehrung
+from app.services.wartung_check import Intervalle
+
+DEFAULT_RUHEZEIT_MIN = 30
+
+
+def _bestehende_dienste(mitarbeiter_ids: list[int], von: datetime, bis: datetime) -> dict[int, Intervalle]:
+    dienste: dict[int, Intervalle] = {}
+    if not mitarbeiter_ids:
+        return dienste
+    for r in db.session.execute(
+        sa.select(Dienstzuweisung.mitarbeiter_id, Fahrtdurchfuehrung.abfahrt_zeit, Fahrtdurchfuehrung.ende_zeit)
+        .join(Fahrtdurchfuehrung, Fahrtdurchfuehrung.fahrt_id == Dienstzuweisung.fahrt_id)
+        .where(
+            Dienstzuweisung.mitarbeiter_id.in_(mitarbeiter_ids),
+            Fahrtdurchfuehrung.abfahrt_zeit < bis,
+            Fahrtdurchfuehrung.ende_zeit > von,
+        )
+    ):
+        dienste.setdefault(r.mitarbeiter_id, Intervalle()).einfuegen(r.abfahrt_zeit, r.ende_zeit, None)
+    return dienste
+
+
+def crew_einteilen(
+    windows: list[tuple[datetime, datetime]],   # [(start,end), ...] in gleicher Reihenfolge wie geplante Fahrten
+    mitarbeiter_ids: list[int],
+    crew_size: int,
+    ruhezeit_min: int = DEFAULT_RUHEZEIT_MIN,
+    seed: int | None = None,
+) -> list[list[int]]:
+    """
+    Pro Fahrt bis zu crew_size Mitarbeiter, die nicht gleichzeitig (inkl. Ruhezeit) schon
+    eingeteilt sind. Weniger als crew_size = nicht genug Personal frei (Caller markiert das).
+    """
+    if crew_size <= 0:
+        return [[] for _ in windows]
+    if crew_size > len(mitarbeiter_ids):
+        raise ValueError("Crew-Größe größer als verfügbare Mitarbeiter.")
+
+    result: list[list[int]] = [[] for _ in windows]
+    if not windows:
+        return result
+
+    ruhe = timedelta(minutes=max(0, ruhezeit_min))
+    dienste = _bestehende_dienste(
+        mitarbeiter_ids,
+        min(s for s, _e in windows) - ruhe,
+        max(e for _s, e in windows) + ruhe,
+    )
+
+    # Last = schon vorhandene Dienste im Zeitraum, damit die fair mitgezählt werden
+    rng = random.Random(seed)
+    frei = [(len(dienste[m].eintraege) if m in dienste else 0, rng.random(), m) for m in mitarbeiter_ids]
+    heapq.heapify(frei)
+    belegt: list[tuple[datetime, int, int]] = []       # (frei_ab, last, mid)
+
+    for idx in sorted(range(len(windows)), key=lambda i: windows[i][0]):
+        start_dt, end_dt = windows[idx]
+        while belegt and belegt[0][0] <= start_dt:
+            _frei_ab, last, mid = heapq.heappop(belegt)
+            heapq.heappush(frei, (last, rng.random(), mid))
+
+        crew, uebersprungen = [], []
+        while frei and len(crew) < crew_size:
+            eintrag = heapq.heappop(frei)
+            mid = eintrag[2]
+            d = dienste.get(mid)
+            if d is not None and d.erster_ueberlapp(start_dt - ruhe, end_dt + ruhe) is not None:
+                uebersprungen.append(eintrag)
+                continue
+            crew.append(eintrag)
+
+        for eintrag in uebersprungen:
+            heapq.heappush(frei, eintrag)
+        for last, _r, mid in crew:
+            heapq.heappush(belegt, (end_dt + ruhe, last + 1, mid))
+        result[idx] = [mid for _l, _r, mid in crew]
+
+    return result
@@ -1,11 +1,11 @@
 from __future__ import annotations
 
 from datetime import datetime, date, time, timedelta
-import random
 
 from app import db
-from app.models import Zug, Haltepunkt, HalteplanSegment
-from app.services.wartung_check import has_wartung_overlap, find_zug_fahrt_overlap
+from app.models import Zug
+from app.services.halteplan_vorlage import halteplan_vorlage
+from app.services.wartung_check import ZugBelegung, has_wartung_overlap, find_zug_fahrt_overlap
 
 def generate_datetimes_interval(
     start_date: date,
@@ -37,34 +37,8 @@ def generate_datetimes_interval(
 
 
 def compute_fahrt_window(halteplan_id: int, start_dt: datetime) -> tuple[datetime, datetime]:
-    hp_stops = (
-        db.session.query(Haltepunkt)
-        .filter(Haltepunkt.halteplan_id == halteplan_id)
-        .order_by(Haltepunkt.position)
-        .all()
-    )
-    hp_segs = (
-        db.session.query(HalteplanSegment)
-        .filter(HalteplanSegment.halteplan_id == halteplan_id)
-        .order_by(HalteplanSegment.position)
-        .all()
-    )
-
-    if len(hp_stops) < 2:
-        raise ValueError("Halteplan benötigt mindestens 2 Haltepunkte.")
-    if len(hp_segs) != (len(hp_stops) - 1):
-        raise ValueError("Halteplan-Segmente passen nicht zur Anzahl der Haltepunkte.")
-
-    cur = start_dt
-    for i, seg in enumerate(hp_segs):
-        cur += timedelta(minutes=int(seg.duration_min or 0))
-
-        # Haltezeit am Zielhalt (außer letzter)
-        is_last_stop = (i + 1) == (len(hp_stops) - 1)
-        if not is_last_stop:
-            cur += timedelta(minutes=int(hp_stops[i + 1].halte_dauer_min or 0))
-
-    return start_dt, cur
+    # Vorlage aus dem Cache -> für viele Abfahrten nur noch Addition
+    return halteplan_vorlage(halteplan_id).fenster(start_dt)
 
 
 def is_zug_available(zug: Zug, start_dt: datetime, end_dt: datetime) -> tuple[bool, str | None]:
@@ -91,53 +65,29 @@ def auto_assign_trains(
     windows: list[tuple[datetime, datetime]],   # [(start,end), ...] in gleicher Reihenfolge wie geplante Fahrten
     zuege: list[Zug],
 ) -> list[int | None]:
-    assigned: list[int | None] = []
-    local_alloc: dict[int, list[tuple[datetime, datetime]]] = {z.id: [] for z in zuege}
-
-    for start_dt, end_dt in windows:
-        chosen = None
+    """
+    Pro Fahrt der erste freie Zug (Reihenfolge wie zuege), Fahrten nach Startzeit abgearbeitet
+    (bei sortierten Fenstern = wie bisher, sonst nie schlechter).
+    Wartungen + bestehende Fahrten aller Züge im ganzen Zeitraum einmal laden (ZugBelegung,
+    2 Queries), danach nur noch bisect im Speicher statt is_zug_available pro (Fahrt, Zug).
+    """
+    assigned: list[int | None] = [None] * len(windows)
+    if not windows or not zuege:
+        return assigned
+
+    belegung = ZugBelegung.laden(
+        [z.id for z in zuege],
+        min(s for s, _e in windows),
+        max(e for _s, e in windows),
+    )
 
+    for idx in sorted(range(len(windows)), key=lambda i: windows[i][0]):
+        start_dt, end_dt = windows[idx]
         for z in zuege:
-            ok, _reason = is_zug_available(z, start_dt, end_dt)
-            if not ok:
-                continue
-
-            # lokaler Preview-Konflikt mit bereits zugewiesenen
-            local_conflict = any(overlaps(start_dt, end_dt, s, e) for s, e in local_alloc[z.id])
-            if local_conflict:
-                continue
-
-            chosen = z.id
-            local_alloc[z.id].append((start_dt, end_dt))
-            break
-
-        assigned.append(chosen)
+            if belegung.konflikt(z.id, start_dt, end_dt) is None:
+                # lokal belegen -> spätere Fahrten sehen die Zuweisung
+                belegung.belegen(z.id, start_dt, end_dt, ("neu", idx))
+                assigned[idx] = z.id
+                break
 
     return assigned
-
-
-
-def auto_assign_crew(
-    mitarbeiter_ids: list[int],
-    crew_size: int,
-    num_fahrten: int,
-    seed: int | None = None,
-) -> list[list[int]]:
-    if crew_size <= 0:
-        return [[] for _ in range(num_fahrten)]
-    if crew_size > len(mitarbeiter_ids):
-        raise ValueError("Crew-Größe größer als verfügbare Mitarbeiter.")
-
-    rng = random.Random(seed)
-    counts = {mid: 0 for mid in mitarbeiter_ids}
-    result: list[list[int]] = []
-
-    for _ in range(num_fahrten):
-        # sort by (count, random) → fair
-        mids = sorted(mitarbeiter_ids, key=lambda m: (counts[m], rng.random()))
-        pick = mids[:crew_size]
-        for m in pick:
-            counts[m] += 1
-        result.append(pick)
-
-    return result
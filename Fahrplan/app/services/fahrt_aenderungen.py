@@ -0,0 +1,81 @@
+"""
+Änderungsverfolgung für Fahrten (Grundlage für den Delta-Snapshot)
+
+Jede Fahrt die angelegt, geändert (Status/Verspätung/Edit) oder gelöscht wird, oder deren
+FahrtHalt/FahrtSegment neu geschrieben werden, bekommt eine Zeile in fahrt_aenderung.
+    - passiert automatisch über ORM-Events (insert/update/delete) beim flush
+    - Core-Inserts (sa.insert(...) ohne ORM) lösen keine Events aus -> dort
+      fahrten_als_geaendert_markieren() selbst aufrufen
+    - Version = höchste seq im Protokoll
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, Set
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from sqlalchemy import event
+
+from app import db
+from app.models import FahrtAenderung, Fahrtdurchfuehrung, FahrtHalt, FahrtSegment
+
+
+_SESSION_KEY = "fahrt_aenderungen"
+
+
+def fahrten_als_geaendert_markieren(conn, fahrt_ids: Iterable[int]) -> None:
+    """schreibt für jede fahrt_id eine Zeile ins Änderungsprotokoll (gleiche Transaktion wie conn)"""
+    rows = [{"fahrt_id": int(fid)} for fid in sorted(set(fahrt_ids))]
+    if rows:
+        conn.execute(sa.insert(FahrtAenderung), rows)
+
+
+def aktuelle_version() -> int:
+    return int(db.session.scalar(sa.select(sa.func.max(FahrtAenderung.seq))) or 0)
+
+
+def geaendert_seit(version: int) -> Set[int]:
+    """alle fahrt_ids mit Änderungen nach version"""
+    return set(db.session.scalars(
+        sa.select(FahrtAenderung.fahrt_id)
+        .where(FahrtAenderung.seq > version)
+        .distinct()
+    ))
+
+
+# ---------------------------------------------------
+#  ORM-Events: geänderte fahrt_ids pro Session sammeln
+# ---------------------------------------------------
+
+def _merken(target, fahrt_id) -> None:
+    session = so.object_session(target)
+    if session is not None and fahrt_id is not None:
+        session.info.setdefault(_SESSION_KEY, set()).add(int(fahrt_id))
+
+
+@event.listens_for(Fahrtdurchfuehrung, "after_insert")
+@event.listens_for(Fahrtdurchfuehrung, "after_update")
+@event.listens_for(Fahrtdurchfuehrung, "after_delete")
+def _fahrt_geaendert(mapper, connection, target):
+    _merken(target, target.fahrt_id)
+
+
+@event.listens_for(FahrtHalt, "after_insert")
+@event.listens_for(FahrtHalt, "after_update")
+@event.listens_for(FahrtSegment, "after_insert")
+@event.listens_for(FahrtSegment, "after_update")
+def _fahrt_teil_geaendert(mapper, connection, target):
+    _merken(target, target.fahrt_id)
+
+
+@event.listens_for(so.Session, "after_flush")
+def _protokoll_schreiben(session, flush_context):
+    fahrt_ids = session.info.pop(_SESSION_KEY, None)
+    if fahrt_ids:
+        fahrten_als_geaendert_markieren(session.connection(), fahrt_ids)
+
+
+@event.listens_for(so.Session, "after_soft_rollback")
+def _verwerfen(session, previous_transaction):
+    session.info.pop(_SESSION_KEY, None)
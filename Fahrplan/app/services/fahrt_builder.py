@@ -1,98 +1,43 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta
-import sqlalchemy as sa
 from app import db
-from app.models import (
-    Halteplan, Haltepunkt, HalteplanSegment,
-    Fahrtdurchfuehrung, FahrtHalt, FahrtSegment
-)
+from app.models import Fahrtdurchfuehrung, FahrtHalt, FahrtSegment
+from app.services.halteplan_vorlage import halteplan_vorlage
 
 def rebuild_fahrt_halte_und_segmente(fahrt: Fahrtdurchfuehrung) -> None:
     """
     Baut FahrtHalt + FahrtSegment aus dem zugehörigen Halteplan neu auf.
-    - Zeiten: abfahrt_zeit der Fahrt + Segmentdauer + Haltedauer (Haltepunkt.halte_dauer_min)
+    - Zeiten: abfahrt_zeit der Fahrt + Offsets aus der Halteplan-Vorlage (Segmentdauer + Haltedauer),
+      ende_zeit = letzte Ankunft
     - Preise: final_price = HalteplanSegment.base_price * fahrt.price_factor
     """
 
-    hp: Halteplan = fahrt.halteplan
-
-    # Haltepunkte und Segmente in Reihenfolge
-    stops = (
-        db.session.query(Haltepunkt)
-        .filter(Haltepunkt.halteplan_id == hp.halteplan_id)
-        .order_by(Haltepunkt.position)
-        .all()
-    )
-    segs = (
-        db.session.query(HalteplanSegment)
-        .filter(HalteplanSegment.halteplan_id == hp.halteplan_id)
-        .order_by(HalteplanSegment.position)
-        .all()
-    )
-
-    if len(stops) < 2:
-        raise ValueError("Halteplan hat zu wenige Haltepunkte.")
-    if len(segs) != len(stops) - 1:
-        raise ValueError("Halteplan-Segmente passen nicht zur Anzahl der Haltepunkte.")
+    v = halteplan_vorlage(fahrt.halteplan_id)
 
     # Alte Datensätze löschen (sonst Inkonsistenzen )
     db.session.query(FahrtSegment).filter(FahrtSegment.fahrt_id == fahrt.fahrt_id).delete(synchronize_session=False)
     db.session.query(FahrtHalt).filter(FahrtHalt.fahrt_id == fahrt.fahrt_id).delete(synchronize_session=False)
     db.session.flush()
 
-    # FahrtHalt erzeugen + Zeiten berechnen
+    # FahrtHalt erzeugen, Zeiten kommen fertig aus der Vorlage
+    # (erster Halt: ankunft = abfahrt = Startzeit, letzter: abfahrt None)
     fh_list: list[FahrtHalt] = []
-
-    t = fahrt.abfahrt_zeit  # Startzeit
-
-    # 1) erster Halt: ankunft = abfahrt = Startzeit
-    first = FahrtHalt(
-        fahrt_id=fahrt.fahrt_id,
-        bahnhof_id=stops[0].bahnhof_id,
-        position=1,
-        ankunft_zeit=t,
-        abfahrt_zeit=t,
-    )
-    db.session.add(first)
-    db.session.flush()
-    fh_list.append(first)
-
-    # 2) Rest
-    for i in range(1, len(stops)):
-        # Segment davor
-        seg_duration = int(segs[i - 1].duration_min or 0)
-
-        # ankunft am nächsten Bahnhof
-        t = t + timedelta(minutes=seg_duration)
-        ankunft = t
-
-        is_last = (i == len(stops) - 1)
-
-        if is_last:
-            abfahrt = None
-        else:
-            # Haltedauer am Bahnhof i (Zwischenhalt) kommt aus Haltepunkt
-            dwell = int(stops[i].halte_dauer_min or 0)
-            abfahrt = ankunft + timedelta(minutes=dwell)
-            t = abfahrt  # nächste Segmentrechnung ab Abfahrt
-
+    for i, (ankunft, abfahrt) in enumerate(v.zeiten(fahrt.abfahrt_zeit)):
         fh = FahrtHalt(
             fahrt_id=fahrt.fahrt_id,
-            bahnhof_id=stops[i].bahnhof_id,
+            bahnhof_id=v.bahnhof_ids[i],
             position=i + 1,
             ankunft_zeit=ankunft,
             abfahrt_zeit=abfahrt,
         )
         db.session.add(fh)
-        db.session.flush()
         fh_list.append(fh)
+    db.session.flush()  # IDs für von_halt_id / nach_halt_id
+    fahrt.ende_zeit = fh_list[-1].ankunft_zeit
 
     # FahrtSegment erzeugen (zwischen FahrtHalt-IDs)
     for pos in range(1, len(fh_list)):
-        hpseg = segs[pos - 1]
-        base_price = float(hpseg.base_price or 0.0)
-        final_price = base_price * float(fahrt.price_factor or 1.0)
+        final_price = v.base_price[pos - 1] * float(fahrt.price_factor or 1.0)
 
         db.session.add(
             FahrtSegment(
@@ -100,7 +45,7 @@ def rebuild_fahrt_halte_und_segmente(fahrt: Fahrtdurchfuehrung) -> None:
                 von_halt_id=fh_list[pos - 1].id,
                 nach_halt_id=fh_list[pos].id,
                 position=pos,
-                duration_min=int(hpseg.duration_min or 0),
+                duration_min=v.dauer_min[pos - 1],
                 final_price=float(final_price),
             )
         )
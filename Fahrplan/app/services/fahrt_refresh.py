@@ -2,47 +2,28 @@ from __future__ import annotations
 
 from datetime import timedelta
 import sqlalchemy as sa
-import sqlalchemy.orm as so
 
 from app import db
 from app.models import (
     Fahrtdurchfuehrung,
-    Halteplan,
-    Haltepunkt,
-    HalteplanSegment,
     FahrtHalt,
     FahrtSegment,
 )
+from app.services.halteplan_vorlage import halteplan_vorlage
 
 def refresh_fahrt_snapshot(fahrt_id: int) -> dict:
     """
     Baut FahrtHalt + FahrtSegment für eine Fahrtdurchführung neu auf.
-    Quelle: Halteplan.haltepunkte + Halteplan.segmente + fahrt.abfahrt_zeit + fahrt.price_factor
+    Quelle: Halteplan-Vorlage + fahrt.abfahrt_zeit + fahrt.price_factor
     Speichert bei FahrtSegment nur final_price (+ duration_min), wie ausgemacht.
     """
 
-    # 1) Daten laden
-    fahrt = db.session.scalar(
-        sa.select(Fahrtdurchfuehrung)
-        .where(Fahrtdurchfuehrung.fahrt_id == fahrt_id)
-        .options(
-            so.joinedload(Fahrtdurchfuehrung.halteplan)
-            .joinedload(Halteplan.haltepunkte),
-            so.joinedload(Fahrtdurchfuehrung.halteplan)
-            .joinedload(Halteplan.segmente),
-        )
-    )
+    # 1) Daten laden (Halteplan kommt als Vorlage aus dem Cache)
+    fahrt = db.session.get(Fahrtdurchfuehrung, fahrt_id)
     if fahrt is None:
         raise ValueError(f"Fahrt {fahrt_id} nicht gefunden")
 
-    halteplan = fahrt.halteplan
-    haltepunkte = sorted(halteplan.haltepunkte, key=lambda x: x.position)
-    segmente = sorted(halteplan.segmente, key=lambda x: x.position)
-
-    if len(haltepunkte) < 2:
-        raise ValueError("Halteplan braucht mindestens 2 Haltepunkte")
-    if len(segmente) != len(haltepunkte) - 1:
-        raise ValueError("HalteplanSegment-Anzahl muss (Haltepunkte - 1) sein")
+    v = halteplan_vorlage(fahrt.halteplan_id)
 
     # 2) Alte Snapshots löschen (einfach & robust)
     db.session.execute(sa.delete(FahrtSegment).where(FahrtSegment.fahrt_id == fahrt_id))
@@ -50,48 +31,31 @@ def refresh_fahrt_snapshot(fahrt_id: int) -> dict:
     db.session.flush()
 
     # 3) FahrtHalt neu erzeugen
-    # Startzeit ist Abfahrt am ersten Halt
+    # Startzeit ist Abfahrt am ersten Halt, weitere Halte: Zeit aus aufaddierten Segment-Dauern
+    # (ohne Haltezeit, ankunft = abfahrt)
     t = fahrt.abfahrt_zeit
-
-    fahrt_halt_ids: list[int] = []
-
-    # erster Halt: Abfahrtzeit = fahrt.abfahrt_zeit, Ankunft optional = gleich
-    first = haltepunkte[0]
-    fh0 = FahrtHalt(
-        fahrt_id=fahrt_id,
-        bahnhof_id=first.bahnhof_id,
-        position=1,
-        ankunft_zeit=t,   # optional
-        abfahrt_zeit=t,
-    )
-    db.session.add(fh0)
-    db.session.flush()
-    fahrt_halt_ids.append(fh0.id)
-
-    # weitere Halte: Zeit wird aus Segment-Dauern aufaddiert
-    for i in range(1, len(haltepunkte)):
-        # Segment i-1 führt von Halt i-1 zu Halt i
-        seg = segmente[i - 1]
-        t = t + timedelta(minutes=int(seg.duration_min))
-
-        hp = haltepunkte[i]
+    fahrt_halte: list[FahrtHalt] = []
+    for i, bahnhof_id in enumerate(v.bahnhof_ids):
+        if i > 0:
+            # Segment i-1 führt von Halt i-1 zu Halt i
+            t = t + timedelta(minutes=v.dauer_min[i - 1])
         fh = FahrtHalt(
             fahrt_id=fahrt_id,
-            bahnhof_id=hp.bahnhof_id,
+            bahnhof_id=bahnhof_id,
             position=i + 1,
             ankunft_zeit=t,
             abfahrt_zeit=t,
         )
         db.session.add(fh)
-        db.session.flush()
-        fahrt_halt_ids.append(fh.id)
+        fahrt_halte.append(fh)
+    db.session.flush()
+    fahrt_halt_ids = [fh.id for fh in fahrt_halte]
+    fahrt.ende_zeit = t
 
     # 4) FahrtSegment neu erzeugen
     links = 0
-    for i, hpseg in enumerate(segmente, start=1):
+    for i, (base_price, min_cost, dauer) in enumerate(zip(v.base_price, v.min_cost, v.dauer_min), start=1):
         # Validierung kostendeckend: base_price muss >= min_cost
-        base_price = float(hpseg.base_price)
-        min_cost = float(hpseg.min_cost)
         if base_price < min_cost:
             raise ValueError(
                 f"HalteplanSegment pos={i}: base_price ({base_price}) < min_cost ({min_cost})"
@@ -108,7 +72,7 @@ def refresh_fahrt_snapshot(fahrt_id: int) -> dict:
             nach_halt_id=fahrt_halt_ids[i],
             position=i,
             final_price=final_price,
-            duration_min=int(hpseg.duration_min),
+            duration_min=dauer,
         )
         db.session.add(fs)
         links += 1
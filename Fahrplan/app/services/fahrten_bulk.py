@@ -0,0 +1,170 @@
+"""
+Viele Fahrtdurchführungen eines Halteplans auf einmal anlegen (Intervall-Anlage, Einzelanlage)
+
+Bisher pro Fahrt: Haltepunkte + Segmente laden, FahrtHalt adden, flush für die IDs,
+FahrtSegment adden, dann Wartungs- und Overlap-Check mit eigenen Queries.
+Bei einem Plan über mehrere Monate = tausende Queries und Flushes.
+
+Hier:
+    1. Halteplan-Vorlage (Cache, Zeiten als Minuten-Offsets ab Abfahrt inkl. Haltedauer)
+    2. alle Halte/Segmente aller Fahrten im Speicher ausrechnen
+    3. Checks mengenbasiert (ZugBelegung): Wartungen und bestehende Fahrten der betroffenen
+       Züge im Zeitraum mit je einer Query laden, Überschneidungen im Speicher (sortiert + bisect),
+       auch zwischen den neuen Fahrten untereinander
+    4. einfügen mit insert().returning() / executemany: Fahrten, Halte, Segmente,
+       Dienstzuweisungen = 4 Statements (SQLAlchemy teilt in Batches zu 1000 Zeilen)
+
+Gleiche Regeln und Fehler wie vorher create_fahrt_internal:
+    ValueError = Eingabe/Halteplan kaputt, RuntimeError = Konflikt (Wartung, Zug belegt)
+KEIN commit (Caller entscheidet commit/rollback).
+Core-Inserts lösen keine ORM-Events aus -> Änderungsprotokoll selbst schreiben.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+from app import db
+from app.models import (
+    Dienstzuweisung,
+    FahrtHalt,
+    FahrtSegment,
+    Fahrtdurchfuehrung,
+    FahrtdurchfuehrungStatus,
+)
+from app.services.fahrt_aenderungen import fahrten_als_geaendert_markieren
+from app.services.halteplan_vorlage import halteplan_vorlage
+from app.services.wartung_check import ZugBelegung
+
+
+@dataclass
+class GeplanteFahrt:
+    zug_id: int
+    abfahrt: datetime
+    mitarbeiter_ids: list[int] = field(default_factory=list)
+
+
+def _konflikte_pruefen(fenster: list[tuple[int, datetime, datetime]]) -> None:
+    """
+    fenster = [(zug_id, start, ende), ...] in Reihenfolge der neuen Fahrten
+    RuntimeError beim ersten Konflikt (Wartung, bestehende Fahrt, andere neue Fahrt)
+    """
+    belegung = ZugBelegung.laden(
+        {z for z, _s, _e in fenster},
+        min(s for _z, s, _e in fenster),
+        max(e for _z, _s, e in fenster),
+    )
+
+    def konflikt(nr: int) -> str:
+        return f"Konflikt bei Fahrt #{nr}" if len(fenster) > 1 else "Konflikt"
+
+    for nr, (zug_id, start, end) in enumerate(fenster, start=1):
+        k = belegung.konflikt(zug_id, start, end)
+        if k is not None:
+            s, _e, info = k
+            if info == "Wartung":
+                raise RuntimeError(f"{konflikt(nr)}: Der ausgewählte Zug hat in diesem Zeitraum eine Wartung.")
+            if isinstance(info, tuple):                      # ("neu", nr) = andere neue Fahrt
+                raise RuntimeError(
+                    f"Konflikt: Fahrt #{info[1]} und Fahrt #{nr} verwenden zur selben Zeit denselben Zug."
+                )
+            raise RuntimeError(f"{konflikt(nr)}: Zug ist bereits in Fahrtdurchführung #{info} ({s}) belegt.")
+        belegung.belegen(zug_id, start, end, ("neu", nr))
+
+
+def fahrten_bulk_anlegen(
+    *,
+    halteplan_id: int,
+    fahrten: list[GeplanteFahrt],
+    price_factor: float,
+) -> list[int]:
+    """legt alle Fahrten inkl. Halte/Segmente/Personal an, fahrt_ids in Reihenfolge von fahrten"""
+    if price_factor < 1.0:
+        raise ValueError("Preisfaktor muss ≥ 1.0 sein.")
+    if not fahrten:
+        return []
+
+    v = halteplan_vorlage(halteplan_id)
+    _konflikte_pruefen([
+        (f.zug_id, f.abfahrt, f.abfahrt + timedelta(minutes=v.ende_min)) for f in fahrten
+    ])
+
+    # (zug_id, abfahrt) muss eindeutig sein, sonst überschreibt die Zuordnung unten still IDs.
+    # Der Konflikt-Check fängt das bei Fenstern der Länge 0 (Halteplan ohne Fahrzeit) nicht
+    erste_nr: dict[tuple[int, datetime], int] = {}
+    for nr, f in enumerate(fahrten, start=1):
+        vorher = erste_nr.setdefault((f.zug_id, f.abfahrt), nr)
+        if vorher != nr:
+            raise RuntimeError(f"Konflikt: Fahrt #{vorher} und Fahrt #{nr} verwenden zur selben Zeit denselben Zug.")
+
+    # 1) Fahrten. Reihenfolge von RETURNING ist nicht garantiert (und sort_by_parameter_order
+    #    macht auf SQLite wieder ein INSERT pro Zeile) -> über (zug_id, abfahrt) zuordnen
+    res = db.session.execute(
+        sa.insert(Fahrtdurchfuehrung).returning(
+            Fahrtdurchfuehrung.fahrt_id, Fahrtdurchfuehrung.zug_id, Fahrtdurchfuehrung.abfahrt_zeit,
+        ),
+        [
+            {
+                "halteplan_id": halteplan_id,
+                "zug_id": f.zug_id,
+                "status": FahrtdurchfuehrungStatus.PLANMAESSIG,
+                "verspaetung_min": 0,
+                "abfahrt_zeit": f.abfahrt,
+                "ende_zeit": f.abfahrt + timedelta(minutes=v.ende_min),
+                "price_factor": price_factor,
+            }
+            for f in fahrten
+        ],
+    )
+    id_von = {(r.zug_id, r.abfahrt_zeit): r.fahrt_id for r in res}
+    fahrt_ids = [id_von[(f.zug_id, f.abfahrt)] for f in fahrten]
+
+    # 2) Halte, IDs über (fahrt_id, position) zurück für die Segmente
+    n = len(v.bahnhof_ids)
+    halt_rows = []
+    for fid, f in zip(fahrt_ids, fahrten):
+        for i in range(n):
+            halt_rows.append({
+                "fahrt_id": fid,
+                "bahnhof_id": v.bahnhof_ids[i],
+                "position": i + 1,
+                "ankunft_zeit": f.abfahrt + timedelta(minutes=v.ankunft_min[i]),
+                "abfahrt_zeit": None if v.abfahrt_min[i] is None else f.abfahrt + timedelta(minutes=v.abfahrt_min[i]),
+            })
+    # None in abfahrt_zeit (letzter Halt) wechselt den Parameter-Typ und SQLAlchemy fängt dann
+    # jedes Mal einen neuen INSERT-Batch an -> Endhalte ans Ende sortieren, Reihenfolge ist eh egal
+    halt_rows.sort(key=lambda r: r["abfahrt_zeit"] is None)
+    res = db.session.execute(
+        sa.insert(FahrtHalt).returning(FahrtHalt.id, FahrtHalt.fahrt_id, FahrtHalt.position), halt_rows,
+    )
+    halt_id = {(r.fahrt_id, r.position): r.id for r in res}
+
+    # 3) Segmente (Preis = base_price * price_factor)
+    preise = [round(p * float(price_factor), 2) for p in v.base_price]
+    seg_rows = []
+    for fid in fahrt_ids:
+        for i in range(n - 1):
+            seg_rows.append({
+                "fahrt_id": fid,
+                "von_halt_id": halt_id[(fid, i + 1)],
+                "nach_halt_id": halt_id[(fid, i + 2)],
+                "position": i + 1,
+                "final_price": preise[i],
+                "duration_min": v.dauer_min[i],
+            })
+    db.session.execute(sa.insert(FahrtSegment), seg_rows)
+
+    # 4) Dienstzuweisungen
+    dienst_rows = [
+        {"fahrt_id": fid, "mitarbeiter_id": mid}
+        for fid, f in zip(fahrt_ids, fahrten)
+        for mid in (f.mitarbeiter_ids or [])
+    ]
+    if dienst_rows:
+        db.session.execute(sa.insert(Dienstzuweisung), dienst_rows)
+
+    fahrten_als_geaendert_markieren(db.session.connection(), fahrt_ids)
+    return fahrt_ids
@@ -0,0 +1,132 @@
+"""
+Halteplan als fertig gerechnete Vorlage (Cache pro halteplan_id)
+
+Fahrt anlegen, Fahrt neu aufbauen, Snapshot-Refresh und das Zeitfenster in der Bulk-Preview
+haben alle für jede Fahrt die Haltepunkte + Segmente neu aus der DB geladen und die Zeiten
+aufaddiert. Ein Halteplan ändert sich aber nur über halteplan_edit / halteplan_delete.
+
+Vorlage = Offsets in Minuten ab Abfahrt am ersten Halt (inkl. Haltezeiten), Preise, min_cost.
+Zeiten für eine konkrete Abfahrt sind damit nur noch abfahrt + timedelta(offset).
+
+Immutable (Tuples, frozen) -> darf ohne Kopie an alle Threads raus.
+Invalidierung: halteplan_edit / halteplan_delete rufen vorlage_verwerfen() nach dem commit.
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import sqlalchemy as sa
+
+from app import db
+from app.models import HalteplanSegment, Haltepunkt
+
+
+@dataclass(frozen=True)
+class HalteplanVorlage:
+    """Halt i kommt an bei ankunft_min[i] und fährt ab bei abfahrt_min[i] (letzter Halt: None)"""
+    halteplan_id: int
+    bahnhof_ids: tuple[int, ...]
+    ankunft_min: tuple[int, ...]
+    abfahrt_min: tuple[Optional[int], ...]
+    dauer_min: tuple[int, ...]            # pro Segment
+    base_price: tuple[float, ...]         # pro Segment
+    min_cost: tuple[float, ...]           # pro Segment
+
+    @property
+    def ende_min(self) -> int:
+        return self.ankunft_min[-1]
+
+    def fenster(self, start_dt: datetime) -> tuple[datetime, datetime]:
+        """(Abfahrt erster Halt, Ankunft letzter Halt)"""
+        return start_dt, start_dt + timedelta(minutes=self.ende_min)
+
+    def zeiten(self, start_dt: datetime) -> list[tuple[datetime, Optional[datetime]]]:
+        """[(ankunft, abfahrt), ...] pro Halt für eine Abfahrt um start_dt"""
+        return [
+            (start_dt + timedelta(minutes=an), None if ab is None else start_dt + timedelta(minutes=ab))
+            for an, ab in zip(self.ankunft_min, self.abfahrt_min)
+        ]
+
+
+def _laden(halteplan_id: int) -> HalteplanVorlage:
+    hp_stops = db.session.scalars(
+        sa.select(Haltepunkt).where(Haltepunkt.halteplan_id == halteplan_id).order_by(Haltepunkt.position)
+    ).all()
+    if len(hp_stops) < 2:
+        raise ValueError("Der ausgewählte Halteplan hat zu wenige Haltepunkte.")
+
+    hp_segs = db.session.scalars(
+        sa.select(HalteplanSegment)
+        .where(HalteplanSegment.halteplan_id == halteplan_id)
+        .order_by(HalteplanSegment.position)
+    ).all()
+    if len(hp_segs) != (len(hp_stops) - 1):
+        raise ValueError("Halteplan-Segmente passen nicht zur Anzahl der Haltepunkte.")
+
+    ankunft, abfahrt = [0], [0]
+    cur = 0
+    for i, seg in enumerate(hp_segs):
+        cur += int(seg.duration_min or 0)
+        ankunft.append(cur)
+        # Haltezeit am Zielhalt (außer letzter)
+        if i + 1 < len(hp_stops) - 1:
+            cur += int(hp_stops[i + 1].halte_dauer_min or 0)
+            abfahrt.append(cur)
+        else:
+            abfahrt.append(None)
+
+    return HalteplanVorlage(
+        halteplan_id=halteplan_id,
+        bahnhof_ids=tuple(h.bahnhof_id for h in hp_stops),
+        ankunft_min=tuple(ankunft),
+        abfahrt_min=tuple(abfahrt),
+        dauer_min=tuple(int(s.duration_min or 0) for s in hp_segs),
+        base_price=tuple(float(s.base_price or 0.0) for s in hp_segs),
+        min_cost=tuple(float(s.min_cost or 0.0) for s in hp_segs),
+    )
+
+
+class _VorlagenCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vorlagen: Dict[int, HalteplanVorlage] = {}
+        self._generation = 0
+
+    def get(self, halteplan_id: int) -> HalteplanVorlage:
+        with self._lock:
+            v = self._vorlagen.get(halteplan_id)
+            gen = self._generation
+        if v is not None:
+            return v
+        # außerhalb vom Lock laden, kaputte Haltepläne (ValueError) landen nicht im Cache
+        v = _laden(halteplan_id)
+        with self._lock:
+            # zwischendurch verworfen -> evtl. alter Stand geladen, nur zurückgeben, nicht merken
+            if gen != self._generation:
+                return v
+            return self._vorlagen.setdefault(halteplan_id, v)
+
+    def verwerfen(self, halteplan_id: Optional[int] = None) -> None:
+        with self._lock:
+            self._generation += 1
+            if halteplan_id is None:
+                self._vorlagen.clear()
+            else:
+                self._vorlagen.pop(halteplan_id, None)
+
+
+_cache = _VorlagenCache()
+
+
+def halteplan_vorlage(halteplan_id: int) -> HalteplanVorlage:
+    """ValueError wenn der Halteplan zu wenige Haltepunkte hat oder Segmente fehlen"""
+    return _cache.get(halteplan_id)
+
+
+def vorlage_verwerfen(halteplan_id: Optional[int] = None) -> None:
+    """nach Änderung/Löschen eines Halteplans (None = alle)"""
+    _cache.verwerfen(halteplan_id)
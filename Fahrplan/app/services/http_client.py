@@ -0,0 +1,166 @@
+"""
+HTTP-Client für Aufrufe an die anderen Services (Strecken / Fahrplan / Flotten)
+
+Pro Service ein DienstClient mit:
+    - einer requests.Session mit Connection-Pool (Keep-Alive statt neuer TCP-Verbindung pro Aufruf)
+    - begrenzten Wiederholungen mit Backoff (nur Verbindungsfehler und 502/503/504, nur GET;
+      Read-Timeouts werden NICHT wiederholt, sonst wartet ein Worker bei einem langsamen
+      Service ein Vielfaches vom Timeout)
+    - Timeout (connect, read) pro Aufruf
+    - Circuit Breaker: nach fehler_schwelle Fehlern hintereinander wird der Service
+      pause_sek lang gar nicht mehr angefragt (sofort DienstNichtErreichbar), danach darf
+      ein Probe-Aufruf durch - klappt er, ist der Breaker wieder zu
+    - get_json merkt sich die letzte gute Antwort pro URL + Parameter und liefert sie,
+      wenn der Service gerade nicht erreichbar ist (fallback=False schaltet das ab)
+
+DienstNichtErreichbar ist eine requests.RequestException, bestehendes
+"except RequestException" fängt es also mit.
+
+Die Clients gibt es über dienst_client("strecken") usw., einer pro Service und Prozess.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+class DienstNichtErreichbar(requests.RequestException):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, fehler_schwelle: int = 5, pause_sek: float = 30.0):
+        self.fehler_schwelle = fehler_schwelle
+        self.pause_sek = pause_sek
+        self._lock = threading.Lock()
+        self._fehler = 0
+        self._offen_bis: Optional[float] = None
+        self._probe_laeuft = False
+
+    @property
+    def zustand(self) -> str:
+        with self._lock:
+            if self._offen_bis is None:
+                return "zu"
+            return "offen" if time.monotonic() < self._offen_bis else "halb-offen"
+
+    def darf_anfragen(self) -> bool:
+        with self._lock:
+            if self._offen_bis is None:
+                return True
+            if time.monotonic() < self._offen_bis or self._probe_laeuft:
+                return False
+            # halb-offen: genau ein Probe-Aufruf
+            self._probe_laeuft = True
+            return True
+
+    def erfolg(self) -> None:
+        with self._lock:
+            self._fehler = 0
+            self._offen_bis = None
+            self._probe_laeuft = False
+
+    def fehler(self) -> None:
+        with self._lock:
+            self._fehler += 1
+            if self._probe_laeuft or self._fehler >= self.fehler_schwelle:
+                self._offen_bis = time.monotonic() + self.pause_sek
+            self._probe_laeuft = False
+
+
+class DienstClient:
+    def __init__(
+        self,
+        name: str,
+        timeout: Timeout = (3.05, 8),
+        wiederholungen: int = 2,
+        backoff_sek: float = 0.2,
+        pool_groesse: int = 10,
+        fehler_schwelle: int = 5,
+        pause_sek: float = 30.0,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(fehler_schwelle, pause_sek)
+        self._letzte_gute: Dict[Tuple[str, Tuple], Any] = {}
+
+        retry = Retry(
+            total=wiederholungen,
+            connect=wiederholungen,
+            read=0,
+            status=wiederholungen,
+            backoff_factor=backoff_sek,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_groesse, pool_maxsize=pool_groesse, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[Timeout] = None,
+        stream: bool = False,
+    ) -> requests.Response:
+        """GET über den Pool; Verbindungsfehler / Timeouts / 5xx zählen für den Breaker"""
+        if not self.breaker.darf_anfragen():
+            raise DienstNichtErreichbar(f"{self.name}-Service nicht erreichbar (Circuit Breaker offen)")
+        try:
+            r = self.session.get(url, params=params, headers=headers, timeout=timeout or self.timeout, stream=stream)
+        except requests.RequestException:
+            self.breaker.fehler()
+            raise
+        if r.status_code >= 500:
+            self.breaker.fehler()
+        else:
+            self.breaker.erfolg()
+        return r
+
+    def get_json(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[Timeout] = None,
+        fallback: bool = True,
+    ) -> Any:
+        key = (url, tuple(sorted((params or {}).items())))
+        try:
+            r = self.get(url, params=params, headers={"Accept": "application/json"}, timeout=timeout)
+            r.raise_for_status()
+            data = r.json()
+        except (requests.RequestException, ValueError):
+            if fallback and key in self._letzte_gute:
+                return self._letzte_gute[key]
+            raise
+        if fallback:
+            self._letzte_gute[key] = data
+        return data
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_clients: Dict[str, DienstClient] = {}
+_clients_lock = threading.Lock()
+
+
+def dienst_client(name: str) -> DienstClient:
+    with _clients_lock:
+        c = _clients.get(name)
+        if c is None:
+            # Sync-Exporte sind groß -> langer Read-Timeout
+            c = _clients[name] = DienstClient(name, timeout=(3.05, 15))
+        return c
@@ -0,0 +1,108 @@
+"""
+Kompaktes Binärformat für den Fahrplan-Snapshot (Content-Type application/vnd.fahrplan.kompakt)
+
+Im JSON stehen Bahnhofsname und zwei ISO-Zeitstrings bei JEDEM Halt jeder Fahrt, das ist
+groß und beim Parsen im Ticket-Service teuer. Hier wird spaltenweise übertragen:
+
+    b"FPK1"
+    uint32            Länge vom Header
+    Header (JSON)     {"version", "total", "halte", "bahnhoefe": [[bahnhofId, name], ...]}
+                      (+ "since", "deleted" beim Delta)
+    int32[total]      fahrt_id
+    int32[total]      halteplan_id
+    int32[total]      zug_id
+    int32[total + 1]  halt_offset   Halte von Fahrt k = halt_offset[k] .. halt_offset[k+1]-1
+    int32[halte]      halt_id
+    int32[halte]      bahnhof_idx   Index in "bahnhoefe"
+    int32[halte]      ankunft       Minuten seit 1970-01-01 (-1 = keine)
+    int32[halte]      abfahrt       Minuten seit 1970-01-01 (-1 = keine)
+    float32[halte]    tarif         Preis vom Segment das an dem Halt ankommt (erster Halt 0)
+
+alles little-endian, Halte pro Fahrt nach Position sortiert
+Zeiten werden auf Minuten abgeschnitten (Fahrpläne rechnen nur mit Minuten)
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+KOMPAKT_MIMETYPE = "application/vnd.fahrplan.kompakt"
+MAGIC = b"FPK1"
+
+EPOCH = datetime(1970, 1, 1)
+KEINE_ZEIT = -1
+
+
+def epoch_minuten(v: Optional[datetime]) -> int:
+    if v is None:
+        return KEINE_ZEIT
+    return (v - EPOCH) // timedelta(minutes=1)
+
+
+def _bytes(a: array) -> bytes:
+    if sys.byteorder == "big":
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def encode_snapshot(
+    fahrten: Iterable[Any],
+    halte_rows: Iterable[Any],
+    price_by_nach_halt: Dict[int, float],
+    meta: Dict[str, Any],
+) -> bytes:
+    """
+    fahrten    = Zeilen (fahrt_id, halteplan_id, zug_id), nach fahrt_id sortiert
+    halte_rows = Zeilen (fahrt_id, halt_id, bahnhof_id, pos, bahnhof_name, ankunft, abfahrt),
+                 nach fahrt_id + Position sortiert (wie im JSON-Snapshot)
+    meta       = version/since/deleted für den Header
+    """
+    fahrt_ids, halteplan_ids, zug_ids = array("i"), array("i"), array("i")
+    for f in fahrten:
+        fahrt_ids.append(int(f.fahrt_id))
+        halteplan_ids.append(int(f.halteplan_id))
+        zug_ids.append(int(f.zug_id or 0))
+
+    pos_by_fahrt = {fid: k for k, fid in enumerate(fahrt_ids)}
+    anzahl_halte = [0] * len(fahrt_ids)
+
+    bahnhoefe: list[list] = []
+    bahnhof_idx: dict[int, int] = {}
+    halt_ids, halt_bahnhof, ankunft, abfahrt, tarif = array("i"), array("i"), array("i"), array("i"), array("f")
+    for r in halte_rows:
+        k = pos_by_fahrt.get(int(r.fahrt_id))
+        if k is None:
+            continue
+        anzahl_halte[k] += 1
+
+        bid = int(r.bahnhof_id)
+        idx = bahnhof_idx.get(bid)
+        if idx is None:
+            idx = bahnhof_idx[bid] = len(bahnhoefe)
+            bahnhoefe.append([bid, r.bahnhof_name])
+
+        halt_id = int(r.halt_id)
+        halt_ids.append(halt_id)
+        halt_bahnhof.append(idx)
+        ankunft.append(epoch_minuten(r.ankunft))
+        abfahrt.append(epoch_minuten(r.abfahrt))
+        tarif.append(0.0 if int(r.pos) == 1 else float(price_by_nach_halt.get(halt_id, 0.0)))
+
+    offsets = array("i", [0])
+    for n in anzahl_halte:
+        offsets.append(offsets[-1] + n)
+
+    header = dict(meta)
+    header.update({"total": len(fahrt_ids), "halte": len(halt_ids), "bahnhoefe": bahnhoefe})
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    teile = [MAGIC, struct.pack("<I", len(header_bytes)), header_bytes]
+    for a in (fahrt_ids, halteplan_ids, zug_ids, offsets, halt_ids, halt_bahnhof, ankunft, abfahrt, tarif):
+        teile.append(_bytes(a))
+    return b"".join(teile)
@@ -1,7 +1,7 @@
-import requests
 from requests import RequestException
 
 from app import db
+from app.services.http_client import dienst_client
 from app.models import Bahnhof, Abschnitt, Strecke, StreckeAbschnitt
 
 
@@ -16,9 +16,8 @@ def sync_from_strecken(base_url: str) -> dict:
     # 0) Daten holen (robust)
     # -----------------------
     try:
-        resp = requests.get(url, timeout=15)
-        resp.raise_for_status()
-        data = resp.json()
+        # kein Fallback auf alte Antworten: alte Daten nochmal zu spiegeln bringt nichts
+        data = dienst_client("strecken").get_json(url, fallback=False)
     except (RequestException, ValueError) as e:
         return {"ok": False, "error": f"Fetch/JSON failed: {e}"}
 
@@ -1,7 +1,7 @@
-import requests
 from requests import RequestException
 
 from app import db
+from app.services.http_client import dienst_client
 from app.models import Zug
 
 
@@ -13,9 +13,7 @@ def sync_from_flotte(base_url: str) -> dict:
     url = f"{base_url.rstrip('/')}/zuege"
 
     try:
-        resp = requests.get(url, timeout=15)
-        resp.raise_for_status()
-        data = resp.json()
+        data = dienst_client("flotten").get_json(url, fallback=False)
     except (RequestException, ValueError) as e:
         return {"ok": False, "error": f"Fetch/JSON failed: {e}"}
 
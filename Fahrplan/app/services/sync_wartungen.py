@@ -1,8 +1,8 @@
-import requests
 from requests import RequestException
 from datetime import datetime
 
 from app import db
+from app.services.http_client import dienst_client
 from app.models import Zug, ZugWartung
 
 
@@ -25,9 +25,7 @@ def sync_wartungen_from_flotte(base_url: str) -> dict:
     url = f"{base_url.rstrip('/')}/api/wartungen-export"
 
     try:
-        resp = requests.get(url, timeout=15)
-        resp.raise_for_status()
-        data = resp.json()
+        data = dienst_client("flotten").get_json(url, fallback=False)
     except (RequestException, ValueError) as e:
         return {"ok": False, "error": f"Fetch/JSON failed: {e}"}
 
@@ -1,9 +1,9 @@
-from datetime import datetime
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
 import sqlalchemy as sa
-from sqlalchemy.orm import aliased
 from app import db
 
-from app.models import Zug, ZugWartung, FahrtHalt, Fahrtdurchfuehrung
+from app.models import Zug, ZugWartung, Fahrtdurchfuehrung
 
 def has_wartung_overlap(external_zug_id: int, start_dt: datetime, end_dt: datetime) -> bool:
     """
@@ -39,25 +39,102 @@ def wartung_conflict_for_external_zug(external_zug_id: int, start_dt: datetime,
     )
 
 def find_zug_fahrt_overlap(zug_id: int, start_dt, end_dt, exclude_fahrt_id: int | None = None):
-    FH = aliased(FahrtHalt)
-
-    # Ende der jeweiligen bestehenden Fahrt = max Ankunftszeit ihrer Halte
-    end_subq = (
-        sa.select(sa.func.max(FH.ankunft_zeit))
-        .where(FH.fahrt_id == Fahrtdurchfuehrung.fahrt_id)
-        .correlate(Fahrtdurchfuehrung)
-        .scalar_subquery()
-    )
-
+    # Ende der bestehenden Fahrt steht in ende_zeit -> reiner Index-Zugriff
+    # (ix_fahrtdurchfuehrung_zug_zeitraum), kein MAX über die Halte pro Fahrt
     q = (
         Fahrtdurchfuehrung.query
         .filter(Fahrtdurchfuehrung.zug_id == zug_id)
         # Overlap: existing.start < new.end AND existing.end > new.start
         .filter(Fahrtdurchfuehrung.abfahrt_zeit < end_dt)
-        .filter(end_subq > start_dt)
+        .filter(Fahrtdurchfuehrung.ende_zeit > start_dt)
     )
 
     if exclude_fahrt_id is not None:
         q = q.filter(Fahrtdurchfuehrung.fahrt_id != exclude_fahrt_id)
 
-    return q.order_by(Fahrtdurchfuehrung.abfahrt_zeit.asc()).first()
\ No newline at end of file
+    return q.order_by(Fahrtdurchfuehrung.abfahrt_zeit.asc()).first()
+
+
+class Intervalle:
+    """
+    Zeiträume eines Zugs, sortiert nach Start (bisect).
+    Überschneidung mit [s, e): nur Einträge mit start < e, und weil keiner länger als
+    max_dauer ist, auch nur mit start > s - max_dauer -> kleiner Bereich statt alle
+    """
+
+    def __init__(self):
+        self.starts: list = []
+        self.eintraege: list[tuple] = []     # (start, ende, info)
+        self.max_dauer = timedelta(0)
+
+    def einfuegen(self, start, ende, info) -> None:
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.eintraege.insert(i, (start, ende, info))
+        self.max_dauer = max(self.max_dauer, ende - start)
+
+    def erster_ueberlapp(self, start, ende):
+        """frühester überlappender Eintrag (start, ende, info) oder None"""
+        hi = bisect_left(self.starts, ende)
+        lo = bisect_right(self.starts, start - self.max_dauer, 0, hi)
+        for eintrag in self.eintraege[lo:hi]:
+            if eintrag[1] > start:
+                return eintrag
+        return None
+
+
+class ZugBelegung:
+    """
+    Belegte Zeiträume pro Zug im Speicher: Wartungen + bestehende Fahrten aus der DB
+    (je eine Query für den ganzen Zeitraum) + was während der Planung dazukommt.
+    Ersetzt has_wartung_overlap/find_zug_fahrt_overlap pro (Fahrt, Zug) bei Bulk-Planung.
+    """
+
+    def __init__(self):
+        self._wartungen: dict[int, Intervalle] = {}
+        self._fahrten: dict[int, Intervalle] = {}
+
+    @classmethod
+    def laden(cls, zug_ids, von: datetime, bis: datetime) -> "ZugBelegung":
+        b = cls()
+        zug_ids = sorted(set(zug_ids))
+        if not zug_ids:
+            return b
+
+        for w in db.session.execute(
+            sa.select(ZugWartung.zug_id, ZugWartung.von, ZugWartung.bis)
+            .where(ZugWartung.zug_id.in_(zug_ids), ZugWartung.von < bis, ZugWartung.bis > von)
+        ):
+            b._wartungen.setdefault(w.zug_id, Intervalle()).einfuegen(w.von, w.bis, "Wartung")
+
+        with db.session.no_autoflush:
+            rows = db.session.execute(
+                sa.select(
+                    Fahrtdurchfuehrung.zug_id, Fahrtdurchfuehrung.abfahrt_zeit,
+                    Fahrtdurchfuehrung.ende_zeit, Fahrtdurchfuehrung.fahrt_id,
+                )
+                .where(
+                    Fahrtdurchfuehrung.zug_id.in_(zug_ids),
+                    Fahrtdurchfuehrung.abfahrt_zeit < bis,
+                    Fahrtdurchfuehrung.ende_zeit > von,
+                )
+            ).all()
+        for r in rows:
+            b.belegen(r.zug_id, r.abfahrt_zeit, r.ende_zeit, r.fahrt_id)
+        return b
+
+    def belegen(self, zug_id: int, start: datetime, ende: datetime, info) -> None:
+        self._fahrten.setdefault(zug_id, Intervalle()).einfuegen(start, ende, info)
+
+    def konflikt(self, zug_id: int, start: datetime, ende: datetime):
+        """
+        None wenn der Zug frei ist, sonst (start, ende, info) vom Hindernis: erst Wartung
+        (info "Wartung"), dann die früheste überlappende Fahrt (info = fahrt_id bzw. was
+        bei belegen() mitgegeben wurde)
+        """
+        for intervalle in (self._wartungen.get(zug_id), self._fahrten.get(zug_id)):
+            if intervalle is not None:
+                eintrag = intervalle.erster_ueberlapp(start, ende)
+                if eintrag is not None:
+                    return eintrag
+        return None
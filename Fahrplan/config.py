@@ -6,4 +6,5 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
 
-    
+    # Mindest-Ruhezeit zwischen zwei Fahrten einer Person (Bulk-Preview)
+    CREW_RUHEZEIT_MIN = int(os.environ.get('CREW_RUHEZEIT_MIN') or 30)
@@ -0,0 +1,35 @@
+"""fahrt_aenderung log for delta snapshot
+
+Revision ID: 7c1e9a2b4d30
+Revises: 0a4f2c026d15
+Create Date: 2026-03-02 10:12:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1e9a2b4d30'
+down_revision = '0a4f2c026d15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('fahrt_aenderung',
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('fahrt_id', sa.Integer(), nullable=False),
+    sa.Column('zeitpunkt', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('seq', name=op.f('pk_fahrt_aenderung')),
+    sqlite_autoincrement=True
+    )
+    with op.batch_alter_table('fahrt_aenderung', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_fahrt_aenderung_fahrt_id'), ['fahrt_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('fahrt_aenderung', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_fahrt_aenderung_fahrt_id'))
+
+    op.drop_table('fahrt_aenderung')
@@ -0,0 +1,37 @@
+"""ende_zeit on fahrtdurchfuehrung + index for overlap checks
+
+Revision ID: 9d4b6f1a3c82
+Revises: 7c1e9a2b4d30
+Create Date: 2026-03-09 09:41:27.530118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4b6f1a3c82'
+down_revision = '7c1e9a2b4d30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('fahrtdurchfuehrung', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ende_zeit', sa.DateTime(), nullable=True))
+
+    # bestehende Fahrten: Ende = letzte Ankunft
+    op.execute(
+        "UPDATE fahrtdurchfuehrung SET ende_zeit = ("
+        " SELECT MAX(fahrt_halt.ankunft_zeit) FROM fahrt_halt"
+        " WHERE fahrt_halt.fahrt_id = fahrtdurchfuehrung.fahrt_id)"
+    )
+
+    with op.batch_alter_table('fahrtdurchfuehrung', schema=None) as batch_op:
+        batch_op.create_index('ix_fahrtdurchfuehrung_zug_zeitraum', ['zug_id', 'abfahrt_zeit', 'ende_zeit'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('fahrtdurchfuehrung', schema=None) as batch_op:
+        batch_op.drop_index('ix_fahrtdurchfuehrung_zug_zeitraum')
+        batch_op.drop_column('ende_zeit')
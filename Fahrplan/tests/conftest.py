@@ -0,0 +1,148 @@
+import os
+
+# Tests laufen immer gegen eine leere In-Memory Datenbank (nie gegen app.db)
+os.environ["DATABASE_URL"] = "sqlite://"
+
+from datetime import datetime, timedelta
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import event
+
+from app import app as flask_app, db
+from app.services.halteplan_vorlage import vorlage_verwerfen
+from app.models import (
+    Bahnhof, Strecke, Halteplan, Haltepunkt, HalteplanSegment, Zug,
+    Fahrtdurchfuehrung, FahrtHalt, FahrtSegment, FahrtdurchfuehrungStatus,
+)
+
+
+# Flask App mit neuer Datenbank - nach jedem Test wieder leer
+@pytest.fixture(scope='function')
+def app():
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+    # neue DB = neue halteplan_ids, Vorlagen vom letzten Test gelten nicht mehr
+    vorlage_verwerfen()
+
+# Test client
+@pytest.fixture(scope='function')
+def client(app):
+    return app.test_client()
+
+# Test Datenbank session
+@pytest.fixture(scope='function')
+def session(app):
+    return db.session
+
+# zählt SQL-Statements (für Benchmarks / N+1 Checks)
+@pytest.fixture
+def query_counter(app):
+    class Counter:
+        count = 0
+
+    def on_execute(*_args, **_kwargs):
+        Counter.count += 1
+
+    event.listen(db.engine, "before_cursor_execute", on_execute)
+    yield Counter
+    event.remove(db.engine, "before_cursor_execute", on_execute)
+
+
+################
+## TEST-DATEN ##
+################
+
+def seed_halteplan(session, anzahl_halte: int = 4, dauer_min: int = 20, halte_dauer_min: int = 2,
+                   base_price: float = 10.0) -> Halteplan:
+    """Strecke + Bahnhöfe + Halteplan mit anzahl_halte Haltepunkten und Segmenten"""
+    strecke = Strecke(name="Teststrecke")
+    session.add(strecke)
+    bahnhoefe = [Bahnhof(name=f"Bahnhof {i}") for i in range(1, anzahl_halte + 1)]
+    session.add_all(bahnhoefe)
+    session.flush()
+
+    hp = Halteplan(bezeichnung="Test-Halteplan", strecke_id=strecke.id)
+    session.add(hp)
+    session.flush()
+
+    punkte = []
+    for pos, b in enumerate(bahnhoefe, start=1):
+        is_rand = pos == 1 or pos == anzahl_halte
+        hpt = Haltepunkt(halteplan_id=hp.halteplan_id, bahnhof_id=b.id, position=pos,
+                         halte_dauer_min=0 if is_rand else halte_dauer_min)
+        session.add(hpt)
+        punkte.append(hpt)
+    session.flush()
+
+    for pos in range(1, anzahl_halte):
+        session.add(HalteplanSegment(
+            halteplan_id=hp.halteplan_id,
+            von_haltepunkt_id=punkte[pos - 1].id,
+            nach_haltepunkt_id=punkte[pos].id,
+            position=pos,
+            base_price=base_price,
+            duration_min=dauer_min,
+            min_cost=1.0,
+        ))
+    session.commit()
+    return hp
+
+
+def seed_zuege(session, anzahl: int) -> list[Zug]:
+    zuege = [Zug(external_id=1000 + i, bezeichnung=f"Zug {i}") for i in range(1, anzahl + 1)]
+    session.add_all(zuege)
+    session.commit()
+    return zuege
+
+
+def seed_fahrten_bulk(session, halteplan: Halteplan, zug: Zug, anzahl: int, start: datetime,
+                      takt_min: int = 60) -> None:
+    """
+    viele Fahrten inkl. FahrtHalt/FahrtSegment direkt per executemany einfügen
+    (schnell genug für Benchmarks mit tausenden Fahrten)
+    """
+    punkte = sorted(halteplan.haltepunkte, key=lambda h: h.position)
+    segmente = sorted(halteplan.segmente, key=lambda s: s.position)
+
+    fahrten, halte, segs = [], [], []
+    halt_id = 0
+    for k in range(anzahl):
+        fid = k + 1
+        t = start + timedelta(minutes=k * takt_min)
+        fahrten.append({
+            "fahrt_id": fid, "halteplan_id": halteplan.halteplan_id, "zug_id": zug.id,
+            "status": FahrtdurchfuehrungStatus.PLANMAESSIG, "verspaetung_min": 0,
+            "abfahrt_zeit": t, "ende_zeit": t + timedelta(minutes=sum(sg.duration_min for sg in segmente)),
+            "price_factor": 1.0,
+        })
+        ids = []
+        for i, p in enumerate(punkte):
+            if i > 0:
+                t = t + timedelta(minutes=segmente[i - 1].duration_min)
+            halt_id += 1
+            ids.append(halt_id)
+            halte.append({"id": halt_id, "fahrt_id": fid, "bahnhof_id": p.bahnhof_id, "position": i + 1,
+                          "ankunft_zeit": t, "abfahrt_zeit": None if i == len(punkte) - 1 else t})
+        for i, s in enumerate(segmente, start=1):
+            segs.append({"fahrt_id": fid, "von_halt_id": ids[i - 1], "nach_halt_id": ids[i], "position": i,
+                         "final_price": s.base_price, "duration_min": s.duration_min})
+
+    session.execute(sa.insert(Fahrtdurchfuehrung), fahrten)
+    session.execute(sa.insert(FahrtHalt), halte)
+    session.execute(sa.insert(FahrtSegment), segs)
+    session.commit()
+
+
+@pytest.fixture
+def test_halteplan(session):
+    return seed_halteplan(session)
+
+
+@pytest.fixture
+def test_zug(session):
+    return seed_zuege(session, 1)[0]
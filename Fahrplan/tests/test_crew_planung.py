@@ -0,0 +1,117 @@
+import random
+import time as pytime
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import Mitarbeiter, Role, User
+from app.services.crew_planung import crew_einteilen
+from app.services.fahrten_bulk import GeplanteFahrt, fahrten_bulk_anlegen
+
+
+def _mitarbeiter(session, n: int) -> list[int]:
+    users = [User(username=f"ma{i}") for i in range(n)]
+    session.add_all(users)
+    session.flush()
+    ma = [Mitarbeiter(name=f"MA {i}", user_id=u.id) for i, u in enumerate(users)]
+    session.add_all(ma)
+    session.commit()
+    return [m.id for m in ma]
+
+
+def _fenster(rng, anzahl: int, start: datetime, tage: int = 3) -> list[tuple[datetime, datetime]]:
+    out = []
+    for _ in range(anzahl):
+        s = start + timedelta(minutes=rng.randrange(0, tage * 24 * 60, 5))
+        out.append((s, s + timedelta(minutes=rng.randrange(30, 240, 5))))
+    return out
+
+
+def _dienste_pro_person(windows, crews):
+    pro = {}
+    for (s, e), crew in zip(windows, crews):
+        for mid in crew:
+            pro.setdefault(mid, []).append((s, e))
+    return pro
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_kein_overlap_mit_ruhezeit(session, test_halteplan, test_zug, seed):
+    rng = random.Random(seed)
+    ma = _mitarbeiter(session, 25)
+    start = datetime(2026, 5, 4, 0, 0)
+
+    # bestehende Fahrten mit Personal
+    bestehend = [GeplanteFahrt(test_zug.id, start + timedelta(hours=5 * k), rng.sample(ma, 3)) for k in range(12)]
+    fahrten_bulk_anlegen(halteplan_id=test_halteplan.halteplan_id, price_factor=1.0, fahrten=bestehend)
+    session.commit()
+
+    windows = _fenster(rng, 150, start)
+    crews = crew_einteilen(windows, ma, 2, ruhezeit_min=45, seed=seed)
+
+    ruhe = timedelta(minutes=45)
+    pro = _dienste_pro_person(windows, crews)
+    for b in bestehend:
+        for mid in b.mitarbeiter_ids:
+            pro.setdefault(mid, []).append((b.abfahrt, b.abfahrt + timedelta(minutes=64)))
+    for dienste in pro.values():
+        dienste.sort()
+        for (s1, e1), (s2, _e2) in zip(dienste, dienste[1:]):
+            assert e1 + ruhe <= s2
+
+    assert all(len(set(c)) == len(c) <= 2 for c in crews)
+    assert sum(len(c) == 2 for c in crews) > 100
+
+
+def test_last_verteilt_und_zu_wenig_personal(session):
+    start = datetime(2026, 5, 4, 6, 0)
+    # nacheinander, genug Pause -> alle gleich oft
+    windows = [(start + timedelta(hours=2 * k), start + timedelta(hours=2 * k, minutes=60)) for k in range(40)]
+    crews = crew_einteilen(windows, list(range(1, 11)), 3, ruhezeit_min=30, seed=1)
+    counts = Counter(mid for c in crews for mid in c)
+    assert max(counts.values()) - min(counts.values()) <= 1
+
+    # drei gleichzeitige Fahrten, 5 Leute, je 2 -> die dritte bekommt nur noch einen
+    windows = [(start, start + timedelta(hours=1))] * 3
+    crews = crew_einteilen(windows, [1, 2, 3, 4, 5], 2, seed=1)
+    assert sorted(len(c) for c in crews) == [1, 2, 2]
+    assert len({mid for c in crews for mid in c}) == 5
+
+    with pytest.raises(ValueError):
+        crew_einteilen(windows, [1, 2], 3)
+
+
+def test_bulk_preview_markiert_fehlendes_personal(client, session, test_halteplan, test_zug):
+    admin = User(username="admin", role=Role.ADMIN)
+    session.add(admin)
+    session.commit()
+    _mitarbeiter(session, 2)
+    with client.session_transaction() as s:
+        s["_user_id"] = str(admin.id)
+
+    r = client.post("/fahrten/bulk/preview", data={
+        "halteplan_id": test_halteplan.halteplan_id,
+        "start_date": "2026-05-04", "end_date": "2026-05-04", "start_time": "08:00",
+        "interval_minutes": 90, "trips_per_day": 2, "weekdays": ["0"], "crew_size": 2,
+    })
+    html = r.get_data(as_text=True)
+    assert r.status_code == 200
+    # 8:00-9:04, dann 9:30: nur 26 min Pause < Ruhezeit -> zweite Fahrt ohne Personal
+    assert html.count("Nicht genug Personal frei") == 1
+
+
+def test_benchmark_crew_einteilen(session, query_counter):
+    rng = random.Random(7)
+    ma = list(range(1, 301))
+    windows = _fenster(rng, 3000, datetime(2026, 5, 4, 0, 0), tage=14)
+
+    query_counter.count = 0
+    t0 = pytime.perf_counter()
+    crews = crew_einteilen(windows, ma, 4, ruhezeit_min=30, seed=1)
+    t = pytime.perf_counter() - t0
+
+    print(f"\ncrew_einteilen 3000 Fahrten x 300 Mitarbeiter (Crew 4): {t * 1000:.0f} ms, "
+          f"{query_counter.count} Query, {sum(len(c) < 4 for c in crews)} Fahrten unterbesetzt")
+    assert query_counter.count == 1
+    assert t < 1.0
@@ -0,0 +1,322 @@
+import random
+import time as pytime
+from datetime import datetime, timedelta
+
+import pytest
+import sqlalchemy as sa
+
+from app.models import (
+    Dienstzuweisung, FahrtAenderung, FahrtHalt, FahrtSegment, Fahrtdurchfuehrung,
+    FahrtdurchfuehrungStatus, Mitarbeiter, User, ZugWartung,
+)
+from app.services.fahrplan_helper import auto_assign_trains, compute_fahrt_window, is_zug_available, overlaps
+from app.services.fahrt_builder import rebuild_fahrt_halte_und_segmente
+from app.services.fahrt_refresh import refresh_fahrt_snapshot
+from app.services.fahrten_bulk import GeplanteFahrt, fahrten_bulk_anlegen
+from app.services.halteplan_vorlage import halteplan_vorlage, vorlage_verwerfen
+from app.services.wartung_check import find_zug_fahrt_overlap
+from tests.conftest import seed_fahrten_bulk, seed_halteplan, seed_zuege
+
+
+def _erwartet(halteplan, abfahrt: datetime, price_factor: float):
+    """Halte/Segmente so gerechnet wie die alte create_fahrt_internal Schleife"""
+    punkte = sorted(halteplan.haltepunkte, key=lambda h: h.position)
+    segmente = sorted(halteplan.segmente, key=lambda s: s.position)
+    halte = [(punkte[0].bahnhof_id, abfahrt, abfahrt)]
+    segs = []
+    current = abfahrt
+    for i, seg in enumerate(segmente):
+        an = current + timedelta(minutes=seg.duration_min)
+        ab = None if i + 1 == len(punkte) - 1 else an + timedelta(minutes=punkte[i + 1].halte_dauer_min)
+        halte.append((punkte[i + 1].bahnhof_id, an, ab))
+        segs.append((i + 1, round(seg.base_price * price_factor, 2), seg.duration_min))
+        current = ab or an
+    return halte, segs
+
+
+def _mitarbeiter(session, n: int) -> list[int]:
+    users = [User(username=f"ma{i}") for i in range(n)]
+    session.add_all(users)
+    session.flush()
+    ma = [Mitarbeiter(name=f"MA {i}", user_id=u.id) for i, u in enumerate(users)]
+    session.add_all(ma)
+    session.commit()
+    return [m.id for m in ma]
+
+
+def test_wie_einzelanlage(session):
+    hp = seed_halteplan(session, anzahl_halte=5, dauer_min=17, halte_dauer_min=3, base_price=9.99)
+    zuege = seed_zuege(session, 2)
+    crew = _mitarbeiter(session, 2)
+    start = datetime(2026, 5, 4, 6, 0)
+    geplant = [
+        GeplanteFahrt(zug_id=zuege[k % 2].id, abfahrt=start + timedelta(hours=k), mitarbeiter_ids=crew[:k % 3])
+        for k in range(6)
+    ]
+
+    ids = fahrten_bulk_anlegen(halteplan_id=hp.halteplan_id, fahrten=geplant, price_factor=1.3)
+    session.commit()
+
+    assert len(ids) == 6
+    for fid, g in zip(ids, geplant):
+        f = session.get(Fahrtdurchfuehrung, fid)
+        assert (f.zug_id, f.abfahrt_zeit, f.price_factor) == (g.zug_id, g.abfahrt, 1.3)
+
+        halte, segs = _erwartet(hp, g.abfahrt, 1.3)
+        fh = session.scalars(sa.select(FahrtHalt).where(FahrtHalt.fahrt_id == fid).order_by(FahrtHalt.position)).all()
+        assert [(h.bahnhof_id, h.ankunft_zeit, h.abfahrt_zeit) for h in fh] == halte
+
+        fs = session.scalars(
+            sa.select(FahrtSegment).where(FahrtSegment.fahrt_id == fid).order_by(FahrtSegment.position)
+        ).all()
+        assert [(s.position, s.final_price, s.duration_min) for s in fs] == segs
+        assert [(s.von_halt_id, s.nach_halt_id) for s in fs] == [(a.id, b.id) for a, b in zip(fh, fh[1:])]
+
+        dienst = session.scalars(sa.select(Dienstzuweisung.mitarbeiter_id).where(Dienstzuweisung.fahrt_id == fid))
+        assert sorted(dienst) == sorted(g.mitarbeiter_ids)
+
+    # Core-Inserts -> Änderungsprotokoll muss trotzdem stimmen (Snapshot-Delta)
+    assert set(session.scalars(sa.select(FahrtAenderung.fahrt_id))) == set(ids)
+
+
+def test_fehler_vom_halteplan(session):
+    hp = seed_halteplan(session, anzahl_halte=3)
+    zug = seed_zuege(session, 1)[0]
+    session.delete(hp.segmente[-1])
+    session.commit()
+
+    with pytest.raises(ValueError, match="passen nicht"):
+        fahrten_bulk_anlegen(halteplan_id=hp.halteplan_id,
+                             fahrten=[GeplanteFahrt(zug.id, datetime(2026, 5, 4, 8, 0))], price_factor=1.0)
+    with pytest.raises(ValueError, match="zu wenige Haltepunkte"):
+        fahrten_bulk_anlegen(halteplan_id=hp.halteplan_id + 1,
+                             fahrten=[GeplanteFahrt(zug.id, datetime(2026, 5, 4, 8, 0))], price_factor=1.0)
+    with pytest.raises(ValueError, match="Preisfaktor"):
+        fahrten_bulk_anlegen(halteplan_id=hp.halteplan_id, fahrten=[], price_factor=0.5)
+
+
+def test_konflikte(session, test_halteplan):
+    zug, zug2 = seed_zuege(session, 2)
+    # bestehend (seed ohne Haltezeit): 8:00-9:00, 9:00-10:00, 10:00-11:00
+    seed_fahrten_bulk(session, test_halteplan, zug, 3, datetime(2026, 5, 4, 8, 0))
+    session.add(ZugWartung(zug_id=zug2.id, external_wartungszeitid=1,
+                           von=datetime(2026, 5, 4, 12, 0), bis=datetime(2026, 5, 4, 14, 0)))
+    session.commit()
+
+    def anlegen(*fahrten):
+        return fahrten_bulk_anlegen(halteplan_id=test_halteplan.halteplan_id,
+                                    fahrten=[GeplanteFahrt(z.id, t) for z, t in fahrten], price_factor=1.0)
+
+    with pytest.raises(RuntimeError, match=r"^Konflikt: Zug ist bereits in Fahrtdurchführung #1 "):
+        anlegen((zug, datetime(2026, 5, 4, 7, 0)))
+    with pytest.raises(RuntimeError, match=r"Konflikt bei Fahrt #2: Zug ist bereits in Fahrtdurchführung #3 "):
+        anlegen((zug2, datetime(2026, 5, 4, 9, 0)), (zug, datetime(2026, 5, 4, 10, 30)))
+    with pytest.raises(RuntimeError, match="Wartung"):
+        anlegen((zug2, datetime(2026, 5, 4, 11, 0)))
+    with pytest.raises(RuntimeError, match="Fahrt #1 und Fahrt #3 verwenden"):
+        anlegen((zug2, datetime(2026, 5, 4, 6, 0)), (zug2, datetime(2026, 5, 4, 8, 0)),
+                (zug2, datetime(2026, 5, 4, 6, 30)))
+    session.rollback()
+    assert session.scalar(sa.select(sa.func.count()).select_from(Fahrtdurchfuehrung)) == 3
+
+    # genau anschließend (Ende == Start) ist kein Konflikt
+    ids = anlegen((zug, datetime(2026, 5, 4, 11, 0)), (zug, datetime(2026, 5, 4, 12, 4)),
+                  (zug2, datetime(2026, 5, 4, 14, 0)))
+    assert len(ids) == 3
+
+
+def test_doppelte_abfahrt_bei_fahrzeit_null(session):
+    # Halteplan ohne Fahrzeit -> Zeitfenster Länge 0, der Überlappungs-Check sieht die Doppelung nicht
+    hp = seed_halteplan(session, anzahl_halte=2, dauer_min=0)
+    zug = seed_zuege(session, 1)[0]
+    t = datetime(2026, 5, 4, 8, 0)
+    with pytest.raises(RuntimeError, match="Fahrt #1 und Fahrt #2 verwenden"):
+        fahrten_bulk_anlegen(halteplan_id=hp.halteplan_id, price_factor=1.0,
+                             fahrten=[GeplanteFahrt(zug.id, t), GeplanteFahrt(zug.id, t)])
+    session.rollback()
+    assert session.scalar(sa.select(sa.func.count()).select_from(Fahrtdurchfuehrung)) == 0
+
+
+def test_benchmark_bulk_vs_einzeln(session, query_counter):
+    """Intervall-Anlage: 500 Fahrten einzeln (wie vorher: eine Fahrt pro Aufruf) vs. ein Aufruf"""
+    hp = seed_halteplan(session, anzahl_halte=8)
+    zuege = seed_zuege(session, 10)
+    start = datetime(2026, 6, 1, 5, 0)
+    geplant = [GeplanteFahrt(zuege[k % 10].id, start + timedelta(minutes=30 * k)) for k in range(500)]
+    zeilen = 500 * (1 + 8 + 7)
+
+    einzeln = [GeplanteFahrt(g.zug_id, g.abfahrt + timedelta(days=60)) for g in geplant[:100]]
+    query_counter.count = 0
+    t0 = pytime.perf_counter()
+    for g in einzeln:
+        fahrten_bulk_anlegen(halteplan_id=hp.halteplan_id, fahrten=[g], price_factor=1.0)
+    t_einzeln = (pytime.perf_counter() - t0) * 5            # auf 500 hochgerechnet
+    q_einzeln = query_counter.count * 5
+
+    query_counter.count = 0
+    t0 = pytime.perf_counter()
+    fahrten_bulk_anlegen(halteplan_id=hp.halteplan_id, fahrten=geplant, price_factor=1.0)
+    t_bulk = pytime.perf_counter() - t0
+    q_bulk = query_counter.count
+    session.commit()
+
+    print(f"\n500 Fahrten ({zeilen} Zeilen): einzeln {t_einzeln:.2f} s / {q_einzeln} Statements "
+          f"({zeilen / t_einzeln:,.0f} Zeilen/s) | bulk {t_bulk:.2f} s / {q_bulk} Statements "
+          f"({zeilen / t_bulk:,.0f} Zeilen/s)")
+    assert q_bulk <= 15           # konstant: 4 SELECTs + Inserts in Batches zu 1000 Zeilen
+    assert t_bulk < t_einzeln
+
+
+def test_vorlage_gecacht_und_verworfen(session, query_counter):
+    hp = seed_halteplan(session, anzahl_halte=4, dauer_min=20, halte_dauer_min=2)
+    v = halteplan_vorlage(hp.halteplan_id)
+    assert (v.ankunft_min, v.abfahrt_min, v.ende_min) == ((0, 20, 42, 64), (0, 22, 44, None), 64)
+
+    query_counter.count = 0
+    start = datetime(2026, 5, 4, 8, 0)
+    fenster = [compute_fahrt_window(hp.halteplan_id, start + timedelta(hours=k)) for k in range(200)]
+    assert query_counter.count == 0
+    assert fenster[3] == (datetime(2026, 5, 4, 11, 0), datetime(2026, 5, 4, 12, 4))
+
+    # wie halteplan_edit: Haltezeit ändern, commit, verwerfen
+    for h in hp.haltepunkte:
+        if h.position == 2:
+            h.halte_dauer_min = 10
+    session.commit()
+    assert halteplan_vorlage(hp.halteplan_id) is v
+    vorlage_verwerfen(hp.halteplan_id)
+    assert halteplan_vorlage(hp.halteplan_id).ende_min == 72
+
+
+def test_rebuild_und_refresh_aus_vorlage(session, test_halteplan, test_zug):
+    f = Fahrtdurchfuehrung(halteplan_id=test_halteplan.halteplan_id, zug_id=test_zug.id,
+                           abfahrt_zeit=datetime(2026, 5, 4, 8, 0), status=FahrtdurchfuehrungStatus.PLANMAESSIG,
+                           verspaetung_min=0, price_factor=1.5)
+    session.add(f)
+    session.flush()
+    rebuild_fahrt_halte_und_segmente(f)
+    session.commit()
+
+    halte, segs = _erwartet(test_halteplan, f.abfahrt_zeit, 1.5)
+    fh = sorted(f.halte, key=lambda h: h.position)
+    assert [(h.bahnhof_id, h.ankunft_zeit, h.abfahrt_zeit) for h in fh] == halte
+    assert [(s.position, s.final_price, s.duration_min) for s in sorted(f.segmente, key=lambda s: s.position)] == segs
+
+    # Snapshot-Refresh: Zeiten nur aus Segmentdauern (ohne Haltezeit), wie bisher
+    assert refresh_fahrt_snapshot(f.fahrt_id) == {"fahrt_id": f.fahrt_id, "halte": 4, "segmente": 3}
+    zeiten = session.scalars(
+        sa.select(FahrtHalt.ankunft_zeit).where(FahrtHalt.fahrt_id == f.fahrt_id).order_by(FahrtHalt.position)
+    ).all()
+    assert zeiten == [datetime(2026, 5, 4, 8, 0) + timedelta(minutes=20 * i) for i in range(4)]
+
+
+def _auto_assign_einzeln(windows, zuege):
+    """Zuweisung wie vorher: is_zug_available pro (Fenster, Zug) gegen die DB"""
+    assigned, lokal = [], {z.id: [] for z in zuege}
+    for start_dt, end_dt in windows:
+        chosen = None
+        for z in zuege:
+            if not is_zug_available(z, start_dt, end_dt)[0]:
+                continue
+            if any(overlaps(start_dt, end_dt, s, e) for s, e in lokal[z.id]):
+                continue
+            chosen = z.id
+            lokal[z.id].append((start_dt, end_dt))
+            break
+        assigned.append(chosen)
+    return assigned
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_auto_assign_trains_wie_vorher(session, test_halteplan, query_counter, seed):
+    rng = random.Random(seed)
+    zuege = seed_zuege(session, 6)
+    start = datetime(2026, 5, 4, 5, 0)
+    # bestehende Fahrten auf Zug 1 und 2, Wartungen auf Zug 3 und 5
+    seed_fahrten_bulk(session, test_halteplan, zuege[0], 12, start, takt_min=90)
+    fahrten_bulk_anlegen(halteplan_id=test_halteplan.halteplan_id, price_factor=1.0, fahrten=[
+        GeplanteFahrt(zuege[1].id, start + timedelta(minutes=rng.randrange(0, 100, 5) + 200 * k)) for k in range(4)
+    ])
+    for k, z in enumerate((zuege[2], zuege[4])):
+        von = start + timedelta(minutes=rng.randrange(0, 600, 10))
+        session.add(ZugWartung(zug_id=z.id, external_wartungszeitid=k + 1, von=von, bis=von + timedelta(hours=3)))
+    session.commit()
+
+    windows = sorted(
+        compute_fahrt_window(test_halteplan.halteplan_id, start + timedelta(minutes=rng.randrange(0, 1200, 5)))
+        for _ in range(60)
+    )
+    erwartet = _auto_assign_einzeln(windows, zuege)
+
+    query_counter.count = 0
+    assert auto_assign_trains(windows, zuege) == erwartet
+    assert query_counter.count <= 2
+    assert None in erwartet and len(set(erwartet)) > 3
+
+
+def test_benchmark_auto_assign(session, test_halteplan, query_counter):
+    zuege = seed_zuege(session, 20)
+    start = datetime(2026, 5, 4, 5, 0)
+    fahrten_bulk_anlegen(halteplan_id=test_halteplan.halteplan_id, price_factor=1.0, fahrten=[
+        GeplanteFahrt(z.id, start + timedelta(hours=3 * k)) for k, z in enumerate(zuege[:10])
+    ])
+    windows = [compute_fahrt_window(test_halteplan.halteplan_id, start + timedelta(minutes=20 * k)) for k in range(300)]
+
+    query_counter.count = 0
+    t0 = pytime.perf_counter()
+    erwartet = _auto_assign_einzeln(windows, zuege)
+    t_einzeln, q_einzeln = pytime.perf_counter() - t0, query_counter.count
+
+    query_counter.count = 0
+    t0 = pytime.perf_counter()
+    assert auto_assign_trains(windows, zuege) == erwartet
+    t_index, q_index = pytime.perf_counter() - t0, query_counter.count
+
+    print(f"\nauto_assign_trains 300 Fahrten x 20 Züge: einzeln {t_einzeln * 1000:.0f} ms / {q_einzeln} Queries"
+          f" | Intervall-Index {t_index * 1000:.1f} ms / {q_index} Queries")
+    assert q_index <= 2
+    assert t_index < t_einzeln
+
+
+def test_ende_zeit_gepflegt_und_overlap_per_index(session, test_halteplan, test_zug, query_counter):
+    [fid] = fahrten_bulk_anlegen(halteplan_id=test_halteplan.halteplan_id, price_factor=1.0,
+                                 fahrten=[GeplanteFahrt(test_zug.id, datetime(2026, 5, 4, 8, 0))])
+    session.commit()
+    f = session.get(Fahrtdurchfuehrung, fid)
+    assert f.ende_zeit == datetime(2026, 5, 4, 9, 4)
+
+    # Abfahrt ändern + neu aufbauen (wie fahrt_edit)
+    f.abfahrt_zeit = datetime(2026, 5, 4, 10, 0)
+    rebuild_fahrt_halte_und_segmente(f)
+    session.commit()
+    assert f.ende_zeit == datetime(2026, 5, 4, 11, 4)
+    refresh_fahrt_snapshot(fid)
+    assert session.get(Fahrtdurchfuehrung, fid).ende_zeit == datetime(2026, 5, 4, 11, 0)   # Refresh: ohne Haltezeit
+
+    assert find_zug_fahrt_overlap(test_zug.id, datetime(2026, 5, 4, 10, 59), datetime(2026, 5, 4, 12, 0)).fahrt_id == fid
+    assert find_zug_fahrt_overlap(test_zug.id, datetime(2026, 5, 4, 11, 0), datetime(2026, 5, 4, 12, 0)) is None
+
+    plan = session.execute(sa.text(
+        "EXPLAIN QUERY PLAN SELECT fahrt_id FROM fahrtdurchfuehrung"
+        " WHERE zug_id = 1 AND abfahrt_zeit < '2026-05-05' AND ende_zeit > '2026-05-04'"
+    )).all()
+    assert "ix_fahrtdurchfuehrung_zug_zeitraum" in str(plan)
+
+
+def test_meine_und_alle_fahrten_start_ende(client, session, test_halteplan, test_zug, query_counter):
+    [ma] = _mitarbeiter(session, 1)
+    start = datetime(2026, 5, 4, 8, 0)
+    fahrten_bulk_anlegen(halteplan_id=test_halteplan.halteplan_id, price_factor=1.0, fahrten=[
+        GeplanteFahrt(test_zug.id, start + timedelta(hours=2 * k), [ma]) for k in range(30)
+    ])
+    session.commit()
+    with client.session_transaction() as s:
+        s["_user_id"] = str(session.get(Mitarbeiter, ma).user_id)
+
+    for url in ("/meine_fahrten", "/fahrten/alle"):
+        query_counter.count = 0
+        html = client.get(url).get_data(as_text=True)
+        assert "Bahnhof 1" in html and "Bahnhof 4" in html
+        assert "04.05.2026 08:00" in html and "04.05.2026 09:04" in html
+        assert "06.05.2026 18:00" in html and "06.05.2026 19:04" in html
+        assert query_counter.count < 15          # nicht pro Fahrt
@@ -0,0 +1,96 @@
+import json
+import time as pytime
+from datetime import datetime
+
+import pytest
+
+from tests.conftest import seed_halteplan, seed_zuege, seed_fahrten_bulk
+
+
+def test_snapshot_format(client, session, test_halteplan, test_zug):
+    seed_fahrten_bulk(session, test_halteplan, test_zug, 2, datetime(2026, 3, 2, 8, 0))
+
+    data = client.get("/api/fahrtdurchfuehrungen/snapshot").get_json()
+    assert data["total"] == 2
+    f1 = data["items"][0]
+    assert f1["fahrtdurchfuehrungId"] == 1
+    assert f1["zugId"] == test_zug.id
+    assert [h["order"] for h in f1["haltepunkte"]] == [1, 2, 3, 4]
+    assert [h["bahnhofName"] for h in f1["haltepunkte"]] == ["Bahnhof 1", "Bahnhof 2", "Bahnhof 3", "Bahnhof 4"]
+    assert [h["tarif"] for h in f1["haltepunkte"]] == [0.0, 10.0, 10.0, 10.0]
+    assert f1["haltepunkte"][0]["planAbfahrt"] == "2026-03-02T08:00:00"
+    assert f1["haltepunkte"][-1]["planAbfahrt"] is None
+    assert f1["haltepunkte"][-1]["planAnkunft"] == "2026-03-02T09:00:00"
+
+
+def test_snapshot_etag(client, session, test_halteplan, test_zug):
+    seed_fahrten_bulk(session, test_halteplan, test_zug, 1, datetime(2026, 3, 2, 8, 0))
+
+    r1 = client.get("/api/fahrtdurchfuehrungen/snapshot")
+    etag = r1.headers["ETag"]
+    r2 = client.get("/api/fahrtdurchfuehrungen/snapshot", headers={"If-None-Match": etag})
+    assert r2.status_code == 304
+
+
+@pytest.mark.parametrize("anzahl", [1, 10, 100])
+def test_snapshot_query_anzahl_konstant(anzahl, client, session, query_counter, test_halteplan, test_zug):
+    # egal wie viele Fahrten: immer 4 Queries (Version, Fahrten, Halte, Segmente)
+    seed_fahrten_bulk(session, test_halteplan, test_zug, anzahl, datetime(2026, 3, 2, 8, 0))
+    session.expire_all()
+
+    query_counter.count = 0
+    data = client.get("/api/fahrtdurchfuehrungen/snapshot").get_json()
+    assert data["total"] == anzahl
+    assert query_counter.count == 4
+
+
+def test_benchmark_snapshot_5000_fahrten(client, session, query_counter):
+    """5 000 Fahrten x 15 Halte: Anzahl Queries bleibt konstant (kein N+1)"""
+    hp = seed_halteplan(session, anzahl_halte=15)
+    zug = seed_zuege(session, 1)[0]
+    seed_fahrten_bulk(session, hp, zug, 5000, datetime(2026, 1, 1, 0, 0), takt_min=15)
+    session.expire_all()
+
+    query_counter.count = 0
+    t0 = pytime.perf_counter()
+    data = client.get("/api/fahrtdurchfuehrungen/snapshot").get_json()
+    dauer = pytime.perf_counter() - t0
+
+    assert data["total"] == 5000
+    assert all(len(f["haltepunkte"]) == 15 for f in data["items"])
+    assert query_counter.count <= 4
+    print(f"\nSnapshot 5000x15: {query_counter.count} Queries, {dauer * 1000:.0f} ms")
+
+
+def _ndjson_zeilen(resp) -> list[dict]:
+    return [json.loads(z) for z in resp.get_data(as_text=True).splitlines() if z]
+
+
+def test_snapshot_ndjson_gleich_wie_json(client, session, test_halteplan, test_zug):
+    seed_fahrten_bulk(session, test_halteplan, test_zug, 25, datetime(2026, 3, 2, 8, 0))
+
+    voll = client.get("/api/fahrtdurchfuehrungen/snapshot").get_json()
+    resp = client.get("/api/fahrtdurchfuehrungen/snapshot", headers={"Accept": "application/x-ndjson"})
+    assert resp.mimetype == "application/x-ndjson"
+    assert resp.is_streamed
+
+    zeilen = _ndjson_zeilen(resp)
+    meta = zeilen.pop()
+    assert zeilen == voll["items"]
+    assert meta == {"version": voll["version"], "total": 25}
+    assert resp.headers["X-Fahrplan-Version"] == str(voll["version"])
+
+    # ?format=ndjson geht auch, Zeitfenster wird beachtet
+    resp = client.get("/api/fahrtdurchfuehrungen/snapshot?format=ndjson&from=2026-03-04")
+    assert _ndjson_zeilen(resp) == [{"version": voll["version"], "total": 0}]
+
+
+def test_snapshot_ndjson_query_anzahl_konstant(client, session, query_counter, test_halteplan, test_zug):
+    seed_fahrten_bulk(session, test_halteplan, test_zug, 200, datetime(2026, 3, 2, 8, 0))
+    session.expire_all()
+
+    query_counter.count = 0
+    resp = client.get("/api/fahrtdurchfuehrungen/snapshot?format=ndjson")
+    assert len(_ndjson_zeilen(resp)) == 201
+    # Version + eine gestreamte Query
+    assert query_counter.count == 2
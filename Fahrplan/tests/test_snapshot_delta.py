@@ -0,0 +1,112 @@
+import json
+from datetime import datetime
+
+from app.models import Fahrtdurchfuehrung, FahrtdurchfuehrungStatus
+from app.services.fahrt_refresh import refresh_fahrt_snapshot
+from tests.conftest import seed_fahrten_bulk
+
+
+def _neue_fahrt(session, halteplan, zug, abfahrt: datetime) -> int:
+    f = Fahrtdurchfuehrung(halteplan_id=halteplan.halteplan_id, zug_id=zug.id, abfahrt_zeit=abfahrt,
+                           status=FahrtdurchfuehrungStatus.PLANMAESSIG, verspaetung_min=0, price_factor=1.0)
+    session.add(f)
+    session.commit()
+    refresh_fahrt_snapshot(f.fahrt_id)
+    return f.fahrt_id
+
+
+def _snapshot(client, **params):
+    r = client.get("/api/fahrtdurchfuehrungen/snapshot", query_string=params)
+    assert r.status_code == 200
+    return r.get_json()
+
+
+def test_delta_neu_geaendert_geloescht(client, session, test_halteplan, test_zug):
+    f1 = _neue_fahrt(session, test_halteplan, test_zug, datetime(2026, 3, 2, 8, 0))
+    v1 = _snapshot(client)["version"]
+
+    # nichts passiert -> leeres Delta
+    delta = _snapshot(client, since=v1)
+    assert (delta["items"], delta["deleted"], delta["version"]) == ([], [], v1)
+
+    # neue Fahrt
+    f2 = _neue_fahrt(session, test_halteplan, test_zug, datetime(2026, 3, 2, 9, 0))
+    delta = _snapshot(client, since=v1)
+    assert [f["fahrtdurchfuehrungId"] for f in delta["items"]] == [f2]
+    assert len(delta["items"][0]["haltepunkte"]) == 4
+    v2 = delta["version"]
+    assert v2 > v1
+
+    # Verspätung an f1
+    fahrt = session.get(Fahrtdurchfuehrung, f1)
+    fahrt.status = FahrtdurchfuehrungStatus.VERSPAETET
+    fahrt.verspaetung_min = 5
+    session.commit()
+    delta = _snapshot(client, since=v2)
+    assert [f["fahrtdurchfuehrungId"] for f in delta["items"]] == [f1]
+    v3 = delta["version"]
+
+    # löschen
+    session.delete(session.get(Fahrtdurchfuehrung, f2))
+    session.commit()
+    delta = _snapshot(client, since=v3)
+    assert delta["items"] == []
+    assert delta["deleted"] == [f2]
+
+    # Delta ab Anfang = alles was es noch gibt
+    delta = _snapshot(client, since=0)
+    assert [f["fahrtdurchfuehrungId"] for f in delta["items"]] == [f1]
+    assert delta["deleted"] == [f2]
+
+
+def test_rollback_schreibt_kein_protokoll(client, session, test_halteplan, test_zug):
+    fid = _neue_fahrt(session, test_halteplan, test_zug, datetime(2026, 3, 2, 8, 0))
+    v = _snapshot(client)["version"]
+
+    fahrt = session.get(Fahrtdurchfuehrung, fid)
+    fahrt.verspaetung_min = 10
+    session.flush()
+    session.rollback()
+
+    assert _snapshot(client)["version"] == v
+
+
+def test_zeitfenster(client, session, test_halteplan, test_zug):
+    # 48 Fahrten stündlich ab 1.3. 00:00 -> je 24 am 1.3. und 2.3.
+    seed_fahrten_bulk(session, test_halteplan, test_zug, 48, datetime(2026, 3, 1, 0, 0))
+
+    data = _snapshot(client, **{"from": "2026-03-02", "to": "2026-03-02"})
+    assert data["total"] == 24
+    assert all(f["haltepunkte"][0]["planAbfahrt"].startswith("2026-03-02") for f in data["items"])
+
+    assert _snapshot(client, **{"from": "2026-03-02"})["total"] == 24
+    assert _snapshot(client, to="2026-03-01")["total"] == 24
+    assert _snapshot(client)["total"] == 48
+
+
+def test_zeitfenster_mit_delta(client, session, test_halteplan, test_zug):
+    f1 = _neue_fahrt(session, test_halteplan, test_zug, datetime(2026, 3, 1, 8, 0))
+    f2 = _neue_fahrt(session, test_halteplan, test_zug, datetime(2026, 3, 2, 8, 0))
+
+    # f1 liegt nicht im Zeitraum -> für den Client wie gelöscht
+    delta = _snapshot(client, since=0, **{"from": "2026-03-02", "to": "2026-03-02"})
+    assert [f["fahrtdurchfuehrungId"] for f in delta["items"]] == [f2]
+    assert delta["deleted"] == [f1]
+
+
+def test_ungueltige_parameter(client, session):
+    assert client.get("/api/fahrtdurchfuehrungen/snapshot?from=gestern").status_code == 400
+    assert client.get("/api/fahrtdurchfuehrungen/snapshot?since=abc").status_code == 400
+    assert client.get("/api/fahrtdurchfuehrungen/snapshot?since=99").status_code == 400
+
+
+def test_delta_als_ndjson(client, session, test_halteplan, test_zug):
+    f1 = _neue_fahrt(session, test_halteplan, test_zug, datetime(2026, 3, 2, 8, 0))
+    f2 = _neue_fahrt(session, test_halteplan, test_zug, datetime(2026, 3, 2, 9, 0))
+    session.delete(session.get(Fahrtdurchfuehrung, f1))
+    session.commit()
+
+    r = client.get("/api/fahrtdurchfuehrungen/snapshot?since=0", headers={"Accept": "application/x-ndjson"})
+    *fahrten, meta = [json.loads(z) for z in r.get_data(as_text=True).splitlines()]
+    assert [f["fahrtdurchfuehrungId"] for f in fahrten] == [f2]
+    assert meta["deleted"] == [f1] and meta["since"] == 0
@@ -0,0 +1,88 @@
+import json
+import struct
+import time as pytime
+from array import array
+from datetime import datetime, timedelta
+
+from app.services.snapshot_kompakt import EPOCH, KOMPAKT_MIMETYPE
+from tests.conftest import seed_halteplan, seed_zuege, seed_fahrten_bulk
+
+
+def _decode(data: bytes) -> tuple[dict, list[dict]]:
+    """liest das Kompakt-Format zurück in die Items vom JSON-Snapshot (nur für die Tests)"""
+    assert data[:4] == b"FPK1"
+    (header_len,) = struct.unpack_from("<I", data, 4)
+    header = json.loads(data[8:8 + header_len])
+    off = 8 + header_len
+
+    def spalte(typecode, n):
+        nonlocal off
+        a = array(typecode)
+        a.frombytes(data[off:off + n * a.itemsize])
+        off += n * a.itemsize
+        return a
+
+    n, m = header["total"], header["halte"]
+    fahrt_ids, hp_ids, zug_ids, offsets = spalte("i", n), spalte("i", n), spalte("i", n), spalte("i", n + 1)
+    halt_ids, bhf, ankunft, abfahrt, tarif = spalte("i", m), spalte("i", m), spalte("i", m), spalte("i", m), spalte("f", m)
+    assert off == len(data)
+
+    def zeit(v):
+        return None if v < 0 else (EPOCH + timedelta(minutes=v)).isoformat()
+
+    items = []
+    for k in range(n):
+        halte = []
+        for j in range(offsets[k], offsets[k + 1]):
+            bid, name = header["bahnhoefe"][bhf[j]]
+            halte.append({
+                "haltId": halt_ids[j], "order": j - offsets[k] + 1, "bahnhofId": bid, "bahnhofName": name,
+                "planAnkunft": zeit(ankunft[j]), "planAbfahrt": zeit(abfahrt[j]), "tarif": round(tarif[j], 4),
+            })
+        items.append({"fahrtdurchfuehrungId": fahrt_ids[k], "halteplanId": hp_ids[k], "zugId": zug_ids[k],
+                      "haltepunkte": halte})
+    return header, items
+
+
+def test_kompakt_gleich_wie_json(client, session, test_halteplan, test_zug):
+    seed_fahrten_bulk(session, test_halteplan, test_zug, 30, datetime(2026, 3, 2, 8, 0))
+
+    voll = client.get("/api/fahrtdurchfuehrungen/snapshot").get_json()
+    resp = client.get("/api/fahrtdurchfuehrungen/snapshot", headers={"Accept": KOMPAKT_MIMETYPE})
+    assert resp.mimetype == KOMPAKT_MIMETYPE
+
+    header, items = _decode(resp.data)
+    assert items == voll["items"]
+    assert header["version"] == voll["version"] and header["total"] == 30
+    assert len(header["bahnhoefe"]) == 4
+
+    # ETag / 304 wie beim JSON
+    r2 = client.get("/api/fahrtdurchfuehrungen/snapshot?format=kompakt",
+                    headers={"If-None-Match": resp.headers["ETag"]})
+    assert r2.status_code == 304
+
+
+def test_json_bleibt_standard(client, session):
+    assert client.get("/api/fahrtdurchfuehrungen/snapshot").mimetype == "application/json"
+    r = client.get("/api/fahrtdurchfuehrungen/snapshot", headers={"Accept": "*/*"})
+    assert r.mimetype == "application/json"
+
+
+def test_benchmark_payload_groesse(client, session):
+    """5 000 Fahrten x 15 Halte: Größe und Erzeugungszeit JSON / NDJSON / kompakt"""
+    hp = seed_halteplan(session, anzahl_halte=15)
+    zug = seed_zuege(session, 1)[0]
+    seed_fahrten_bulk(session, hp, zug, 5000, datetime(2026, 1, 1, 0, 0), takt_min=15)
+
+    groessen = {}
+    for fmt in ("json", "ndjson", "kompakt"):
+        session.expire_all()
+        t0 = pytime.perf_counter()
+        data = client.get(f"/api/fahrtdurchfuehrungen/snapshot?format={fmt}").get_data()
+        groessen[fmt] = (len(data), pytime.perf_counter() - t0)
+
+    print()
+    for fmt, (groesse, dauer) in groessen.items():
+        print(f"Snapshot 5000x15 {fmt:8s}: {groesse / 1024:8.0f} KiB, {dauer * 1000:6.0f} ms")
+
+    assert groessen["kompakt"][0] * 5 < groessen["json"][0]
@@ -20,9 +20,9 @@ def set_sqlite_pragma(dbapi_connection, connection_record):
         cursor.execute("PRAGMA foreign_keys=ON")
         cursor.close()
 
-def create_app():
+def create_app(config_object=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_object)
 
     os.makedirs("instance", exist_ok=True)
 
@@ -33,5 +33,10 @@ def create_app():
     from app.routes import bp as main_bp
     app.register_blueprint(main_bp)
 
+    # abgelaufene Tickets im Hintergrund auf "verbraucht" setzen
+    if app.config.get("TICKET_ABLAUF_JOB"):
+        from app.services.tickets import ablauf_job_starten
+        ablauf_job_starten(app)
+
     return app
 
@@ -46,6 +46,13 @@ class Aktion(db.Model):
 
 
 class Ticket(db.Model):
+    __table_args__ = (
+        # Ablauf-Job: WHERE status = 'aktiv' AND abfahrt <= jetzt
+        db.Index("ix_ticket_status_abfahrt", "status", "abfahrt"),
+        # Meine Tickets: pro User neueste zuerst (Keyset auf erstelltAm, id)
+        db.Index("ix_ticket_user_erstellt", "user_id", "erstelltAm", "id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
 
     # Zu welchem User gehört das Ticket
@@ -91,3 +98,25 @@ class Ticket(db.Model):
 
     def __repr__(self):
         return f"<Ticket {self.id} ({self.start_halt} -> {self.ziel_halt})>"
+
+
+class SitzplatzKontingent(db.Model):
+    """
+    Sitzplätze pro Fahrt: kapazitaet (von Flotten) und die Belegung pro Segment
+    (Segment i = Halt i -> Halt i+1 der Fahrt, als "0,2,3,1" in belegung).
+    reserviert = höchste Belegung über alle Segmente.
+    Geändert wird nur über services/sitzplaetze.py (UPDATE mit version-Bedingung).
+    """
+    __tablename__ = "sitzplatz_kontingent"
+
+    fahrt_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    zug_id = db.Column(db.Integer, nullable=True)
+    kapazitaet = db.Column(db.Integer, nullable=False, default=0)
+    reserviert = db.Column(db.Integer, nullable=False, default=0)
+
+    segmente = db.Column(db.Integer, nullable=True)
+    belegung = db.Column(db.Text, nullable=True)  # NULL = noch nicht aus den Tickets aufgebaut
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<SitzplatzKontingent Fahrt {self.fahrt_id}: {self.reserviert}/{self.kapazitaet}>"
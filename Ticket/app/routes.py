@@ -1,24 +1,40 @@
 from __future__ import annotations
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify
 from flask_login import current_user, login_user, logout_user, login_required
 from urllib.parse import urlparse
-from datetime import datetime, date, time as dtime, timezone
+from datetime import datetime, date, time as dtime
+import time
 
+import sqlalchemy as sa
 from sqlalchemy.exc import IntegrityError
 
 from app import db
 from app.models import User, Aktion, Ticket
 from app.forms import LoginForm, AktionForm, RegisterForm, VerbindungssucheForm, ProfileForm
 
-from app.services.verbindungen import suche_verbindungen  # die Logik bleibt in service
+from app.services.verbindungen import (  # die Logik bleibt in service
+    VerbindungHit,
+    decode_cursor,
+    preis_zwischen,
+    suche_verbindungen_seite,
+)
+from app.services.fahrplan_cache import get_fahrplan, cache_stats
+from app.services.parallel import parallel_holen, zeiten_loggen
+from app.services.tickets import tickets_seite
+from app.services.sitzplaetze import (
+    Sammelreservierung,
+    platz_reservieren,
+    teilstrecke,
+    ticket_freigeben,
+    zug_kapazitaet,
+)
+from app.services.aktionen_cache import AktionInfo, get_aktionen_index, invalidate_aktionen
+from app.services.verbindungen_cache import get_verbindungen_cache, verbindungen_cache_stats
+from app.services.warnungen_index import WarnungsIndex, build_warnungs_index, get_warnungs_index
 from app.services.external_clients import (
     strecken_bahnhoefe,
-    strecken_warnungen,
-    flotte_kapazitaet,
     fahrplan_halteplaene,
-    fahrplan_snapshot,
-    parse_gmt_dt,
 )
 
 bp = Blueprint("main", __name__)
@@ -71,75 +87,84 @@ def lade_bahnhoefe() -> list[str]:
     ]
 
 
-def ermittle_beste_aktion(verbindungs_datum: datetime, halteplan_id: int | None):
+def ermittle_beste_aktion(verbindungs_datum: datetime, halteplan_id: int | None) -> AktionInfo | None:
     """
     beste Aktion = maximaler Rabatt
     Wenn gleich- bevorzuge HALTEPLAN vor GLOBAL
+    (aus dem Aktionen-Cache, keine DB-Abfrage pro Treffer)
     """
-    aktive = Aktion.query.filter_by(aktiv=True).all()
-    kandidaten: list[Aktion] = []
-
-    for a in aktive:
-        sd = _as_date(a.startZeit)
-        ed = _as_date(a.endeZeit)
-        if not sd or not ed:
-            continue
+    return get_aktionen_index().best_for(verbindungs_datum, halteplan_id)
 
-        if sd <= verbindungs_datum.date() <= ed:
-            if a.typ == "global":
-                kandidaten.append(a)
-            elif a.typ == "halteplan" and halteplan_id is not None and a.halteplanId == halteplan_id:
-                kandidaten.append(a)
 
-    if not kandidaten:
+def _zug_aus_fahrplan(fahrplan, fahrt_id: int, zug_id: int) -> int | None:
+    """
+    Zug der Fahrt laut Fahrplan (Sitzplatz-Kapazität hängt daran), None wenn der Client
+    einen anderen Zug mitschickt. 0 / nicht mitgeschickt = Zug aus dem Fahrplan
+    """
+    richtig = int(fahrplan.ride(fahrt_id)["zug_id"] or 0)
+    if zug_id and zug_id != richtig:
         return None
+    return richtig
+
+
+def _preis_nachrechnen(
+    fahrplan,
+    fahrt_id: int,
+    fahrt_id2: int | None,
+    start_halt: str,
+    ziel_halt: str,
+    umstieg_bahnhof: str | None,
+    abfahrt: datetime,
+    umstieg_abfahrt: datetime | None,
+    halteplan_id: int | None,
+) -> tuple[float | None, AktionInfo | None]:
+    """
+    Preis einer Verbindung so wie ihn die Suche anzeigt: Tarif(e) aus dem Fahrplan + beste Aktion
+    (None wenn die Fahrt(en) die Strecke so nicht fahren)
+    """
+    if fahrt_id2:
+        p1 = preis_zwischen(fahrt_id, start_halt, umstieg_bahnhof, abfahrt, fahrplan)
+        p2 = preis_zwischen(fahrt_id2, umstieg_bahnhof, ziel_halt, umstieg_abfahrt, fahrplan)
+        if p1 is None or p2 is None:
+            return None, None
+        preis = round(p1 + p2, 2)
+    else:
+        preis = preis_zwischen(fahrt_id, start_halt, ziel_halt, abfahrt, fahrplan)
+        if preis is None:
+            return None, None
 
-    # max by (rabatt, halteplanBonus)
-    return max(
-        kandidaten,
-        key=lambda a: (
-            float(a.rabattWert or 0.0),
-            1 if a.typ == "halteplan" else 0
-        )
-    )
+    aktion = ermittle_beste_aktion(abfahrt, halteplan_id)
+    if aktion:
+        preis = round(preis * (1 - float(aktion.rabattWert or 0.0) / 100.0), 2)
+    return preis, aktion
 
 
 def _build_snapshot_map() -> dict[int, list[str]]:
     """
     map fahrt_id -> [BahnhofName in Reihenfolge]
-    (kommt aus Fahrplan-Snapshot, für Warnungs-Mapping auf Abschnitte)
+    (kommt aus dem Fahrplan-Cache, für Warnungs-Mapping auf Abschnitte)
     """
     try:
-        snap = fahrplan_snapshot()
+        return get_fahrplan().namen
     except Exception:
         return {}
 
-    out: dict[int, list[str]] = {}
-    for it in (snap.get("items") or []):
-        fid = int(it.get("fahrtdurchfuehrungId") or 0)
-        hps = list(it.get("haltepunkte") or [])
-        hps.sort(key=lambda x: int(x.get("order") or 0))
-
-        names = [hp.get("bahnhofName") for hp in hps if hp.get("bahnhofName")]
-        if fid and names:
-            out[fid] = names
-    return out
-
 
 def _slice_between(names: list[str], start_name: str, end_name: str) -> list[str]:
     """
     Sucht "kleinste" Teilsequenz start..end innerhalb names
     (falls Bahnhof mehrfach vorkommt, nimmt er die kürzeste passende Strecke)
+    ein Durchlauf: zu jedem End-Vorkommen zählt nur der letzte Start davor
     """
-    starts = [i for i, n in enumerate(names) if n == start_name]
-    ends = [j for j, n in enumerate(names) if n == end_name]
     best = None
+    letzter_start = None
 
-    for i in starts:
-        for j in ends:
-            if j > i:
-                if best is None or (j - i) < (best[1] - best[0]):
-                    best = (i, j)
+    for k, n in enumerate(names):
+        if n == end_name and letzter_start is not None:
+            if best is None or (k - letzter_start) < (best[1] - best[0]):
+                best = (letzter_start, k)
+        if n == start_name:
+            letzter_start = k
 
     if not best:
         return []
@@ -163,59 +188,8 @@ def _pairs_for_leg(snapshot_map: dict[int, list[str]], fahrt_id: int, start_name
     return {(seq[i], seq[i + 1]) for i in range(len(seq) - 1)}
 
 
-def _warnung_matches_time(w: dict, travel_start: datetime, travel_end: datetime) -> bool:
-    """
-    check ob Warnung zeitlich überlappt mit der Reise
-    Warnungen kommen als GMT-String (RFC format), parse_gmt_dt macht daraus UTC aware
-    jedoch Vergleich "naiv" (ohne tzinfo) => normalize auf naive UTC
-    """
-    ws = parse_gmt_dt(w.get("startZeit"))
-    we = parse_gmt_dt(w.get("endZeit"))
-
-    def norm(dt: datetime | None) -> datetime | None:
-        if dt is None:
-            return None
-        if dt.tzinfo:
-            dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
-        return dt
-
-    ws_n = norm(ws)
-    we_n = norm(we) or datetime.max
-
-    if ws_n is None:
-        return False
-
-    # overlap check
-    return ws_n <= travel_end and travel_start <= we_n
-
-
-def _warnung_matches_segments(w: dict, seg_pairs: set[tuple[str, str]]) -> bool:
-    """
-    check ob Warnung zu irgendeinem Abschnitt (Segment) passt, den die Verbindung wirklich fährt
-    abschnitte kommen jetzt im Strecken-API mit: vonName/nachName, etc.
-    """
-    abschnitte = w.get("abschnitte") or []
-    if not abschnitte:
-        return True
-
-    if not seg_pairs:
-        return False
-
-    for a in abschnitte:
-        von = a.get("vonName")
-        nach = a.get("nachName")
-        if not von or not nach:
-            continue
-
-        # akzeptieren beider Richtungen
-        if (von, nach) in seg_pairs or (nach, von) in seg_pairs:
-            return True
-
-    return False
-
-
 def warnungen_fuer_verbindung(
-    warn_items: list[dict],
+    warn_index: WarnungsIndex,
     snapshot_map: dict[int, list[str]],
     v: dict
 ) -> list[dict]:
@@ -223,6 +197,7 @@ def warnungen_fuer_verbindung(
     filtert Warnungen für eine Verbindung:
       1) Zeit passt
       2) Abschnitt passt (über Segment-Mapping)
+    beides über den vorkompilierten Index (services/warnungen_index.py)
     """
     travel_start: datetime = v["abfahrt"]
     travel_end: datetime = v["ankunft"]
@@ -238,15 +213,7 @@ def warnungen_fuer_verbindung(
     else:
         seg_pairs |= _pairs_for_leg(snapshot_map, int(v["fahrt_id"]), v["start_halt"], v["ziel_halt"])
 
-    hits: list[dict] = []
-    for w in warn_items:
-        if not _warnung_matches_time(w, travel_start, travel_end):
-            continue
-        if not _warnung_matches_segments(w, seg_pairs):
-            continue
-        hits.append(w)
-
-    return hits
+    return warn_index.passende(seg_pairs, travel_start, travel_end)
 
 
 # -----------------------------
@@ -404,6 +371,7 @@ def aktion_global_new():
             )
             db.session.add(aktion)
             db.session.commit()
+            invalidate_aktionen()
             flash("Globale Aktion angelegt.")
             return redirect(url_for("main.aktionen_uebersicht"))
         flash("Bitte alle Pflichtfelder ausfüllen.")
@@ -445,6 +413,7 @@ def aktion_fahrplan_new():
             )
             db.session.add(aktion)
             db.session.commit()
+            invalidate_aktionen()
             flash("Fahrplan-Aktion angelegt.")
             return redirect(url_for("main.aktionen_uebersicht"))
         flash("Bitte alle Pflichtfelder ausfüllen.")
@@ -465,6 +434,7 @@ def aktion_stop(aktion_id: int):
         aktion.aktiv = False
         aktion.endeZeit = now.date()  # "jetzt" beenden
         db.session.commit()
+        invalidate_aktionen()
         flash("Aktion wurde beendet.", "success")
     else:
         flash("Aktion ist nicht aktiv – nichts zu beenden.", "info")
@@ -525,6 +495,7 @@ def aktion_edit(aktion_id):
                 aktion.halteplanId = int(form.halteplanId.data) if form.halteplanId.data else None
 
             db.session.commit()
+            invalidate_aktionen()
             flash("Aktion aktualisiert.")
             return redirect(url_for("main.aktionen_uebersicht"))
 
@@ -544,6 +515,7 @@ def aktion_delete(aktion_id):
     try:
         db.session.delete(aktion)
         db.session.commit()
+        invalidate_aktionen()
         flash("Aktion gelöscht")
     except IntegrityError:
         db.session.rollback()
@@ -563,16 +535,26 @@ def verbindungssuche():
     verbindungen: list[dict] = []
     warnungen_global: list[dict] = []
 
+    t0 = time.perf_counter()
+
+    # Bahnhöfe (Dropdown), beim Suchen auch Fahrplan + Warnungen: alles gleichzeitig holen,
+    # mit einer gemeinsamen Frist statt der Summe aller Wartezeiten
+    aufgaben = {"bahnhoefe": strecken_bahnhoefe}  # ohne query => alle
+    if request.method == "POST":
+        aufgaben["fahrplan"] = get_fahrplan
+        aufgaben["warnungen"] = get_warnungs_index
+    upstream = parallel_holen(aufgaben, frist_sek=float(current_app.config.get("VERBINDUNGSSUCHE_FRIST_SEK", 10)))
+
     # Dropdown befüllen (jedes Mal, damit neue Bahnhöfe sofort drin sind)
-    try:
-        data = strecken_bahnhoefe()  # ohne query => alle
-        items = data.get("items") or []
+    bahnhoefe = upstream["bahnhoefe"]
+    if bahnhoefe.ok:
+        items = (bahnhoefe.wert or {}).get("items") or []
         names = sorted({
             (b.get("name") or "").strip()
             for b in items
             if (b.get("name") or "").strip()
         })
-    except Exception:
+    else:
         names = []
 
     choices = [("", "-- bitte wählen --")] + [(n, n) for n in names]
@@ -590,21 +572,45 @@ def verbindungssuche():
             return render_template("verbindungssuche.html", title="Verbindungssuche", form=form,
                                    verbindungen=[], warnungen=[], bahnhoefe=[])
 
-        hits = suche_verbindungen(start, ziel, datum, ab_zeit=ab_zeit_val)
+        # Fahrplan einmal aus dem Cache holen, Suche + Warnungen verwenden dasselbe Modell
+        if not upstream["fahrplan"].ok:
+            zeiten_loggen("verbindungssuche", upstream, (time.perf_counter() - t0) * 1000)
+            flash("Fahrplan-Service nicht erreichbar, bitte später nochmal versuchen.", "warning")
+            return render_template("verbindungssuche.html", title="Verbindungssuche", form=form,
+                                   verbindungen=[], warnungen=[], bahnhoefe=[])
+        fahrplan = upstream["fahrplan"].wert
 
-        # nur zukünftige Verbindungen behalten
+        # nur zukünftige Verbindungen: heute erst ab jetzt suchen, damit die Seite voll wird
         now = _now_utc()
-        hits = [h for h in hits if getattr(h, "abfahrt", None) and h.abfahrt > now]
+        if datum == now.date():
+            ab_zeit_val = max(ab_zeit_val, now.time()) if ab_zeit_val else now.time()
 
-        # Warnungen laden / mapping bleibt wie bei dir
+        # Tickets können max. 1 Umstieg speichern => auch bei CSA max_umstiege=1
+        # seitenweise: "Spätere Verbindungen" schickt den Cursor der letzten Verbindung mit
+        cursor = request.form.get("cursor") or None
         try:
-            warn_items = (strecken_warnungen().get("items") or [])
-        except Exception:
-            warn_items = []
+            if cursor:
+                decode_cursor(cursor)
+        except ValueError:
+            cursor = None  # kaputter Cursor => von vorne
+        seite = suche_verbindungen_seite(
+            start, ziel, datum, ab_zeit=ab_zeit_val,
+            limit=int(current_app.config.get("VERBINDUNGSSUCHE_SEITE", 20)),
+            cursor=cursor,
+            modus=current_app.config.get("VERBINDUNGSSUCHE_MODUS", "standard"),
+            max_umstiege=1,
+            fahrplan=fahrplan,
+        )
+        hits = [h for h in seite.hits if getattr(h, "abfahrt", None) and h.abfahrt > now]
+
+        # Warnungen / mapping bleibt wie bei dir
+        warnungen = upstream["warnungen"]
+        warn_index = warnungen.wert if warnungen.ok else build_warnungs_index([])
 
-        snapshot_map = _build_snapshot_map()
+        snapshot_map = fahrplan.namen
 
         if not hits:
+            zeiten_loggen("verbindungssuche", upstream, (time.perf_counter() - t0) * 1000)
             flash("Keine zukünftigen Verbindungen gefunden.")
             return render_template("verbindungssuche.html", title="Verbindungssuche",
                                    form=form, verbindungen=[], warnungen=[], bahnhoefe=[])
@@ -654,12 +660,15 @@ def verbindungssuche():
                 "warnungen": [],
             }
 
-            v["warnungen"] = warnungen_fuer_verbindung(warn_items, snapshot_map, v)
+            v["warnungen"] = warnungen_fuer_verbindung(warn_index, snapshot_map, v)
             verbindungen.append(v)
 
+        zeiten_loggen("verbindungssuche", upstream, (time.perf_counter() - t0) * 1000)
         return render_template("verbindungssuche.html", title="Verbindungssuche",
-                               form=form, verbindungen=verbindungen, warnungen=warnungen_global,)
+                               form=form, verbindungen=verbindungen, warnungen=warnungen_global,
+                               next_cursor=seite.next_cursor)
 
+    zeiten_loggen("verbindungssuche", upstream, (time.perf_counter() - t0) * 1000)
     return render_template("verbindungssuche.html", title="Verbindungssuche",
                            form=form, verbindungen=[], warnungen=[], bahnhoefe=[])
 
@@ -707,16 +716,35 @@ def ticket_buchen(fahrt_id):
         flash("Verbindungsdaten ungültig.")
         return redirect(url_for("main.verbindungssuche"))
 
+    # Formular kann nur 2 Fahrten -> höchstens 1 Umstieg (sonst wird der Preis nicht geprüft)
+    if umstiege < 0 or umstiege > 1:
+        flash("Verbindungsdaten ungültig.")
+        return redirect(url_for("main.verbindungssuche"))
+
+    # Fahrt(en) müssen im aktuellen Fahrplan noch existieren (Fahrplan-Cache).
+    # Ohne Fahrplan kein Preis-Check -> nicht buchen
+    try:
+        fahrplan = get_fahrplan()
+    except Exception:
+        flash("Fahrplan nicht erreichbar.", "warning")
+        return redirect(url_for("main.verbindungssuche"))
+    if fahrplan.ride(fahrt_id) is None or (fahrt_id2 and fahrplan.ride(fahrt_id2) is None):
+        flash("Diese Verbindung existiert im Fahrplan nicht mehr.", "warning")
+        return redirect(url_for("main.verbindungssuche"))
+
+    # Zug(e) aus dem Fahrplan, nicht aus dem Formular
+    zug_id = _zug_aus_fahrplan(fahrplan, fahrt_id, zug_id)
+    zug_id2 = _zug_aus_fahrplan(fahrplan, fahrt_id2, zug_id2) if fahrt_id2 else 0
+    if zug_id is None or zug_id2 is None:
+        flash("Verbindungsdaten ungültig.")
+        return redirect(url_for("main.verbindungssuche"))
+
     # Vergangenheit blocken
     now = _now_utc()
     if abfahrt <= now:
         flash("Vergangene Verbindungen können nicht gebucht werden.", "warning")
         return redirect(url_for("main.verbindungssuche"))
 
-    # Sitzplatzpreis erst hier draufrechnen
-    if sitzplatz:
-        preis = round(preis + 5.0, 2)
-
     # Umstiegzeiten
     umstieg_ank = None
     umstieg_ab = None
@@ -728,35 +756,59 @@ def ticket_buchen(fahrt_id):
             umstieg_ank = None
             umstieg_ab = None
 
-    # Sitzplatz: lokale Reservierung
+    # Preis nicht aus dem Formular übernehmen, sondern nachrechnen (Präfixsummen im Fahrplan-Cache,
+    # keine zweite Suche)
+    erwartet, aktion = _preis_nachrechnen(
+        fahrplan, fahrt_id, fahrt_id2, start_halt, ziel_halt, umstieg_bahnhof,
+        abfahrt, umstieg_ab, int(halteplan_id) if halteplan_id else None,
+    )
+    if erwartet is None:
+        flash("Diese Verbindung existiert im Fahrplan nicht mehr.", "warning")
+        return redirect(url_for("main.verbindungssuche"))
+    if abs(erwartet - preis) > 0.005:
+        flash(f"Der Preis dieser Verbindung hat sich geändert ({erwartet:.2f} €), bitte neu suchen.", "warning")
+        return redirect(url_for("main.verbindungssuche"))
+    preis = erwartet
+    aktion_id = aktion.id if aktion else None
+
+    # Sitzplatzpreis erst hier draufrechnen
+    if sitzplatz:
+        preis = round(preis + 5.0, 2)
+
+    # Sitzplatz: lokale Reservierung, nur auf den Segmenten start..ziel (bei Umstieg beide Fahrten)
     if sitzplatz:
         # basic checks
         if not zug_id:
             flash("Sitzplatzreservierung nicht möglich (keine Zug-ID).", "warning")
             return redirect(url_for("main.verbindungssuche"))
+        if fahrt_id2:
+            strecken = [
+                teilstrecke(fahrplan, fahrt_id, start_halt, umstieg_bahnhof, abfahrt),
+                teilstrecke(fahrplan, fahrt_id2, umstieg_bahnhof, ziel_halt, umstieg_ab),
+            ]
+        else:
+            strecken = [teilstrecke(fahrplan, fahrt_id, start_halt, ziel_halt, abfahrt)]
+        if any(ts is None for ts in strecken):
+            flash("Diese Verbindung existiert im Fahrplan nicht mehr.", "warning")
+            return redirect(url_for("main.verbindungssuche"))
 
-        # an Flotte-Service: wie viele Plätze gibt es
+        # an Flotte-Service: wie viele Plätze gibt es (zwischengespeichert)
         try:
-            cap = flotte_kapazitaet(zug_id)
-            total = sum(int(w.get("kapazitaet", 0)) for w in (cap.get("personenwagen") or []))
+            kapazitaet = {ts.zug_id: zug_kapazitaet(ts.zug_id) for ts in strecken}
         except Exception:
             flash("Flotten-Service nicht erreichbar (Sitzplatz konnte nicht geprüft werden).", "warning")
             return redirect(url_for("main.verbindungssuche"))
 
-        if total <= 0:
+        if min(kapazitaet.values()) <= 0:
             flash("Keine Sitzplätze verfügbar (Kapazität=0).", "warning")
             return redirect(url_for("main.verbindungssuche"))
 
-        # Lokaler Counter: wie viele aktive Reservierungen gibt es schon?
-        used = Ticket.query.filter(
-            Ticket.fahrt_id == fahrt_id,
-            Ticket.status == "aktiv",
-            Ticket.sitzplatzReservierung.is_(True),
-        ).count()
-
-        if used >= total:
-            flash("Keine Sitzplätze mehr verfügbar (ausgebucht).", "warning")
-            return redirect(url_for("main.verbindungssuche"))
+        # Plätze atomar belegen, commit zusammen mit dem Ticket (Reihenfolge nach fahrt_id)
+        for ts in sorted(strecken, key=lambda ts: ts.fahrt_id):
+            if not platz_reservieren(fahrplan, ts, kapazitaet[ts.zug_id]):
+                db.session.rollback()
+                flash("Keine Sitzplätze mehr verfügbar (ausgebucht).", "warning")
+                return redirect(url_for("main.verbindungssuche"))
 
     # Ticket anlegen
     ticket = Ticket(
@@ -797,22 +849,18 @@ def ticket_buchen(fahrt_id):
 @login_required
 def meine_tickets():
     """
-    Tickets anzeigen + Status "verbraucht" automatisch setzen wenn Abfahrt schon vorbei ist
+    Tickets anzeigen, neueste zuerst, seitenweise (?vor=<cursor>)
+    "verbraucht" setzt der Ablauf-Job (services/tickets.py), hier wird nur gelesen
     """
     now = _now_utc()
+    limit = int(current_app.config.get("MEINE_TICKETS_SEITE", 20))
+    try:
+        tickets, next_cursor = tickets_seite(current_user.id, limit, request.args.get("vor") or None)
+    except ValueError:
+        return redirect(url_for("main.meine_tickets"))
 
-    tickets = Ticket.query.filter_by(user_id=current_user.id).order_by(Ticket.erstelltAm.desc()).all()
-
-    changed = False
-    for t in tickets:
-        if t.status == "aktiv" and t.abfahrt and t.abfahrt <= now:
-            t.status = "verbraucht"
-            changed = True
-
-    if changed:
-        db.session.commit()
-
-    return render_template("meine_tickets.html", title="Meine Tickets", tickets=tickets, now=now)
+    return render_template("meine_tickets.html", title="Meine Tickets", tickets=tickets, now=now,
+                           next_cursor=next_cursor)
 
 
 @bp.route("/tickets/<int:ticket_id>/storno", methods=["POST"])
@@ -837,8 +885,289 @@ def ticket_storno(ticket_id):
         flash("Nur zukünftige Tickets können storniert werden.", "warning")
         return redirect(url_for("main.meine_tickets"))
 
+    if ticket.sitzplatzReservierung:
+        try:
+            fahrplan = get_fahrplan()
+        except Exception:
+            fahrplan = None
+        ticket_freigeben(fahrplan, ticket)
+
     ticket.status = "storniert"
 
     db.session.commit()
     flash("Ticket wurde storniert.")
     return redirect(url_for("main.meine_tickets"))
+
+
+def _iso(dt: datetime | None) -> str | None:
+    return dt.isoformat() if dt else None
+
+
+def _hit_json(h: VerbindungHit) -> dict:
+    """VerbindungHit als JSON, Preis wie in der Suche (mit bester Aktion)"""
+    aktion = ermittle_beste_aktion(h.abfahrt, h.halteplan_id)
+    preis = h.preis
+    if aktion:
+        preis = round(preis * (1 - float(aktion.rabattWert or 0.0) / 100.0), 2)
+    return {
+        "fahrt_id": h.fahrtdurchfuehrung_id,
+        "halteplan_id": h.halteplan_id,
+        "zug_id": h.zug_id,
+        "start_halt": h.start_name,
+        "ziel_halt": h.ziel_name,
+        "abfahrt": _iso(h.abfahrt),
+        "ankunft": _iso(h.ankunft),
+        "umstiege": h.umstiege,
+        "umstieg_bahnhof": h.umstieg_bahnhof,
+        "umstieg_ankunft": _iso(h.umstieg_ankunft),
+        "umstieg_abfahrt": _iso(h.umstieg_abfahrt),
+        "fahrt_id2": h.fahrtdurchfuehrung_id2,
+        "halteplan_id2": h.halteplan_id2,
+        "zug_id2": h.zug_id2,
+        "tarif": h.preis,
+        "preis": preis,
+        "aktion": {"id": aktion.id, "name": aktion.name, "rabatt": aktion.rabattWert} if aktion else None,
+        "teilfahrten": [
+            {
+                "fahrt_id": t.fahrtdurchfuehrung_id,
+                "halteplan_id": t.halteplan_id,
+                "zug_id": t.zug_id,
+                "von": t.von_name,
+                "nach": t.nach_name,
+                "abfahrt": _iso(t.abfahrt),
+                "ankunft": _iso(t.ankunft),
+                "preis": t.preis,
+            }
+            for t in h.teilfahrten
+        ],
+    }
+
+
+@bp.route("/api/verbindungen", methods=["GET"])
+def api_verbindungen():
+    """
+    Verbindungssuche als JSON, seitenweise:
+        ?start=Wien&ziel=Linz&datum=2026-03-02[&ab=08:00][&limit=10][&cursor=...]
+    Antwort: {"items": [...], "next_cursor": "..." oder null}
+    next_cursor als cursor mitschicken = die nächsten limit Verbindungen danach
+    (vergangene Verbindungen werden hier nicht rausgefiltert, das macht nur die Buchungsseite)
+    """
+    start = (request.args.get("start") or "").strip()
+    ziel = (request.args.get("ziel") or "").strip()
+    if not start or not ziel:
+        return jsonify({"error": "start und ziel sind Pflicht"}), 400
+    try:
+        datum = date.fromisoformat(request.args.get("datum") or "")
+        ab_raw = request.args.get("ab")
+        ab_zeit = dtime.fromisoformat(ab_raw) if ab_raw else None
+        limit = int(request.args.get("limit") or 10)
+    except ValueError:
+        return jsonify({"error": "datum (YYYY-MM-DD), ab (HH:MM) oder limit ungültig"}), 400
+
+    try:
+        fahrplan = get_fahrplan()
+    except Exception:
+        return jsonify({"error": "Fahrplan nicht erreichbar"}), 503
+
+    # häufige Anfragen (z.B. Wien-Linz am Morgen) kommen aus dem Ergebnis-Cache
+    try:
+        seite = get_verbindungen_cache().seite(
+            fahrplan, start, ziel, datum, ab_zeit, limit,
+            cursor=request.args.get("cursor") or None,
+            modus=current_app.config.get("VERBINDUNGSSUCHE_MODUS", "standard"),
+            bucket_min=int(current_app.config.get("VERBINDUNGEN_CACHE_BUCKET_MIN", 15)),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "items": [_hit_json(h) for h in seite.hits],
+        "next_cursor": seite.next_cursor,
+    }), 200
+
+
+@bp.route("/api/fahrplan-cache", methods=["GET"])
+@login_required
+def api_fahrplan_cache():
+    """Zähler vom Fahrplan-Cache (hits/misses/refresh-Dauer) + Ergebnis-Cache der JSON-Suche"""
+    return jsonify({**cache_stats(), "verbindungen": verbindungen_cache_stats()}), 200
+
+
+def _sammel_position(fahrplan, pos: dict, now: datetime) -> tuple[dict | None, list, int, str | None]:
+    """
+    eine Position der Sammelbuchung prüfen, gleiche Regeln wie ticket_buchen
+    -> (Ticket-Spalten, Teilstrecken für Sitzplätze, anzahl, Fehlertext)
+    """
+    try:
+        fahrt_id = int(pos["fahrt_id"])
+        start_halt = str(pos["start_halt"])
+        ziel_halt = str(pos["ziel_halt"])
+        abfahrt = datetime.fromisoformat(pos["abfahrt"])
+        ankunft = datetime.fromisoformat(pos["ankunft"])
+        umstiege = int(pos.get("umstiege") or 0)
+        halteplan_id = int(pos["halteplan_id"]) if pos.get("halteplan_id") else None
+        zug_id = int(pos.get("zug_id") or 0)
+        preis = float(pos["preis"])
+        sitzplatz = bool(pos.get("sitzplatz"))
+        anzahl = int(pos.get("anzahl") or 1)
+        fahrt_id2 = int(pos["fahrt_id2"]) if pos.get("fahrt_id2") else None
+        halteplan_id2 = int(pos["halteplan_id2"]) if pos.get("halteplan_id2") else None
+        zug_id2 = int(pos.get("zug_id2") or 0)
+        umstieg_bahnhof = (pos.get("umstieg_bahnhof") or "").strip() or None
+        umstieg_ank = datetime.fromisoformat(pos["umstieg_ankunft"]) if pos.get("umstieg_ankunft") else None
+        umstieg_ab = datetime.fromisoformat(pos["umstieg_abfahrt"]) if pos.get("umstieg_abfahrt") else None
+    except (KeyError, TypeError, ValueError):
+        return None, [], 0, "Verbindungsdaten ungültig"
+
+    if anzahl < 1:
+        return None, [], 0, "anzahl muss mindestens 1 sein"
+    if umstiege < 0 or umstiege > 1:
+        return None, [], 0, "höchstens 1 Umstieg"
+    # umstiege kommt vom Client, muss zur Anzahl der Fahrten passen
+    if umstiege != (1 if fahrt_id2 else 0):
+        return None, [], 0, "Verbindungsdaten ungültig"
+    if fahrplan.ride(fahrt_id) is None or (fahrt_id2 and fahrplan.ride(fahrt_id2) is None):
+        return None, [], 0, "Diese Verbindung existiert im Fahrplan nicht mehr"
+    zug_id = _zug_aus_fahrplan(fahrplan, fahrt_id, zug_id)
+    zug_id2 = _zug_aus_fahrplan(fahrplan, fahrt_id2, zug_id2) if fahrt_id2 else 0
+    if zug_id is None or zug_id2 is None:
+        return None, [], 0, "Verbindungsdaten ungültig"
+    if abfahrt <= now:
+        return None, [], 0, "Vergangene Verbindungen können nicht gebucht werden"
+
+    erwartet, aktion = _preis_nachrechnen(
+        fahrplan, fahrt_id, fahrt_id2, start_halt, ziel_halt, umstieg_bahnhof, abfahrt, umstieg_ab, halteplan_id,
+    )
+    if erwartet is None:
+        return None, [], 0, "Diese Verbindung existiert im Fahrplan nicht mehr"
+    if abs(erwartet - preis) > 0.005:
+        return None, [], 0, f"Der Preis dieser Verbindung hat sich geändert ({erwartet:.2f} €)"
+    preis = erwartet
+
+    strecken = []
+    if sitzplatz:
+        if not zug_id:
+            return None, [], 0, "Sitzplatzreservierung nicht möglich (keine Zug-ID)"
+        if fahrt_id2:
+            strecken = [
+                teilstrecke(fahrplan, fahrt_id, start_halt, umstieg_bahnhof, abfahrt),
+                teilstrecke(fahrplan, fahrt_id2, umstieg_bahnhof, ziel_halt, umstieg_ab),
+            ]
+        else:
+            strecken = [teilstrecke(fahrplan, fahrt_id, start_halt, ziel_halt, abfahrt)]
+        if any(ts is None for ts in strecken):
+            return None, [], 0, "Diese Verbindung existiert im Fahrplan nicht mehr"
+        preis = round(preis + 5.0, 2)
+
+    werte = dict(
+        user_id=current_user.id,
+        status="aktiv",
+        erstelltAm=now,
+        start_halt=start_halt,
+        ziel_halt=ziel_halt,
+        anzahl_umstiege=umstiege,
+        abfahrt=abfahrt,
+        ankunft=ankunft,
+        fahrt_id=fahrt_id,
+        halteplan_id=halteplan_id,
+        zug_id=zug_id,
+        fahrt_id2=fahrt_id2,
+        halteplan_id2=halteplan_id2,
+        zug_id2=zug_id2 or None,
+        umstieg_bahnhof=umstieg_bahnhof,
+        umstieg_ankunft=umstieg_ank,
+        umstieg_abfahrt=umstieg_ab,
+        gesamtPreis=preis,
+        sitzplatzReservierung=sitzplatz,
+        aktion_id=aktion.id if aktion else None,
+    )
+    return werte, strecken, anzahl, None
+
+
+@bp.route("/api/tickets/sammelbuchung", methods=["POST"])
+@login_required
+def api_sammelbuchung():
+    """
+    Gruppen-/Firmenbuchung: viele Tickets in einem Request
+        {"buchungen": [{<Verbindung wie aus /api/verbindungen>, "anzahl": 12, "sitzplatz": true}, ...]}
+    Antwort: {"ergebnisse": [{"index": 0, "ok": true, "ticket_ids": [...]},
+                             {"index": 1, "ok": false, "fehler": "..."}, ...]}
+    Positionen mit Fehler werden übersprungen, der Rest wird gebucht.
+    Kapazität einmal pro Zug, Sitzplatz-Belegung einmal pro Fahrt, ein INSERT und ein commit.
+    """
+    daten = request.get_json(silent=True) or {}
+    positionen = daten.get("buchungen")
+    if not isinstance(positionen, list) or not positionen or not all(isinstance(p, dict) for p in positionen):
+        return jsonify({"error": "buchungen (Liste) ist Pflicht"}), 400
+    try:
+        # negative anzahl darf das Limit nicht "ausgleichen" (Position selbst scheitert später in _sammel_position)
+        gesamt = sum(max(1, int(p.get("anzahl") or 1)) for p in positionen)
+    except (TypeError, ValueError):
+        return jsonify({"error": "anzahl ungültig"}), 400
+    max_tickets = int(current_app.config.get("SAMMELBUCHUNG_MAX_TICKETS", 1000))
+    if gesamt > max_tickets:
+        return jsonify({"error": f"höchstens {max_tickets} Tickets pro Sammelbuchung"}), 400
+
+    try:
+        fahrplan = get_fahrplan()
+    except Exception:
+        return jsonify({"error": "Fahrplan nicht erreichbar"}), 503
+
+    now = _now_utc()
+    ergebnisse: dict[int, dict] = {}
+    geprueft = []
+    for i, pos in enumerate(positionen):
+        werte, strecken, anzahl, fehler = _sammel_position(fahrplan, pos, now)
+        if fehler:
+            ergebnisse[i] = {"index": i, "ok": False, "fehler": fehler}
+        else:
+            geprueft.append((i, werte, strecken, anzahl))
+
+    # Kapazität einmal pro Zug (Flotten, zwischengespeichert)
+    kapazitaet: dict[int, int] = {}
+    for zug in sorted({ts.zug_id for _i, _w, strecken, _a in geprueft for ts in strecken}):
+        try:
+            kapazitaet[zug] = zug_kapazitaet(zug)
+        except Exception:
+            current_app.logger.warning("Sammelbuchung: Kapazität für Zug %s nicht abrufbar", zug)
+
+    sammel = Sammelreservierung(fahrplan)
+    sammel.laden(
+        [ts for _i, _w, strecken, _a in geprueft for ts in strecken if ts.zug_id in kapazitaet],
+        kapazitaet,
+    )
+
+    zeilen: list[dict] = []
+    gebucht: list[tuple[int, int]] = []   # (index, anzahl) in der Reihenfolge von zeilen
+    for i, werte, strecken, anzahl in geprueft:
+        if strecken:
+            if any(ts.zug_id not in kapazitaet for ts in strecken):
+                ergebnisse[i] = {"index": i, "ok": False,
+                                 "fehler": "Flotten-Service nicht erreichbar (Sitzplatz konnte nicht geprüft werden)"}
+                continue
+            if min(kapazitaet[ts.zug_id] for ts in strecken) <= 0 or not sammel.reservieren(strecken, anzahl):
+                ergebnisse[i] = {"index": i, "ok": False, "fehler": "Keine Sitzplätze mehr verfügbar (ausgebucht)"}
+                continue
+        zeilen.extend([werte] * anzahl)
+        gebucht.append((i, anzahl))
+
+    if not sammel.speichern():
+        db.session.rollback()
+        return jsonify({"error": "Sitzplätze wurden gleichzeitig geändert, bitte nochmal senden"}), 409
+
+    ids: list[int] = []
+    if zeilen:
+        ids = list(db.session.scalars(
+            sa.insert(Ticket).returning(Ticket.id, sort_by_parameter_order=True), zeilen,
+        ))
+    db.session.commit()
+
+    k = 0
+    for i, anzahl in gebucht:
+        ergebnisse[i] = {"index": i, "ok": True, "ticket_ids": ids[k:k + anzahl]}
+        k += anzahl
+
+    return jsonify({
+        "gebucht": len(ids),
+        "ergebnisse": [ergebnisse[i] for i in range(len(positionen))],
+    }), 201 if gebucht else 200
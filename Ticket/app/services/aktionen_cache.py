@@ -0,0 +1,159 @@
+"""
+Aktionen (Rabatte) für die Verbindungssuche aus dem Speicher statt einer DB-Abfrage pro Treffer
+
+Regel wie bisher in ermittle_beste_aktion (routes.py):
+    nur aktive Aktionen, Datum der Verbindung in [startZeit, endeZeit] (Tage, inklusive),
+    global gilt immer, halteplan nur für den eigenen halteplanId
+    beste = höchster Rabatt, bei Gleichstand halteplan vor global,
+    sonst die mit der kleineren id
+
+Index: pro Gruppe (global, jeder Halteplan) die Tage in Elementar-Intervalle zerlegt
+(Grenzen = alle Start-Tage und End-Tage + 1) und für jedes Intervall die beste Aktion
+vorberechnet -> best_for(datum, halteplan_id) = zwei bisects.
+
+Gespeichert wird nur AktionInfo (id, name, rabattWert, typ, halteplanId), keine ORM-Objekte -
+die hängen an der Session vom Request, in dem geladen wurde.
+
+Gültigkeit: Versionsnummer, die invalidate_aktionen() hochzählt (Aktion-Routen nach jedem
+commit). Andere Worker-Prozesse merken davon nichts, deshalb zusätzlich eine TTL
+(AKTIONEN_CACHE_TTL_SEK).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+
+from app.models import Aktion
+
+DEFAULT_TTL_SEK = 60.0
+
+
+@dataclass(frozen=True)
+class AktionInfo:
+    id: int
+    name: str
+    rabattWert: float
+    typ: str
+    halteplanId: Optional[int]
+
+
+def _tag(x) -> Optional[date]:
+    if isinstance(x, datetime):
+        return x.date()
+    if isinstance(x, date):
+        return x
+    return None
+
+
+def _besser(a: AktionInfo, b: Optional[AktionInfo]) -> bool:
+    if b is None:
+        return True
+    ka = (a.rabattWert, 1 if a.typ == "halteplan" else 0, -a.id)
+    kb = (b.rabattWert, 1 if b.typ == "halteplan" else 0, -b.id)
+    return ka > kb
+
+
+class _Zeitleiste:
+    """Elementar-Intervalle über Tage, je Intervall die beste Aktion"""
+
+    def __init__(self, eintraege: List[Tuple[date, date, AktionInfo]]):
+        grenzen = sorted({sd for sd, _ed, _a in eintraege} | {ed + timedelta(days=1) for _sd, ed, _a in eintraege})
+        beste: List[Optional[AktionInfo]] = [None] * len(grenzen)
+        for sd, ed, a in eintraege:
+            i = bisect_right(grenzen, sd) - 1
+            j = bisect_right(grenzen, ed)          # erstes Intervall nach ed
+            for k in range(i, j):
+                if _besser(a, beste[k]):
+                    beste[k] = a
+        self.grenzen = grenzen
+        self.beste = beste
+
+    def an(self, tag: date) -> Optional[AktionInfo]:
+        k = bisect_right(self.grenzen, tag) - 1
+        return self.beste[k] if k >= 0 else None
+
+
+class AktionenIndex:
+    def __init__(self, aktionen: List[Aktion]):
+        global_: List[Tuple[date, date, AktionInfo]] = []
+        pro_hp: Dict[int, List[Tuple[date, date, AktionInfo]]] = {}
+
+        for a in aktionen:
+            sd, ed = _tag(a.startZeit), _tag(a.endeZeit)
+            if not a.aktiv or not sd or not ed or ed < sd:
+                continue
+            info = AktionInfo(a.id, a.name, float(a.rabattWert or 0.0), a.typ, a.halteplanId)
+            if a.typ == "global":
+                global_.append((sd, ed, info))
+            elif a.typ == "halteplan" and a.halteplanId is not None:
+                pro_hp.setdefault(int(a.halteplanId), []).append((sd, ed, info))
+
+        self.anzahl = len(global_) + sum(len(e) for e in pro_hp.values())
+        self._global = _Zeitleiste(global_)
+        self._pro_hp = {hp: _Zeitleiste(e) for hp, e in pro_hp.items()}
+
+    def best_for(self, verbindungs_datum, halteplan_id: Optional[int]) -> Optional[AktionInfo]:
+        tag = _tag(verbindungs_datum)
+        beste = self._global.an(tag)
+        if halteplan_id is not None:
+            leiste = self._pro_hp.get(int(halteplan_id))
+            if leiste is not None:
+                hp = leiste.an(tag)
+                if hp is not None and _besser(hp, beste):
+                    beste = hp
+        return beste
+
+
+class _AktionenCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._index: Optional[AktionenIndex] = None
+        self._index_version = -1
+        self._geladen_mono = 0.0
+        self.stats = {"hits": 0, "ladevorgaenge": 0}
+
+    def get(self, ttl_sek: float) -> AktionenIndex:
+        with self._lock:
+            version = self._version
+            if (
+                self._index is not None
+                and self._index_version == version
+                and time.monotonic() - self._geladen_mono <= ttl_sek
+            ):
+                self.stats["hits"] += 1
+                return self._index
+
+        index = AktionenIndex(Aktion.query.filter_by(aktiv=True).order_by(Aktion.id.asc()).all())
+        with self._lock:
+            self.stats["ladevorgaenge"] += 1
+            # nur übernehmen, wenn zwischendurch nicht invalidiert wurde
+            if self._version == version:
+                self._index = index
+                self._index_version = version
+                self._geladen_mono = time.monotonic()
+        return index
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._index = None
+
+
+_cache = _AktionenCache()
+
+
+def get_aktionen_index() -> AktionenIndex:
+    return _cache.get(float(current_app.config.get("AKTIONEN_CACHE_TTL_SEK", DEFAULT_TTL_SEK)))
+
+
+def invalidate_aktionen() -> None:
+    """nach jeder Änderung an Aktionen aufrufen (anlegen, bearbeiten, stoppen, löschen)"""
+    _cache.invalidate()
@@ -1,21 +1,48 @@
 from __future__ import annotations
 
+import hashlib
+import json
 from email.utils import parsedate_to_datetime
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
 
-import requests
 from flask import current_app
 
+from app.services.http_client import DienstClient, Timeout
+
+# Timeouts (connect, read) pro Endpunkt: der Snapshot ist groß, der Rest muss schnell gehen
+SNAPSHOT_TIMEOUT: Timeout = (3.05, 15)
+KURZ_TIMEOUT: Timeout = (3.05, 4)
+
 
 def _base(key: str) -> str:
     return (current_app.config.get(key, "") or "").rstrip("/")
 
 
-def _get_json(url: str, timeout: int = 8, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-    r = requests.get(url, timeout=timeout, headers={"Accept": "application/json"}, params=params)
-    r.raise_for_status()
-    return r.json()
+def _client(dienst: str) -> DienstClient:
+    """ein Client (Session-Pool + Circuit Breaker) pro Service und App"""
+    clients = current_app.extensions.setdefault("http_clients", {})
+    c = clients.get(dienst)
+    if c is None:
+        cfg = current_app.config
+        c = clients.setdefault(dienst, DienstClient(
+            dienst,
+            timeout=cfg.get("HTTP_TIMEOUT_SEK", (3.05, 8)),
+            wiederholungen=cfg.get("HTTP_WIEDERHOLUNGEN", 2),
+            fehler_schwelle=cfg.get("HTTP_BREAKER_FEHLER", 5),
+            pause_sek=cfg.get("HTTP_BREAKER_PAUSE_SEK", 30),
+        ))
+    return c
+
+
+def _get_json(
+    dienst: str,
+    url: str,
+    timeout: Optional[Timeout] = None,
+    params: Optional[Dict[str, Any]] = None,
+    fallback: bool = True,
+) -> Dict[str, Any]:
+    return _client(dienst).get_json(url, params=params, timeout=timeout, fallback=fallback)
 
 
 def parse_gmt_dt(s: Optional[str]) -> Optional[datetime]:
@@ -30,30 +57,113 @@ def parse_gmt_dt(s: Optional[str]) -> Optional[datetime]:
 
 def fahrplan_snapshot() -> Dict[str, Any]:
     base = _base("FAHRPLAN_API_BASE")
-    return _get_json(f"{base}/api/fahrtdurchfuehrungen/snapshot")
+    # kein Fallback hier: den letzten guten Fahrplan hält schon der FahrplanCache
+    return _get_json("fahrplan", f"{base}/api/fahrtdurchfuehrungen/snapshot", timeout=SNAPSHOT_TIMEOUT, fallback=False)
+
+
+def fahrplan_snapshot_bedingt(etag: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Snapshot nur holen wenn er sich geändert hat (If-None-Match)
+    Rückgabe: (snapshot, etag) bzw. (None, etag) bei 304 unverändert
+    Falls der Server kein ETag schickt, dient ein Hash vom Inhalt als Version
+    """
+    base = _base("FAHRPLAN_API_BASE")
+    headers = {"Accept": "application/json"}
+    if etag:
+        headers["If-None-Match"] = etag
+    r = _client("fahrplan").get(f"{base}/api/fahrtdurchfuehrungen/snapshot", headers=headers, timeout=SNAPSHOT_TIMEOUT)
+    if r.status_code == 304:
+        return None, etag
+    r.raise_for_status()
+    return r.json(), r.headers.get("ETag") or hashlib.sha1(r.content).hexdigest()
+
+
+def fahrplan_snapshot_kompakt(etag: Optional[str] = None) -> Tuple[Any, Optional[str]]:
+    """
+    Snapshot im Kompaktformat (bytes, siehe snapshot_kompakt.py), bedingt wie fahrplan_snapshot_bedingt
+    Rückgabe: (bytes, etag), (None, etag) bei 304 - oder (dict, etag) wenn der Server nur JSON kann
+    """
+    from app.services.snapshot_kompakt import KOMPAKT_MIMETYPE
+
+    base = _base("FAHRPLAN_API_BASE")
+    headers = {"Accept": f"{KOMPAKT_MIMETYPE}, application/json;q=0.5"}
+    if etag:
+        headers["If-None-Match"] = etag
+    r = _client("fahrplan").get(f"{base}/api/fahrtdurchfuehrungen/snapshot", headers=headers, timeout=SNAPSHOT_TIMEOUT)
+    if r.status_code == 304:
+        return None, etag
+    r.raise_for_status()
+    neu_etag = r.headers.get("ETag") or hashlib.sha1(r.content).hexdigest()
+    if r.headers.get("Content-Type", "").startswith(KOMPAKT_MIMETYPE):
+        return r.content, neu_etag
+    return r.json(), neu_etag
+
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def _ndjson_objekte(zeilen: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    for zeile in zeilen:
+        if zeile.strip():
+            yield json.loads(zeile)
+
+
+def fahrplan_snapshot_stream() -> Iterator[Dict[str, Any]]:
+    """
+    Snapshot gestreamt als NDJSON: liefert jede Fahrt sobald ihre Zeile angekommen ist,
+    am Ende das Meta-Objekt {"version", "total"}
+    Kann der Fahrplan-Service (noch) kein NDJSON, wird die JSON-Antwort genauso zerlegt
+    """
+    base = _base("FAHRPLAN_API_BASE")
+    with _client("fahrplan").get(
+        f"{base}/api/fahrtdurchfuehrungen/snapshot",
+        headers={"Accept": NDJSON_MIMETYPE},
+        timeout=SNAPSHOT_TIMEOUT,
+        stream=True,
+    ) as r:
+        r.raise_for_status()
+        if r.headers.get("Content-Type", "").startswith(NDJSON_MIMETYPE):
+            yield from _ndjson_objekte(r.iter_lines())
+        else:
+            snap = r.json()
+            yield from (snap.get("items") or [])
+            yield {k: v for k, v in snap.items() if k != "items"}
+
+
+def fahrplan_snapshot_delta(since: int) -> Dict[str, Any]:
+    """
+    nur die Fahrten die seit Version since angelegt/geändert wurden
+    Antwort: {"version", "since", "items": [...], "deleted": [fahrt_id, ...]}
+    """
+    base = _base("FAHRPLAN_API_BASE")
+    # kein Fallback: ein altes Delta passt nicht mehr zum Cache-Stand
+    return _get_json(
+        "fahrplan", f"{base}/api/fahrtdurchfuehrungen/snapshot",
+        timeout=SNAPSHOT_TIMEOUT, params={"since": since}, fallback=False,
+    )
 
 
 def fahrplan_halteplaene(query: str = "") -> Dict[str, Any]:
     base = _base("FAHRPLAN_API_BASE")
     url = f"{base}/api/halteplaene"
     params = {"q": query} if query else None
-    return _get_json(url, params=params)
+    return _get_json("fahrplan", url, timeout=KURZ_TIMEOUT, params=params)
 
 
 def strecken_bahnhoefe(query: str = "") -> Dict[str, Any]:
     base = _base("STRECKEN_API_BASE")
     url = f"{base}/bahnhoefe"
     params = {"q": query} if query else None
-    return _get_json(url, params=params)
+    return _get_json("strecken", url, timeout=KURZ_TIMEOUT, params=params)
 
 
 def strecken_warnungen(query: str = "") -> Dict[str, Any]:
     base = _base("STRECKEN_API_BASE")
     url = f"{base}/warnungen"
     params = {"q": query} if query else None
-    return _get_json(url, params=params)
+    return _get_json("strecken", url, timeout=KURZ_TIMEOUT, params=params)
 
 
 def flotte_kapazitaet(zug_id: int) -> Dict[str, Any]:
     base = _base("FLOTTEN_API_BASE")
-    return _get_json(f"{base}/flotte/kapazitaet/{zug_id}")
+    return _get_json("flotten", f"{base}/flotte/kapazitaet/{zug_id}", timeout=KURZ_TIMEOUT)
@@ -0,0 +1,307 @@
+"""
+Prozessweiter Cache für den Fahrplan (Snapshot vom Fahrplan-Service)
+
+Vorher hat jede Suche und jedes Warnungs-Mapping den kompletten Snapshot neu geholt und
+geparst. Jetzt gibt es EIN geparstes Fahrplan-Modell pro Prozess:
+    - rides, idx_map (in den rides), Abfahrts-Index, Bahnhofsnamen je Fahrt, CSA-connections,
+      spaltenweiser numpy-Fahrplan (fahrplan_spalten.py)
+    - wird beim ersten Zugriff geladen (miss)
+    - ist es älter als FAHRPLAN_CACHE_TTL_SEK, wird das alte Modell weiter ausgeliefert und im
+      Hintergrund aktualisiert:
+        * liefert der Fahrplan-Service eine Änderungs-Version ("version" im Snapshot), wird nur
+          das Delta seit dieser Version geholt und in die rides eingearbeitet
+        * sonst (oder wenn das Delta nicht klappt) kompletter Snapshot mit If-None-Match/ETag
+          -> bei 304 bleibt das Modell gleich
+          Format laut FAHRPLAN_SNAPSHOT_FORMAT: "kompakt" (binär, spaltenweise, Standard),
+          "ndjson" (gestreamt, rides werden beim Empfang gebaut) oder "json"
+    - Zähler für hits/misses/refreshes + Refresh-Dauer (cache_stats)
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from flask import current_app
+
+from app.services.external_clients import (
+    fahrplan_snapshot_bedingt,
+    fahrplan_snapshot_delta,
+    fahrplan_snapshot_kompakt,
+    fahrplan_snapshot_stream,
+)
+from app.services.fahrplan_spalten import (
+    Erreichbarkeit,
+    SpaltenFahrplan,
+    abfahrts_tage,
+    build_erreichbarkeit,
+    build_spalten,
+)
+from app.services.snapshot_kompakt import decode_rides
+from app.services.verbindungen import (
+    AbfahrtsIndex,
+    _build_abfahrts_index,
+    _build_rides,
+    _build_rides_stream,
+    _tarif_kumuliert,
+)
+from app.services.verbindungen_csa import Connection, _build_connections
+
+
+DEFAULT_TTL_SEK = 60
+
+
+@dataclass(frozen=True)
+class FahrplanModell:
+    version: Optional[str]                 # ETag vom Fahrplan-Service (oder Hash)
+    geladen_am: datetime
+    rides: List[Dict[str, Any]]
+    abfahrts_index: AbfahrtsIndex
+    namen: Dict[int, List[str]]            # fahrt_id -> Bahnhofsnamen in Reihenfolge
+    ride_pos: Dict[int, int]               # fahrt_id -> Index in rides
+    connections: List[Connection] = field(default_factory=list)
+    tarif_kum: List[List[float]] = field(default_factory=list)
+    seq: Optional[int] = None              # Änderungs-Version vom Fahrplan-Service (für Deltas)
+    spalten: Optional[SpaltenFahrplan] = None   # dieselben rides spaltenweise (numpy)
+    erreichbar: Optional[Erreichbarkeit] = None  # Bahnhof x Bahnhof pro Tag (0 / 1 Umstieg)
+
+    def ride(self, fahrt_id: int) -> Optional[Dict[str, Any]]:
+        pos = self.ride_pos.get(int(fahrt_id))
+        return self.rides[pos] if pos is not None else None
+
+
+def build_fahrplan_modell(snap: Dict[str, Any], version: Optional[str] = None) -> FahrplanModell:
+    """parst einen Snapshot einmal komplett in alle Strukturen, die Suche/Warnungen brauchen"""
+    seq = snap.get("version")
+    return _modell_aus_rides(_build_rides(snap), version, int(seq) if seq is not None else None)
+
+
+def build_fahrplan_modell_stream(objekte: Iterable[Dict[str, Any]]) -> FahrplanModell:
+    """wie build_fahrplan_modell, aber aus dem gestreamten Snapshot (Fahrten + Meta-Zeile)"""
+    rides, meta = _build_rides_stream(objekte)
+    seq = meta.get("version")
+    if seq is None:
+        return _modell_aus_rides(rides, None, None)
+    return _modell_aus_rides(rides, f"seq-{seq}", int(seq))
+
+
+def apply_delta(alt: FahrplanModell, delta: Dict[str, Any]) -> FahrplanModell:
+    """
+    arbeitet ein Delta (geänderte + gelöschte Fahrten) in ein bestehendes Modell ein
+    nur die geänderten Fahrten werden neu geparst, Indizes werden neu aufgebaut
+    (Erreichbarkeit: schon gebaute Tage, die das Delta nicht berührt, werden übernommen)
+    """
+    neu_rides = _build_rides(delta)
+    weg = {int(fid) for fid in (delta.get("deleted") or [])} | {r["id"] for r in neu_rides}
+
+    rides = [r for r in alt.rides if r["id"] not in weg] + neu_rides
+    # gleiche Reihenfolge wie der volle Snapshot (nach fahrt_id)
+    rides.sort(key=lambda r: r["id"])
+
+    seq = int(delta["version"])
+    modell = _modell_aus_rides(rides, f"seq-{seq}", seq)
+    if alt.erreichbar is not None and modell.erreichbar is not None:
+        alte = [alt.rides[alt.ride_pos[fid]] for fid in weg if fid in alt.ride_pos]
+        modell.erreichbar.uebernehmen(alt.erreichbar, abfahrts_tage(alte) | abfahrts_tage(neu_rides))
+    return modell
+
+
+def _modell_aus_rides(rides: List[Dict[str, Any]], version: Optional[str], seq: Optional[int]) -> FahrplanModell:
+    namen = {
+        r["id"]: [st["name"] for st in r["stops"] if st["name"]]
+        for r in rides
+    }
+    spalten = build_spalten(rides)
+    return FahrplanModell(
+        version=version,
+        geladen_am=datetime.utcnow(),
+        rides=rides,
+        abfahrts_index=_build_abfahrts_index(rides),
+        namen={fid: n for fid, n in namen.items() if fid and n},
+        ride_pos={r["id"]: pos for pos, r in enumerate(rides)},
+        connections=_build_connections(rides),
+        tarif_kum=[_tarif_kumuliert(r["stops"]) for r in rides],
+        seq=seq,
+        spalten=spalten,
+        erreichbar=build_erreichbarkeit(spalten),
+    )
+
+
+class FahrplanCache:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._modell: Optional[FahrplanModell] = None
+        self._geladen_mono: float = 0.0
+        self._refresh_laeuft = False
+        self._erstes_laden: Optional[Future] = None    # kalter Cache: Ergebnis für alle Wartenden
+        self.stats: Dict[str, float] = {
+            "hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refresh_unveraendert": 0,
+            "refresh_fehler": 0,
+            "deltas": 0,
+            "refresh_dauer_ms_letzte": 0.0,
+            "refresh_dauer_ms_summe": 0.0,
+        }
+
+    def get(self, ttl_sek: float, hintergrund: bool = True) -> FahrplanModell:
+        with self._lock:
+            modell = self._modell
+            abgelaufen = (time.monotonic() - self._geladen_mono) > ttl_sek
+            if modell is not None:
+                self.stats["hits"] += 1
+                starte_refresh = abgelaufen and not self._refresh_laeuft
+                if starte_refresh:
+                    self._refresh_laeuft = True
+            else:
+                self.stats["misses"] += 1
+                starte_refresh = False
+                laden = self._erstes_laden
+                ich_lade = laden is None
+                if ich_lade:
+                    laden = self._erstes_laden = Future()
+
+        if modell is None:
+            # erster Zugriff: einer lädt synchron, alle anderen warten auf dasselbe Ergebnis
+            # (Fehler gehen an alle Aufrufer, der nächste Zugriff probiert es wieder)
+            if not ich_lade:
+                return laden.result()
+            try:
+                modell = self.refresh()
+                laden.set_result(modell)
+                return modell
+            except BaseException as e:
+                laden.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    self._erstes_laden = None
+
+        if starte_refresh:
+            if hintergrund:
+                app = current_app._get_current_object()
+                threading.Thread(target=self._refresh_im_hintergrund, args=(app,), daemon=True).start()
+            else:
+                self._refresh_im_hintergrund(None)
+        return modell
+
+    def _refresh_im_hintergrund(self, app) -> None:
+        try:
+            if app is not None:
+                with app.app_context():
+                    self.refresh()
+            else:
+                self.refresh()
+        except Exception as e:
+            # altes Modell bleibt gültig, nächster Zugriff nach TTL probiert es wieder
+            if app is not None:
+                app.logger.warning("Fahrplan-Cache Refresh fehlgeschlagen: %s", e)
+        finally:
+            with self._lock:
+                self._refresh_laeuft = False
+
+    def refresh(self) -> FahrplanModell:
+        t0 = time.perf_counter()
+        alt = self._modell
+
+        neu = None
+        if alt is not None and alt.seq is not None:
+            try:
+                neu = self._refresh_delta(alt)
+            except Exception as e:
+                # z.B. Fahrplan-DB neu aufgesetzt (since > version) -> voll neu laden
+                current_app.logger.info("Fahrplan-Cache Delta nicht möglich, lade komplett: %s", e)
+
+        if neu is None:
+            try:
+                neu = self._voll_laden(alt)
+            except Exception:
+                with self._lock:
+                    self.stats["refresh_fehler"] += 1
+                raise
+        unveraendert = neu is alt
+
+        dauer_ms = (time.perf_counter() - t0) * 1000.0
+        with self._lock:
+            self._modell = neu
+            self._geladen_mono = time.monotonic()
+            self.stats["refreshes"] += 1
+            if unveraendert:
+                self.stats["refresh_unveraendert"] += 1
+            self.stats["refresh_dauer_ms_letzte"] = round(dauer_ms, 2)
+            self.stats["refresh_dauer_ms_summe"] = round(self.stats["refresh_dauer_ms_summe"] + dauer_ms, 2)
+
+        current_app.logger.info(
+            "Fahrplan-Cache refresh: %s rides, version=%s, %.1f ms%s",
+            len(neu.rides), neu.version, dauer_ms, " (unverändert)" if unveraendert else "",
+        )
+        return neu
+
+    def _voll_laden(self, alt: Optional[FahrplanModell]) -> FahrplanModell:
+        fmt = current_app.config.get("FAHRPLAN_SNAPSHOT_FORMAT", "kompakt")
+        etag = alt.version if alt else None
+
+        if fmt == "kompakt":
+            daten, version = fahrplan_snapshot_kompakt(etag)
+            if daten is None and alt is not None:
+                return alt
+            if isinstance(daten, bytes):
+                rides, meta = decode_rides(daten)
+                seq = meta.get("version")
+                return _modell_aus_rides(rides, version, int(seq) if seq is not None else None)
+            # Fahrplan-Service kann (noch) kein Kompaktformat -> JSON
+            return build_fahrplan_modell(daten or {}, version)
+
+        # ohne Änderungs-Version ist der bedingte Request (304) billiger als ein Stream
+        if fmt == "ndjson" and (alt is None or alt.seq is not None):
+            return build_fahrplan_modell_stream(fahrplan_snapshot_stream())
+
+        snap, version = fahrplan_snapshot_bedingt(etag)
+        if snap is None and alt is not None:
+            # 304: unverändert
+            return alt
+        return build_fahrplan_modell(snap or {}, version)
+
+    def _refresh_delta(self, alt: FahrplanModell) -> FahrplanModell:
+        delta = fahrplan_snapshot_delta(alt.seq)
+        if not delta.get("items") and not delta.get("deleted"):
+            return alt
+        with self._lock:
+            self.stats["deltas"] += 1
+        return apply_delta(alt, delta)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._modell = None
+            self._geladen_mono = 0.0
+
+
+_cache = FahrplanCache()
+
+
+def get_fahrplan() -> FahrplanModell:
+    """aktuelles Fahrplan-Modell (aus dem Cache, lädt bei Bedarf)"""
+    cfg = current_app.config
+    return _cache.get(
+        ttl_sek=float(cfg.get("FAHRPLAN_CACHE_TTL_SEK", DEFAULT_TTL_SEK)),
+        hintergrund=bool(cfg.get("FAHRPLAN_CACHE_HINTERGRUND", True)),
+    )
+
+
+def invalidate_fahrplan() -> None:
+    _cache.invalidate()
+
+
+def cache_stats() -> Dict[str, Any]:
+    modell = _cache._modell
+    out: Dict[str, Any] = dict(_cache.stats)
+    out["version"] = modell.version if modell else None
+    out["seq"] = modell.seq if modell else None
+    out["rides"] = len(modell.rides) if modell else 0
+    out["geladen_am"] = modell.geladen_am.isoformat() if modell else None
+    return out
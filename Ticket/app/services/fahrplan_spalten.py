@@ -0,0 +1,314 @@
+"""
+Spaltenweiser Fahrplan (numpy) für die Verbindungssuche
+
+Die rides sind eine Liste von dicts mit Listen von dicts - jeder Filter (Datum, Ab-Zeit,
+Umstiegsfenster) läuft dort Element für Element in Python. Hier liegen dieselben Daten
+in flachen Arrays, ein Eintrag pro Halt, Halte einer Fahrt hintereinander:
+
+    ride_offset[k] .. ride_offset[k+1]-1   Halte von ride k (k = Position in rides)
+    halt_ride, halt_idx                    ride-Position / Halt-Index im ride
+    station                                int32 Bahnhofs-Nummer (bahnhoefe[station] = Name)
+    ab, an                                 int64 Sekunden seit 1970 (ab = dep or arr, an = arr or dep
+                                           wie in der Suche, KEINE_ZEIT wenn beides fehlt)
+
+Kernels:
+    fahrten_ab_start   alle rides die A am Datum D ab Zeit T verlassen (erster Halt A im ride)
+    fahrten_a_vor_b    davon die, die danach B anfahren
+
+Erreichbarkeit (build_erreichbarkeit, beim Laden vom Fahrplan): Bahnhof x Bahnhof Bitsets pro
+Tag für 0 und 1 Umstieg -> "keine Verbindung" ohne Suche, Umstiegsbahnhöfe vorfiltern
+(ein Tag wird erst beim ersten Zugriff gebaut)
+
+Sekunden statt Minuten, damit die Filter auch bei Zeiten mit Sekunden exakt gleich wie
+die datetime-Vergleiche in der Suche sind.
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+KEINE_ZEIT = np.iinfo(np.int64).min
+
+
+def epoch_sek(v: Optional[datetime]) -> int:
+    if v is None:
+        return int(KEINE_ZEIT)
+    return int((v - EPOCH).total_seconds())
+
+
+@dataclass(frozen=True)
+class SpaltenFahrplan:
+    bahnhoefe: List[str]
+    bahnhof_nr: Dict[str, int]
+    ride_offset: np.ndarray        # int64[n + 1]
+    halt_ride: np.ndarray          # int32[m]
+    halt_idx: np.ndarray           # int32[m]
+    station: np.ndarray            # int32[m]
+    ab: np.ndarray                 # int64[m]
+    an: np.ndarray                 # int64[m]
+
+
+def build_spalten(rides: List[Dict[str, Any]]) -> SpaltenFahrplan:
+    bahnhof_nr: Dict[str, int] = {}
+    ride_offset = [0]
+    station, ab, an = [], [], []
+
+    for r in rides:
+        for st in r["stops"]:
+            station.append(bahnhof_nr.setdefault(st["name"], len(bahnhof_nr)))
+            ab.append(epoch_sek(st["dep"] or st["arr"]))
+            an.append(epoch_sek(st["arr"] or st["dep"]))
+        ride_offset.append(len(station))
+
+    offset = np.asarray(ride_offset, dtype=np.int64)
+    laengen = np.diff(offset)
+    m = int(offset[-1])
+
+    halt_ride = np.repeat(np.arange(len(rides), dtype=np.int32), laengen)
+    halt_idx = (np.arange(m, dtype=np.int64) - offset[:-1].repeat(laengen)).astype(np.int32)
+
+    return SpaltenFahrplan(
+        bahnhoefe=list(bahnhof_nr),
+        bahnhof_nr=bahnhof_nr,
+        ride_offset=offset,
+        halt_ride=halt_ride,
+        halt_idx=halt_idx,
+        station=np.asarray(station, dtype=np.int32),
+        ab=np.asarray(ab, dtype=np.int64),
+        an=np.asarray(an, dtype=np.int64),
+    )
+
+
+def fahrten_ab_start(
+    sp: SpaltenFahrplan,
+    start_name: str,
+    datum: date,
+    ab_zeit: Optional[time] = None,
+) -> np.ndarray:
+    """
+    globale Halt-Nummern vom ERSTEN Halt am Start je ride, wenn dort die Abfahrt am datum
+    (und nicht vor ab_zeit) liegt - in rides-Reihenfolge
+    """
+    nr = sp.bahnhof_nr.get(start_name)
+    if nr is None:
+        return np.empty(0, dtype=np.int64)
+
+    halte = np.flatnonzero(sp.station == nr)
+    # erster Start-Halt je ride (Halte sind nach ride sortiert)
+    _rides, erste = np.unique(sp.halt_ride[halte], return_index=True)
+    halte = halte[erste]
+
+    tag_beginn = epoch_sek(datetime.combine(datum, time.min))
+    von = epoch_sek(datetime.combine(datum, ab_zeit)) if ab_zeit else tag_beginn
+    zeiten = sp.ab[halte]
+    return halte[(zeiten >= von) & (zeiten < tag_beginn + 86400)]
+
+
+def fahrten_a_vor_b(
+    sp: SpaltenFahrplan,
+    start_name: str,
+    ziel_name: str,
+    datum: date,
+    ab_zeit: Optional[time] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    alle rides die Start am datum ab ab_zeit verlassen und DANACH das Ziel anfahren
+    Rückgabe: (Start-Halte, Ziel-Halte) als globale Halt-Nummern - Ziel = erstes Vorkommen nach dem Start
+    """
+    start_halte = fahrten_ab_start(sp, start_name, datum, ab_zeit)
+    nr = sp.bahnhof_nr.get(ziel_name)
+    leer = np.empty(0, dtype=np.int64)
+    if nr is None or len(start_halte) == 0:
+        return leer, leer
+
+    ziel_halte = np.flatnonzero(sp.station == nr)
+    if len(ziel_halte) == 0:
+        return leer, leer
+
+    # nächster Ziel-Halt nach dem Start (global) - passt nur, wenn er im selben ride liegt
+    k = np.searchsorted(ziel_halte, start_halte, side="right")
+    ok = k < len(ziel_halte)
+    start_halte, k = start_halte[ok], k[ok]
+    ziel = ziel_halte[k]
+    ok = (sp.halt_ride[ziel] == sp.halt_ride[start_halte]) & (sp.an[ziel] != KEINE_ZEIT)
+    return start_halte[ok], ziel[ok]
+
+
+# ----------------------------
+# Erreichbarkeit Bahnhof x Bahnhof pro Tag
+# ----------------------------
+
+ERREICHBARKEIT_MAX_TAGE = 64       # so viele Tage bleiben gebaut, danach fliegt der älteste Eintrag raus
+
+
+class Erreichbarkeit:
+    """
+    pro Tag (Abfahrt der ersten Fahrt) Bitsets Bahnhof x Bahnhof (np.packbits, Zeile = von):
+        direkt(t)[a]   Bahnhöfe die von a mit einer Fahrt erreichbar sind (Abfahrt an Tag t)
+        umstieg(t)[a]  dasselbe mit höchstens 1 Umstieg
+    umstieg ist eine Obermenge (Umstiegsfenster wird nicht geprüft, nur dass die 2. Fahrt
+    an einem der Folgetage abfährt) - reicht, um unmögliche Anfragen sofort abzulehnen,
+    "möglich" heißt nur "könnte gehen"
+
+    Gebaut wird erst beim ersten Zugriff auf einen Tag (gesucht wird fast nur heute und die
+    nächsten Tage, der Snapshot hat aber auch alle vergangenen), danach gecacht.
+    Nach einem Delta übernimmt uebernehmen() die Tage, die das Delta nicht berührt.
+    """
+
+    def __init__(self, sp: SpaltenFahrplan, folgetage: int):
+        self.bahnhof_nr = sp.bahnhof_nr
+        self.folgetage = folgetage     # 2. Fahrt fährt spätestens so viele Tage nach der 1. ab
+        self._sp = sp
+        s = len(sp.bahnhoefe)
+        self._s = s
+        self._breite = (s + 7) // 8
+
+        # Halte ohne Bahnhofsnamen kann man nicht suchen
+        benannt = np.asarray([bool(n) for n in sp.bahnhoefe] or [False], dtype=bool)[sp.station]
+        self._ok_an = (sp.an != KEINE_ZEIT) & benannt
+        ok_ab = np.flatnonzero((sp.ab != KEINE_ZEIT) & benannt)
+
+        # Halte mit Abfahrt nach Tag sortiert -> Halte eines Tages = ein Bereich
+        tag_halt = sp.ab[ok_ab] // 86400
+        order = np.argsort(tag_halt, kind="stable")
+        self._halte = ok_ab[order]
+        self._tage, self._tag_offset = np.unique(tag_halt[order], return_index=True)
+        self._tag_offset = np.append(self._tag_offset, len(self._halte)).astype(np.int64)
+        laengen = np.diff(sp.ride_offset)
+        self._max_len = int(laengen.max()) if len(laengen) else 0
+
+        self._lock = threading.Lock()
+        self._direkt: Dict[int, np.ndarray] = {}
+        self._umstieg: Dict[int, np.ndarray] = {}
+
+    def _tag(self, datum: date) -> Optional[int]:
+        """Tage seit 1970, None wenn an dem Tag nichts abfährt"""
+        t = (datum - EPOCH.date()).days
+        k = int(np.searchsorted(self._tage, t))
+        return t if k < len(self._tage) and self._tage[k] == t else None
+
+    @staticmethod
+    def _bit(zeile: np.ndarray, nr: int) -> bool:
+        return bool(zeile[nr >> 3] & (0x80 >> (nr & 7)))
+
+    @staticmethod
+    def _merken(cache: Dict[int, np.ndarray], t: int, tabelle: np.ndarray) -> np.ndarray:
+        tabelle = cache.setdefault(t, tabelle)
+        while len(cache) > ERREICHBARKEIT_MAX_TAGE:
+            cache.pop(next(iter(cache)))
+        return tabelle
+
+    def _direkt_bauen(self, t: int) -> np.ndarray:
+        sp = self._sp
+        out = np.zeros((self._s, self._breite), dtype=np.uint8)
+        k = int(np.searchsorted(self._tage, t))
+        if k >= len(self._tage) or self._tage[k] != t:
+            return out
+        halte = self._halte[self._tag_offset[k]:self._tag_offset[k + 1]]
+        m = len(sp.station)
+
+        # alle Paare (i, j) mit i < j in derselben Fahrt: pro Abstand einmal vektorisiert
+        for abstand in range(1, self._max_len):
+            i = halte[halte + abstand < m]
+            j = i + abstand
+            sel = (sp.halt_ride[i] == sp.halt_ride[j]) & self._ok_an[j] & (sp.station[i] != sp.station[j])
+            a, b = sp.station[i[sel]], sp.station[j[sel]]
+            np.bitwise_or.at(out, (a, b >> 3), (0x80 >> (b & 7)).astype(np.uint8))
+        return out
+
+    def _direkt_tag(self, t: int) -> np.ndarray:
+        with self._lock:
+            tabelle = self._direkt.get(t)
+        if tabelle is not None:
+            return tabelle
+        tabelle = self._direkt_bauen(t)
+        with self._lock:
+            return self._merken(self._direkt, t, tabelle)
+
+    def _umstieg_tag(self, t: int) -> np.ndarray:
+        with self._lock:
+            tabelle = self._umstieg.get(t)
+        if tabelle is not None:
+            return tabelle
+
+        direkt = self._direkt_tag(t)
+        weiter = direkt.copy()
+        for f in range(1, self.folgetage + 1):
+            weiter |= self._direkt_tag(t + f)
+        # a -> x direkt, dann alles was von x aus weiter geht: nur über die gesetzten Bits,
+        # O(Kanten * S/8) statt S x S Matrixprodukt
+        a, x = np.nonzero(np.unpackbits(direkt, axis=1, count=self._s))
+        tabelle = direkt.copy()
+        np.bitwise_or.at(tabelle, a, weiter[x])
+        with self._lock:
+            return self._merken(self._umstieg, t, tabelle)
+
+    def moeglich(self, start_name: str, ziel_name: str, datum: date, max_umstiege: int = 1) -> bool:
+        """False = sicher keine Verbindung mit <= max_umstiege (nur 0 und 1 bekannt, mehr -> True)"""
+        if max_umstiege > 1:
+            return True
+        a, b, t = self.bahnhof_nr.get(start_name), self.bahnhof_nr.get(ziel_name), self._tag(datum)
+        if a is None or b is None or t is None:
+            return False
+        tabelle = self._direkt_tag(t) if max_umstiege == 0 else self._umstieg_tag(t)
+        return self._bit(tabelle[a], b)
+
+    def umstieg_zum_ziel(self, ziel_name: str, datum: date) -> np.ndarray:
+        """
+        bool[S]: Bahnhöfe t, von denen aus das Ziel direkt erreichbar ist, wenn die 1. Fahrt
+        am datum abfährt (2. Fahrt am datum oder an den Folgetagen)
+        """
+        b, t = self.bahnhof_nr.get(ziel_name), self._tag(datum)
+        out = np.zeros(self._s, dtype=bool)
+        if b is None or t is None:
+            return out
+        for f in range(self.folgetage + 1):
+            out |= (self._direkt_tag(t + f)[:, b >> 3] & (0x80 >> (b & 7))) != 0
+        return out
+
+    def uebernehmen(self, alt: "Erreichbarkeit", geaendert: Iterable[int]) -> None:
+        """
+        schon gebaute Tage aus dem alten Modell übernehmen (nach apply_delta), außer den Tagen
+        in geaendert (Tage seit 1970 mit Abfahrten geänderter/gelöschter Fahrten) - umstieg(t)
+        hängt auch an direkt(t + 1 .. t + folgetage), die fallen also auch raus
+        """
+        if alt.bahnhof_nr != self.bahnhof_nr or alt.folgetage != self.folgetage:
+            return      # Bahnhofs-Nummern verschoben -> nichts wiederverwendbar
+        geaendert = set(geaendert)
+        umstieg_weg = {t - f for t in geaendert for f in range(self.folgetage + 1)}
+        with alt._lock:
+            direkt = {t: v for t, v in alt._direkt.items() if t not in geaendert}
+            umstieg = {t: v for t, v in alt._umstieg.items() if t not in umstieg_weg}
+        with self._lock:
+            self._direkt.update(direkt)
+            self._umstieg.update(umstieg)
+
+
+def abfahrts_tage(rides: Iterable[Dict[str, Any]]) -> set[int]:
+    """Tage seit 1970, an denen die rides irgendwo abfahren (für Erreichbarkeit.uebernehmen)"""
+    return {
+        epoch_sek(st["dep"] or st["arr"]) // 86400
+        for r in rides for st in r["stops"]
+        if st["dep"] or st["arr"]
+    }
+
+
+def build_erreichbarkeit(sp: SpaltenFahrplan) -> Erreichbarkeit:
+    # 2. Fahrt: Abfahrt bis zu (längste Fahrt + max. Umstiegszeit) nach der 1. Abfahrt
+    laengen = np.diff(sp.ride_offset)
+    if len(sp.station) and len(laengen):
+        erste = sp.ride_offset[:-1][laengen > 0]
+        letzte = sp.ride_offset[1:][laengen > 0] - 1
+        dauer = np.where((sp.ab[erste] != KEINE_ZEIT) & (sp.an[letzte] != KEINE_ZEIT),
+                         sp.an[letzte] - sp.ab[erste], 0)
+        max_dauer = int(dauer.max()) if len(dauer) else 0
+    else:
+        max_dauer = 0
+    folgetage = (max_dauer + 30 * 60) // 86400 + 1
+    return Erreichbarkeit(sp, folgetage)
@@ -0,0 +1,67 @@
+"""
+Unabhängige Service-Aufrufe gleichzeitig statt hintereinander
+
+parallel_holen({"bahnhoefe": strecken_bahnhoefe, "warnungen": strecken_warnungen, ...}, frist_sek)
+startet alle Aufgaben im Thread-Pool (jede mit App-Kontext, damit current_app.config usw.
+funktionieren) und wartet höchstens frist_sek auf ALLE zusammen.
+Die Seite dauert dann so lange wie der langsamste Aufruf, nicht die Summe.
+
+Was bis zur Frist nicht fertig ist, bekommt fehler=TimeoutError - der Thread läuft im
+Hintergrund zu Ende (begrenzt durch die HTTP-Timeouts), das Ergebnis wird verworfen.
+"""
+
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from flask import current_app
+
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="upstream")
+
+
+@dataclass
+class Ergebnis:
+    wert: Any = None
+    fehler: Optional[BaseException] = None
+    dauer_ms: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.fehler is None
+
+
+def _ausfuehren(app, aufgabe: Callable[[], Any]) -> Ergebnis:
+    t0 = time.perf_counter()
+    try:
+        with app.app_context():
+            wert = aufgabe()
+        return Ergebnis(wert=wert, dauer_ms=(time.perf_counter() - t0) * 1000)
+    except Exception as e:
+        return Ergebnis(fehler=e, dauer_ms=(time.perf_counter() - t0) * 1000)
+
+
+def parallel_holen(aufgaben: Dict[str, Callable[[], Any]], frist_sek: float) -> Dict[str, Ergebnis]:
+    app = current_app._get_current_object()
+    futures = {name: _pool.submit(_ausfuehren, app, f) for name, f in aufgaben.items()}
+    wait(futures.values(), timeout=frist_sek)
+
+    out: Dict[str, Ergebnis] = {}
+    for name, fut in futures.items():
+        if fut.done():
+            out[name] = fut.result()
+        else:
+            out[name] = Ergebnis(fehler=TimeoutError(f"{name}: Frist {frist_sek}s überschritten"),
+                                 dauer_ms=frist_sek * 1000)
+    return out
+
+
+def zeiten_loggen(seite: str, ergebnisse: Dict[str, Ergebnis], gesamt_ms: float) -> None:
+    """eine Log-Zeile pro Request: Dauer je Upstream (+ Fehler) und gesamt"""
+    teile = [
+        f"{name}={e.dauer_ms:.0f}ms" + ("" if e.ok else f"({type(e.fehler).__name__})")
+        for name, e in ergebnisse.items()
+    ]
+    current_app.logger.info("%s upstream: %s gesamt=%.0fms", seite, " ".join(teile), gesamt_ms)
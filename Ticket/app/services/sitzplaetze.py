@@ -0,0 +1,373 @@
+"""
+Sitzplatz-Reservierung ohne Überbuchung, pro Segment
+
+Bisher in ticket_buchen: Kapazität bei Flotten holen, COUNT(*) über die aktiven Tickets mit
+Sitzplatz, wenn noch Platz ist -> Ticket einfügen. Zwei Buchungen gleichzeitig sehen denselben
+COUNT und bekommen beide den letzten Platz.
+
+Pro Fahrt gibt es eine Zeile in sitzplatz_kontingent mit der Belegung jedes Segments
+(Segment i = Halt i -> Halt i+1). Eine Reservierung Linz -> Wels belegt nur diese Segmente,
+derselbe Platz ist davor und danach wieder frei. Bei Umstieg wird die zweite Fahrt genauso
+geprüft und belegt.
+
+In Python liegt die Belegung als Segmentbaum (Belegung): Maximum über i..j und +1 auf i..j
+in O(log n) - bei Sammelbuchungen wird der Baum einmal pro Fahrt geladen und dann nur noch
+abgefragt/geändert.
+
+Schreiben: Zeile lesen (SELECT ... FOR UPDATE, bei SQLite ohne Wirkung), im Baum prüfen und
+belegen, dann
+
+    UPDATE sitzplatz_kontingent SET belegung = :neu, version = version + 1
+    WHERE fahrt_id = :fahrt AND version = :gelesen
+
+rowcount 0 = jemand anderes war schneller -> neu lesen und nochmal. Das UPDATE läuft in der
+Transaktion vom Ticket-INSERT, also gilt entweder beides oder nichts.
+
+Die Kapazität pro Zug kommt weiter von Flotten, wird aber zwischengespeichert
+(SITZPLATZ_KAPAZITAET_TTL_SEK) statt bei jeder Buchung gefragt.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import sqlalchemy as sa
+from flask import current_app
+
+from app import db
+from app.models import SitzplatzKontingent, Ticket
+from app.services.external_clients import flotte_kapazitaet
+from app.services.verbindungen import halt_indizes
+
+if TYPE_CHECKING:
+    from app.services.fahrplan_cache import FahrplanModell
+
+DEFAULT_TTL_SEK = 300.0
+# so oft wird bei gleichzeitigen Änderungen (version passt nicht mehr) neu gelesen
+VERSUCHE = 10
+
+
+class _KapazitaetCache:
+    """Sitzplätze pro Zug (Summe der Personenwagen), zug_id -> (plaetze, geladen_mono)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._werte: Dict[int, Tuple[int, float]] = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, zug_id: int, ttl_sek: float) -> int:
+        with self._lock:
+            e = self._werte.get(zug_id)
+            if e is not None and time.monotonic() - e[1] <= ttl_sek:
+                self.stats["hits"] += 1
+                return e[0]
+            self.stats["misses"] += 1
+
+        # Fehler von Flotten gehen an den Aufrufer, es wird nichts gespeichert
+        cap = flotte_kapazitaet(zug_id)
+        plaetze = sum(int(w.get("kapazitaet", 0)) for w in (cap.get("personenwagen") or []))
+        with self._lock:
+            self._werte[zug_id] = (plaetze, time.monotonic())
+        return plaetze
+
+    def clear(self) -> None:
+        with self._lock:
+            self._werte.clear()
+
+
+_cache = _KapazitaetCache()
+
+
+def zug_kapazitaet(zug_id: int) -> int:
+    """Sitzplätze im Zug laut Flotten (zwischengespeichert)"""
+    return _cache.get(int(zug_id), float(current_app.config.get("SITZPLATZ_KAPAZITAET_TTL_SEK", DEFAULT_TTL_SEK)))
+
+
+class Belegung:
+    """
+    Segmentbaum über die Segmente einer Fahrt (Blätter = belegte Plätze pro Segment).
+    Bereiche sind halboffen [von, bis), also Halt von bis Halt bis.
+    Die Addition bleibt am Knoten stehen (kein Runterschieben): _max[k] = Maximum im
+    Teilbaum inklusive aller Additionen ab k abwärts.
+    """
+
+    def __init__(self, werte: List[int]):
+        self.n = len(werte)
+        size = 1
+        while size < max(1, self.n):
+            size *= 2
+        self._size = size
+        self._max = [0] * (2 * size)
+        self._add = [0] * (2 * size)
+        self._max[size:size + self.n] = [int(w) for w in werte]
+        for k in range(size - 1, 0, -1):
+            self._max[k] = max(self._max[2 * k], self._max[2 * k + 1])
+
+    def maximum(self, von: int, bis: int) -> int:
+        """höchste Belegung in den Segmenten von..bis-1 (0 bei leerem Bereich)"""
+        if von >= bis:
+            return 0
+        return self._maximum(1, 0, self._size, von, bis)
+
+    def _maximum(self, k: int, l: int, r: int, von: int, bis: int) -> int:
+        if von <= l and r <= bis:
+            return self._max[k]
+        m = (l + r) // 2
+        if bis <= m:
+            best = self._maximum(2 * k, l, m, von, bis)
+        elif von >= m:
+            best = self._maximum(2 * k + 1, m, r, von, bis)
+        else:
+            best = max(self._maximum(2 * k, l, m, von, bis), self._maximum(2 * k + 1, m, r, von, bis))
+        return best + self._add[k]
+
+    def addieren(self, von: int, bis: int, delta: int) -> None:
+        """delta auf die Segmente von..bis-1"""
+        if von < bis:
+            self._addieren(1, 0, self._size, von, bis, delta)
+
+    def _addieren(self, k: int, l: int, r: int, von: int, bis: int, delta: int) -> None:
+        if von <= l and r <= bis:
+            self._max[k] += delta
+            self._add[k] += delta
+            return
+        m = (l + r) // 2
+        if von < m:
+            self._addieren(2 * k, l, m, von, bis, delta)
+        if bis > m:
+            self._addieren(2 * k + 1, m, r, von, bis, delta)
+        self._max[k] = max(self._max[2 * k], self._max[2 * k + 1]) + self._add[k]
+
+    def werte(self) -> List[int]:
+        out = []
+        for i in range(self.n):
+            k = self._size + i
+            w = self._max[k]
+            k //= 2
+            while k:
+                w += self._add[k]
+                k //= 2
+            out.append(w)
+        return out
+
+    def text(self) -> str:
+        return ",".join(str(w) for w in self.werte())
+
+    @classmethod
+    def aus_text(cls, text: str) -> "Belegung":
+        return cls([int(w) for w in text.split(",")] if text else [])
+
+
+@dataclass(frozen=True)
+class Teilstrecke:
+    """Stück einer Fahrt, das ein Ticket belegt: Segmente von..bis-1 von segmente"""
+    fahrt_id: int
+    zug_id: int
+    von: int
+    bis: int
+    segmente: int
+
+
+def teilstrecke(
+    fahrplan: "FahrplanModell",
+    fahrt_id: int,
+    von_name: str,
+    nach_name: str,
+    abfahrt=None,
+) -> Optional[Teilstrecke]:
+    """
+    Segmente der Fahrt zwischen den Halten (wie bei preis_zwischen), None wenn es sie so nicht gibt
+    Zug kommt immer aus dem Fahrplan (Kapazität hängt daran, nicht vom Client übernehmen)
+    """
+    ij = halt_indizes(fahrt_id, von_name, nach_name, abfahrt, fahrplan)
+    if ij is None:
+        return None
+    r = fahrplan.ride(fahrt_id)
+    return Teilstrecke(int(fahrt_id), int(r["zug_id"] or 0), ij[0], ij[1], len(r["stops"]) - 1)
+
+
+def _ticket_teilstrecken(fahrplan: "FahrplanModell", t: Ticket) -> List[Optional[Teilstrecke]]:
+    """welche Segmente ein gebuchtes Ticket belegt (je Fahrt, None = unbekannt)"""
+    if t.fahrt_id2:
+        return [
+            teilstrecke(fahrplan, t.fahrt_id, t.start_halt, t.umstieg_bahnhof, t.abfahrt),
+            teilstrecke(fahrplan, t.fahrt_id2, t.umstieg_bahnhof, t.ziel_halt, t.umstieg_abfahrt),
+        ]
+    return [teilstrecke(fahrplan, t.fahrt_id, t.start_halt, t.ziel_halt, t.abfahrt)]
+
+
+def _aus_tickets(fahrplan: "FahrplanModell", fahrt_id: int, segmente: int) -> Belegung:
+    """
+    Belegung aus den aktiven Tickets aufbauen (neue Zeile, Zeilen von vor der Segment-Belegung
+    oder die Fahrt hat im Fahrplan jetzt andere Halte). Unbekannte Strecke = ganze Fahrt.
+    """
+    baum = Belegung([0] * segmente)
+    tickets = Ticket.query.filter(
+        sa.or_(Ticket.fahrt_id == fahrt_id, Ticket.fahrt_id2 == fahrt_id),
+        Ticket.status == "aktiv",
+        Ticket.sitzplatzReservierung.is_(True),
+    ).all()
+    for t in tickets:
+        fahrt_ids = [t.fahrt_id, t.fahrt_id2] if t.fahrt_id2 else [t.fahrt_id]
+        for fid, ts in zip(fahrt_ids, _ticket_teilstrecken(fahrplan, t)):
+            if fid != fahrt_id:
+                continue
+            if ts is None or ts.segmente != segmente:
+                baum.addieren(0, segmente, 1)
+            else:
+                baum.addieren(ts.von, ts.bis, 1)
+    return baum
+
+
+def _kontingent_anlegen(fahrt_id: int, zug_id: int, kapazitaet: int) -> None:
+    """Zeile für die Fahrt anlegen falls es sie noch nicht gibt (Belegung kommt beim ersten Laden)"""
+    tabelle = SitzplatzKontingent.__table__
+    werte = dict(fahrt_id=fahrt_id, zug_id=zug_id, kapazitaet=kapazitaet, reserviert=0, version=0)
+
+    dialekt = db.session.get_bind().dialect.name
+    if dialekt == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialekt == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        # andere DBs: vorher nachsehen (Race nur beim allerersten Platz einer Fahrt)
+        if db.session.get(SitzplatzKontingent, fahrt_id) is None:
+            db.session.execute(sa.insert(tabelle).values(**werte))
+        return
+    db.session.execute(insert(tabelle).values(**werte).on_conflict_do_nothing(index_elements=["fahrt_id"]))
+
+
+def belegung_laden(fahrplan: "FahrplanModell", ts: Teilstrecke, kapazitaet: int) -> Tuple[int, Belegung]:
+    """(version, Baum) für die Fahrt, Zeile wird bei Bedarf angelegt"""
+    _kontingent_anlegen(ts.fahrt_id, ts.zug_id, kapazitaet)
+    tabelle = SitzplatzKontingent.__table__
+    row = db.session.execute(
+        sa.select(tabelle.c.version, tabelle.c.segmente, tabelle.c.belegung)
+        .where(tabelle.c.fahrt_id == ts.fahrt_id)
+        .with_for_update()
+    ).one()
+    if row.belegung is None or row.segmente != ts.segmente:
+        return row.version, _aus_tickets(fahrplan, ts.fahrt_id, ts.segmente)
+    return row.version, Belegung.aus_text(row.belegung)
+
+
+def belegung_speichern(ts: Teilstrecke, version: int, baum: Belegung, kapazitaet: int) -> bool:
+    """False = version passt nicht mehr (gleichzeitig geändert), dann neu laden"""
+    tabelle = SitzplatzKontingent.__table__
+    res = db.session.execute(
+        sa.update(tabelle)
+        .where(tabelle.c.fahrt_id == ts.fahrt_id, tabelle.c.version == version)
+        .values(
+            belegung=baum.text(),
+            segmente=ts.segmente,
+            reserviert=baum.maximum(0, baum.n),
+            version=tabelle.c.version + 1,
+            kapazitaet=kapazitaet,
+            zug_id=ts.zug_id,
+        )
+    )
+    return res.rowcount == 1
+
+
+def _aendern(fahrplan: "FahrplanModell", ts: Teilstrecke, kapazitaet: int, delta: int) -> bool:
+    for _ in range(VERSUCHE):
+        version, baum = belegung_laden(fahrplan, ts, kapazitaet)
+        if delta > 0 and baum.maximum(ts.von, ts.bis) + delta > kapazitaet:
+            return False
+        if delta < 0 and baum.maximum(ts.von, ts.bis) <= 0:
+            return True
+        baum.addieren(ts.von, ts.bis, delta)
+        if belegung_speichern(ts, version, baum, kapazitaet):
+            return True
+    raise RuntimeError(f"Sitzplatz-Kontingent Fahrt {ts.fahrt_id}: zu viele gleichzeitige Änderungen")
+
+
+def platz_reservieren(fahrplan: "FahrplanModell", ts: Teilstrecke, kapazitaet: int) -> bool:
+    """
+    einen Sitzplatz auf den Segmenten der Teilstrecke belegen, False = ausgebucht.
+    Kein commit - das macht der Aufrufer zusammen mit dem Ticket (bei False: rollback).
+    Mehrere Fahrten (Umstieg) in aufsteigender fahrt_id reservieren, sonst können sich zwei
+    Buchungen gegenseitig sperren.
+    """
+    return _aendern(fahrplan, ts, kapazitaet, +1)
+
+
+def platz_freigeben(fahrplan: "FahrplanModell", ts: Teilstrecke) -> None:
+    """Segmente der Teilstrecke wieder frei geben (kein commit)"""
+    kontingent = db.session.get(SitzplatzKontingent, ts.fahrt_id)
+    if kontingent is None:
+        return
+    _aendern(fahrplan, ts, kontingent.kapazitaet, -1)
+
+
+def belegung_verwerfen(fahrt_id: int) -> None:
+    """Belegung wird beim nächsten Laden aus den Tickets neu aufgebaut (kein commit)"""
+    tabelle = SitzplatzKontingent.__table__
+    db.session.execute(
+        sa.update(tabelle)
+        .where(tabelle.c.fahrt_id == fahrt_id)
+        .values(belegung=None, version=tabelle.c.version + 1)
+    )
+
+
+def ticket_freigeben(fahrplan: Optional["FahrplanModell"], t: Ticket) -> None:
+    """
+    Storno: Sitzplätze vom Ticket frei geben, vor dem Ändern vom Status aufrufen.
+    Wo die Segmente nicht (mehr) bekannt sind (kein Fahrplan, Fahrt geändert), wird die
+    Belegung der Fahrt verworfen - das Ticket zählt beim Neuaufbau dann nicht mehr mit.
+    """
+    fahrt_ids = [t.fahrt_id, t.fahrt_id2] if t.fahrt_id2 else [t.fahrt_id]
+    strecken = _ticket_teilstrecken(fahrplan, t) if fahrplan is not None else [None] * len(fahrt_ids)
+    for fid, ts in sorted(zip(fahrt_ids, strecken), key=lambda x: x[0]):
+        if ts is None:
+            belegung_verwerfen(fid)
+        else:
+            platz_freigeben(fahrplan, ts)
+
+
+class Sammelreservierung:
+    """
+    viele Reservierungen in einer Transaktion (Sammelbuchung): jede Fahrt wird einmal geladen
+    (laden, nach fahrt_id sortiert), alle Plätze im Baum belegt und am Ende einmal gespeichert.
+    """
+
+    def __init__(self, fahrplan: "FahrplanModell"):
+        self.fahrplan = fahrplan
+        # fahrt_id -> [version, Baum, Teilstrecke (für segmente/zug_id), kapazitaet]
+        self._fahrten: Dict[int, list] = {}
+
+    def laden(self, strecken: List[Teilstrecke], kapazitaet: Dict[int, int]) -> None:
+        eine_pro_fahrt = {ts.fahrt_id: ts for ts in strecken}
+        for fid in sorted(eine_pro_fahrt):
+            ts = eine_pro_fahrt[fid]
+            if fid not in self._fahrten:
+                version, baum = belegung_laden(self.fahrplan, ts, kapazitaet[ts.zug_id])
+                self._fahrten[fid] = [version, baum, ts, kapazitaet[ts.zug_id]]
+
+    def reservieren(self, strecken: List[Teilstrecke], anzahl: int = 1) -> bool:
+        """anzahl Plätze auf allen Teilstrecken oder auf keiner"""
+        erledigt: List[Teilstrecke] = []
+        for ts in strecken:
+            _version, baum, _ts, kap = self._fahrten[ts.fahrt_id]
+            if baum.maximum(ts.von, ts.bis) + anzahl > kap:
+                for zurueck in erledigt:
+                    self._fahrten[zurueck.fahrt_id][1].addieren(zurueck.von, zurueck.bis, -anzahl)
+                return False
+            baum.addieren(ts.von, ts.bis, anzahl)
+            erledigt.append(ts)
+        return True
+
+    def speichern(self) -> bool:
+        """False = eine Fahrt wurde inzwischen geändert, dann rollback und nochmal"""
+        for fid in sorted(self._fahrten):
+            version, baum, ts, kap = self._fahrten[fid]
+            if not belegung_speichern(ts, version, baum, kap):
+                return False
+        return True
+
+
+def kapazitaet_cache_leeren() -> None:
+    _cache.clear()
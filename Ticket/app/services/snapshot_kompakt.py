@@ -0,0 +1,91 @@
+"""
+Liest den Fahrplan-Snapshot im Kompaktformat (application/vnd.fahrplan.kompakt)
+direkt in "rides" (gleiche Struktur wie _build_rides in verbindungen.py)
+
+Format (Details siehe Fahrplan/app/services/snapshot_kompakt.py):
+    b"FPK1", uint32 Header-Länge, Header-JSON (version, total, halte, bahnhoefe)
+    int32 Spalten fahrt_id / halteplan_id / zug_id / halt_offset / halt_id / bahnhof_idx /
+    ankunft / abfahrt (Minuten seit 1970, -1 = keine), float32 tarif
+
+Kein datetime.fromisoformat pro Halt mehr: jede vorkommende Minute wird einmal in ein
+datetime umgerechnet und dann wiederverwendet (Fahrpläne haben viele gleiche Zeiten),
+Bahnhofsnamen kommen aus dem Wörterbuch im Header.
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+KOMPAKT_MIMETYPE = "application/vnd.fahrplan.kompakt"
+MAGIC = b"FPK1"
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class KompaktFormatFehler(ValueError):
+    pass
+
+
+def decode_rides(data: bytes) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Rückgabe: (rides, meta) - meta = Header ohne Bahnhofsliste (version, total, since, deleted ...)"""
+    if data[:4] != MAGIC:
+        raise KompaktFormatFehler("kein Fahrplan-Kompaktformat")
+    (header_len,) = struct.unpack_from("<I", data, 4)
+    header = json.loads(data[8:8 + header_len])
+    off = 8 + header_len
+
+    def spalte(typecode: str, n: int) -> array:
+        nonlocal off
+        a = array(typecode)
+        ende = off + n * a.itemsize
+        if ende > len(data):
+            raise KompaktFormatFehler("Snapshot abgeschnitten")
+        a.frombytes(data[off:ende])
+        if sys.byteorder == "big":
+            a.byteswap()
+        off = ende
+        return a
+
+    n, m = int(header["total"]), int(header["halte"])
+    fahrt_ids, halteplan_ids, zug_ids = spalte("i", n), spalte("i", n), spalte("i", n)
+    offsets = spalte("i", n + 1)
+    _halt_ids, halt_bahnhof = spalte("i", m), spalte("i", m)
+    ankunft, abfahrt, tarif = spalte("i", m), spalte("i", m), spalte("f", m)
+
+    namen = [(name or "").strip() for _bid, name in header.pop("bahnhoefe")]
+
+    # Spalten einmal in Python-Listen, jede vorkommende Minute nur einmal in datetime umrechnen
+    ank, abf = ankunft.tolist(), abfahrt.tolist()
+    zeiten: Dict[int, Any] = {m: EPOCH + timedelta(minutes=m) for m in set(ank) | set(abf) if m >= 0}
+    zeiten[-1] = None
+    halt_namen = [namen[i] for i in halt_bahnhof.tolist()]
+    # float32 -> die gesendeten Cent-Beträge wiederherstellen
+    tarife = [round(t, 4) for t in tarif.tolist()]
+    offsets = offsets.tolist()
+
+    rides = []
+    for k, (fid, hp_id, zug_id) in enumerate(zip(fahrt_ids.tolist(), halteplan_ids.tolist(), zug_ids.tolist())):
+        stops = []
+        idx_map: Dict[str, List[int]] = {}
+        for i, j in enumerate(range(offsets[k], offsets[k + 1])):
+            arr = zeiten[ank[j]]
+            dep = zeiten[abf[j]]
+            name = halt_namen[j]
+            # gleiche Fallbacks wie _build_ride (letzter Halt hat keine Abfahrt)
+            stops.append({"name": name, "dep": dep or arr, "arr": arr or dep, "tarif": tarife[j]})
+            idx_map.setdefault(name, []).append(i)
+
+        rides.append({
+            "id": fid,
+            "halteplan_id": hp_id,
+            "zug_id": zug_id,
+            "stops": stops,
+            "idx_map": idx_map,
+        })
+
+    return rides, header
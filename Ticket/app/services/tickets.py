@@ -0,0 +1,129 @@
+"""
+Tickets: Ablauf-Job und seitenweise Liste für "Meine Tickets"
+
+Ablauf: bisher hat meine_tickets bei jedem Aufruf alle Tickets vom User geladen, abgelaufene
+in einer Schleife auf "verbraucht" gesetzt und committet (GET = Schreib-Transaktion).
+Jetzt macht das ein Hintergrund-Thread alle TICKET_ABLAUF_INTERVALL_SEK mit einem UPDATE:
+
+    UPDATE ticket SET status = 'verbraucht' WHERE status = 'aktiv' AND abfahrt <= :jetzt
+
+(Index ix_ticket_status_abfahrt). Mehrere Worker-Prozesse = mehrere Threads, das UPDATE ist
+idempotent, also egal.
+
+Liste: Keyset-Pagination auf (erstelltAm, id) absteigend, Cursor = letztes Ticket der Seite.
+Kein OFFSET, jede Seite ist ein Index-Zugriff (ix_ticket_user_erstellt), egal wie viele
+Tickets der User schon hat.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import sqlalchemy as sa
+
+from app import db
+from app.models import Ticket
+
+DEFAULT_INTERVALL_SEK = 60.0
+DEFAULT_SEITE = 20
+
+
+def tickets_ablaufen_lassen(jetzt: Optional[datetime] = None) -> int:
+    """aktive Tickets mit Abfahrt <= jetzt auf verbraucht setzen (mit commit), Anzahl zurück"""
+    jetzt = jetzt or datetime.utcnow()
+    res = db.session.execute(
+        sa.update(Ticket)
+        .where(Ticket.status == "aktiv", Ticket.abfahrt <= jetzt)
+        .values(status="verbraucht")
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return res.rowcount
+
+
+class _AblaufJob:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stats = {"laeufe": 0, "abgelaufen": 0, "fehler": 0}
+
+    def starten(self, app, intervall_sek: float) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._schleife, args=(app, intervall_sek), daemon=True, name="ticket-ablauf",
+            )
+            self._thread.start()
+
+    def _schleife(self, app, intervall_sek: float) -> None:
+        while not self._stop.is_set():
+            try:
+                with app.app_context():
+                    anzahl = tickets_ablaufen_lassen()
+                    db.session.remove()
+                with self._lock:
+                    self.stats["laeufe"] += 1
+                    self.stats["abgelaufen"] += anzahl
+            except Exception as e:
+                # DB kurz weg o.ä.: nächster Lauf probiert es wieder
+                with self._lock:
+                    self.stats["fehler"] += 1
+                app.logger.warning("Ticket-Ablauf fehlgeschlagen: %s", e)
+            self._stop.wait(intervall_sek)
+
+    def stoppen(self) -> None:
+        self._stop.set()
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=5)
+
+
+_job = _AblaufJob()
+
+
+def ablauf_job_starten(app) -> None:
+    _job.starten(app, float(app.config.get("TICKET_ABLAUF_INTERVALL_SEK", DEFAULT_INTERVALL_SEK)))
+
+
+def ablauf_job_stoppen() -> None:
+    _job.stoppen()
+
+
+def ablauf_job_stats() -> Dict[str, int]:
+    with _job._lock:
+        return dict(_job.stats)
+
+
+def encode_ticket_cursor(t: Ticket) -> str:
+    raw = json.dumps([t.erstelltAm.isoformat(), t.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_ticket_cursor(cursor: str) -> Tuple[datetime, int]:
+    """ValueError bei kaputtem Cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        zeit, tid = json.loads(raw)
+        return datetime.fromisoformat(zeit), int(tid)
+    except Exception as e:
+        raise ValueError("ungültiger Cursor") from e
+
+
+def tickets_seite(user_id: int, limit: int = DEFAULT_SEITE, cursor: Optional[str] = None) -> Tuple[List[Ticket], Optional[str]]:
+    """neueste Tickets zuerst, nach dem Cursor; (tickets, next_cursor oder None)"""
+    q = Ticket.query.filter(Ticket.user_id == user_id)
+    if cursor:
+        zeit, tid = decode_ticket_cursor(cursor)
+        q = q.filter(sa.tuple_(Ticket.erstelltAm, Ticket.id) < sa.tuple_(zeit, tid))
+    tickets = q.order_by(Ticket.erstelltAm.desc(), Ticket.id.desc()).limit(limit + 1).all()
+    if len(tickets) > limit:
+        return tickets[:limit], encode_ticket_cursor(tickets[limit - 1])
+    return tickets, None
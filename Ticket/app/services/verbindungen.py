@@ -5,6 +5,7 @@ Dieser Service sucht Zugverbindungen zwischen zwei Bahnhöfen auf Basis
  eines Fahrplan "Snapshots" (JSON vom Fahrplan-Service)
 
  Es können Direktverbindungen und Verbindungen mit einem Umstieg gesucht werden.
+ (mit modus="csa" auch mehr Umstiege, siehe verbindungen_csa.py)
 
  Die UI verwendet Dropdowns wodurch Start/Zielbahnhöfe exakt reinkommen und nicht
  normalisiert werden müssen.
@@ -12,7 +13,7 @@ Dieser Service sucht Zugverbindungen zwischen zwei Bahnhöfen auf Basis
  Das "Matching" kann jetzt über die Namens-Übereinstimmung erfolgen.
  
  Ablauf grob:
-    - Fahrplan-Snapshot holen
+    - Fahrplan-Snapshot holen (über den Cache in fahrplan_cache.py, dort einmal geparst)
     - Snapshot in interne Struktur "rides" umwandeln (build_rides)
     (ride ist eine konkrete Fahrt (FahrtdurchfuehrungId) mit Liste von Halten = "stops")
     - Für jede Fahrt dann:
@@ -26,22 +27,58 @@ Dieser Service sucht Zugverbindungen zwischen zwei Bahnhöfen auf Basis
         Umstiegszeit muss zwischen MIN nud MAX sein
         Preis = Preis von 1. Segment + Preis von 2. Segment
 
+        Die 2. Fahrt wird nicht mehr über alle rides gesucht, sondern über einen
+        Abfahrts-Index (Bahnhof -> sortierte Liste (Abfahrt, ride, Halt-Index)).
+        Per Binärsuche werden nur Abfahrten im Umstiegsfenster angeschaut.
+
         Ergebnis: LIste von VerbindungsHit-Objekten sortiert nach Abfahrt, Umstiegen, Ankunft
+
+    - Seitenweise (suche_verbindungen_seite): rides nach Abfahrt am Start abarbeiten und
+      aufhören, sobald die Seite voll ist; weiter geht es mit dem Cursor der letzten Verbindung
 """
 
 
 
-from dataclasses import dataclass
+import base64
+import binascii
+import json
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
 from datetime import date, datetime, time, timedelta
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from app.services.fahrplan_spalten import build_spalten, fahrten_a_vor_b, fahrten_ab_start
 
-from app.services.external_clients import fahrplan_snapshot
+if TYPE_CHECKING:
+    from app.services.fahrplan_cache import FahrplanModell
 
 
 # Umstiegsregeln
 MIN_UMSTIEG_MIN = 5        # mind. 5 Minuten Umstieg
 MAX_UMSTIEG_MIN = 30      # max  warten
 
+# Modi für die Suche: "standard" = Direkt + 1 Umstieg (Schleifen + Index),
+# "csa" = Connection Scan mit beliebig vielen Umstiegen (verbindungen_csa.py)
+SUCHMODI = ("standard", "csa")
+
+
+# eine Teilfahrt (Leg) einer Verbindung: von/nach als Bahnhofsname + Halt-Index im ride
+@dataclass(frozen=True)
+class Teilfahrt:
+    fahrtdurchfuehrung_id: int
+    halteplan_id: int
+    zug_id: int
+    von_name: str
+    nach_name: str
+    abfahrt: datetime
+    ankunft: datetime
+    preis: float
+    von_idx: int
+    nach_idx: int
+
+
 # Ergebnis Datensatz für eine gefundene Verbindung, kann entweder Direktverbindung
 # sein, oder 1 Umstieg haben (dann sind 2. Teilfahrt-Felder gesetzt)
 @dataclass
@@ -69,6 +106,9 @@ class VerbindungHit:
     halteplan_id2: Optional[int] = None
     zug_id2: Optional[int] = None
 
+    # alle Teilfahrten in Reihenfolge (1 bei Direkt, umstiege+1 allgemein)
+    teilfahrten: List[Teilfahrt] = field(default_factory=list)
+
 # Zweck: im "Snapshot" sind Zeiten ISO Strings zB "2026-01-23T12:30:00",
 # brauche datetime Objekte zum Vergleichen
 def _parse_iso(dt_str: Optional[str]) -> Optional[datetime]:
@@ -79,59 +119,170 @@ def _parse_iso(dt_str: Optional[str]) -> Optional[datetime]:
 # baut aus dem JSON Snapshot eine Liste an "rides" (eine Fahrt)
 # inkl Liste an Halten "stops"
 def _build_rides(snap: Dict[str, Any]) -> List[Dict[str, Any]]:
-    rides = []
-
     # snap "items" = Liste an Fahrten, jede Fahrt = f
-    for f in (snap.get("items") or []):
-        stops = []
-        # jede Fahrt hat Haltepunkte, Halte als Liste
-        for s in (f.get("haltepunkte") or []):
-            name = (s.get("bahnhofName") or "").strip()
-            # plan Abfahrt und Ankunft sind ISO Strings - parsen
-            dep = _parse_iso(s.get("planAbfahrt") or s.get("planAnkunft"))
-            arr = _parse_iso(s.get("planAnkunft") or s.get("planAbfahrt"))
-            # tarif ist der Preis von einem "Segment" ab dem halt
-            tarif = float(s.get("tarif") or 0.0)
-            # Stops Elemente hinzufügen
-            stops.append(
-                {
-                    "name": name,
-                    "dep": dep,
-                    "arr": arr,
-                    "tarif": tarif,
-                }
-            )
-        # idx_map = Liste von Indizes pro Bahnhof-Name (Bahnhof kann öfter vorkommen)
-        # warum idx_map: damit Position von Bahnhof schnell gefunden werden kann
-        idx_map: Dict[str, List[int]] = {}
-        for i, st in enumerate(stops):
-            idx_map.setdefault(st["name"], []).append(i)
-
-# Fahrt in rides Liste anhängen
-        rides.append(
+    return [_build_ride(f) for f in (snap.get("items") or [])]
+
+
+def _build_rides_stream(objekte: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    wie _build_rides, aber für den gestreamten Snapshot (NDJSON):
+    jede Fahrt wird gebaut sobald sie ankommt, Objekte ohne fahrtdurchfuehrungId sind Meta (version, total ...)
+    """
+    rides = []
+    meta: Dict[str, Any] = {}
+    for obj in objekte:
+        if "fahrtdurchfuehrungId" in obj:
+            rides.append(_build_ride(obj))
+        else:
+            meta.update(obj)
+    return rides, meta
+
+
+def _build_ride(f: Dict[str, Any]) -> Dict[str, Any]:
+    stops = []
+    # jede Fahrt hat Haltepunkte, Halte als Liste
+    for s in (f.get("haltepunkte") or []):
+        name = (s.get("bahnhofName") or "").strip()
+        # plan Abfahrt und Ankunft sind ISO Strings - parsen
+        dep = _parse_iso(s.get("planAbfahrt") or s.get("planAnkunft"))
+        arr = _parse_iso(s.get("planAnkunft") or s.get("planAbfahrt"))
+        # tarif ist der Preis von einem "Segment" ab dem halt
+        tarif = float(s.get("tarif") or 0.0)
+        # Stops Elemente hinzufügen
+        stops.append(
             {
-                "id": int(f.get("fahrtdurchfuehrungId")),
-                "halteplan_id": int(f.get("halteplanId") or 0),
-                "zug_id": int(f.get("zugId") or 0),
-                "stops": stops,
-                "idx_map": idx_map,
+                "name": name,
+                "dep": dep,
+                "arr": arr,
+                "tarif": tarif,
             }
         )
-    return rides
+    # idx_map = Liste von Indizes pro Bahnhof-Name (Bahnhof kann öfter vorkommen)
+    # warum idx_map: damit Position von Bahnhof schnell gefunden werden kann
+    idx_map: Dict[str, List[int]] = {}
+    for i, st in enumerate(stops):
+        idx_map.setdefault(st["name"], []).append(i)
+
+    return {
+        "id": int(f.get("fahrtdurchfuehrungId")),
+        "halteplan_id": int(f.get("halteplanId") or 0),
+        "zug_id": int(f.get("zugId") or 0),
+        "stops": stops,
+        "idx_map": idx_map,
+    }
+
+
+# Abfahrts-Index: Bahnhof-Name -> sortierte Liste von (Abfahrt, ride-Position, Halt-Index)
+# ride-Position = Index in der rides Liste (gleiche Reihenfolge wie der Snapshot)
+AbfahrtsIndex = Dict[str, List[Tuple[datetime, int, int]]]
 
 
-def _preis_segment(stops: List[Dict[str, Any]], i_from: int, i_to: int) -> float:
+def _build_abfahrts_index(rides: List[Dict[str, Any]]) -> AbfahrtsIndex:
     """
-    Berechnet den Preis zwischen 2 Stop Indizes
+    Baut pro Bahnhof eine nach Abfahrtszeit sortierte Liste aller Abfahrten.
+    Halte ohne Abfahrt (bzw. ohne Namen) kommen nicht rein, die können
+    auch nicht als Umstieg genutzt werden.
+    """
+    index: AbfahrtsIndex = {}
+    for pos, r in enumerate(rides):
+        for i, st in enumerate(r["stops"]):
+            if st["name"] and st["dep"]:
+                index.setdefault(st["name"], []).append((st["dep"], pos, i))
+
+    for eintraege in index.values():
+        eintraege.sort()
+    return index
+
+
+def _abfahrten_im_fenster(
+    index: AbfahrtsIndex,
+    bahnhof: str,
+    von: datetime,
+    bis: datetime,
+) -> List[Tuple[datetime, int, int]]:
+    """
+    Alle Abfahrten am Bahnhof mit von <= Abfahrt <= bis (Binärsuche)
+    """
+    eintraege = index.get(bahnhof) or []
+    lo = bisect_left(eintraege, von, key=lambda e: e[0])
+    hi = bisect_right(eintraege, bis, key=lambda e: e[0])
+    return eintraege[lo:hi]
+
+
+def _tarif_kumuliert(stops: List[Dict[str, Any]]) -> List[float]:
+    """
+    Präfixsummen der Tarife: kum[k] = Summe tarif der Halte 1..k
+    "tarif" ist segmentweise ab dem nächsten Halt => Preis(i -> j) = kum[j] - kum[i]
+    (wird einmal pro Fahrplan-Laden gebaut, siehe fahrplan_cache.py)
+    """
+    kum = [0.0]
+    for st in stops[1:]:
+        kum.append(kum[-1] + float(st.get("tarif") or 0.0))
+    return kum
+
+
+def _preis_kum(kum: List[float], i_from: int, i_to: int) -> float:
+    """Preis zwischen 2 Stop Indizes - eine Subtraktion statt Summe über die Segmente"""
+    return round(kum[i_to] - kum[i_from], 2)
+
+
+def halt_indizes(
+    fahrt_id: int,
+    von_name: str,
+    nach_name: str,
+    abfahrt: Optional[datetime] = None,
+    fahrplan: Optional["FahrplanModell"] = None,
+) -> Optional[Tuple[int, int]]:
+    """
+    (i, j) = Index vom Einstiegs- und Ausstiegshalt in den stops der Fahrt fahrt_id
+    von = erster Halt mit dem Namen (mit abfahrt: der Halt mit genau dieser Abfahrt),
+    nach = erster Halt danach
+    None wenn die Fahrt nicht (mehr) im Fahrplan ist oder die Strecke so nicht fährt
+    """
+    from app.services.fahrplan_cache import get_fahrplan
 
-    "tarif" ist segmentweise ab dem nächsten Halt
+    if fahrplan is None:
+        fahrplan = get_fahrplan()
+    pos = fahrplan.ride_pos.get(int(fahrt_id))
+    if pos is None:
+        return None
+
+    r = fahrplan.rides[pos]
+    stops = r["stops"]
+    idx_von = r["idx_map"].get(von_name) or []
+    if abfahrt is not None:
+        idx_von = [i for i in idx_von if (stops[i]["dep"] or stops[i]["arr"]) == abfahrt]
+    if not idx_von:
+        return None
 
-    summieren von stops[from+1 .. to] 
+    i = min(idx_von)
+    j = next((j for j in sorted(r["idx_map"].get(nach_name) or []) if j > i), None)
+    if j is None:
+        return None
+    return i, j
+
+
+def preis_zwischen(
+    fahrt_id: int,
+    von_name: str,
+    nach_name: str,
+    abfahrt: Optional[datetime] = None,
+    fahrplan: Optional["FahrplanModell"] = None,
+) -> Optional[float]:
+    """
+    Tarif der Fahrt fahrt_id von -> nach, so wie ihn die Suche berechnet (Halte wie halt_indizes)
+    None wenn die Fahrt nicht (mehr) im Fahrplan ist oder die Strecke so nicht fährt
+    (zB. zum Nachprüfen vom gebuchten Preis, ohne nochmal zu suchen)
     """
-    p = 0.0
-    for i in range(i_from + 1, i_to + 1):
-        p += float(stops[i].get("tarif") or 0.0)
-    return round(p, 2)
+    from app.services.fahrplan_cache import get_fahrplan
+
+    if fahrplan is None:
+        fahrplan = get_fahrplan()
+    ij = halt_indizes(fahrt_id, von_name, nach_name, abfahrt, fahrplan)
+    if ij is None:
+        return None
+    return _preis_kum(fahrplan.tarif_kum[fahrplan.ride_pos[int(fahrt_id)]], *ij)
+
 
 # HAUPTFUNKTION - sucht Verbindungen
 # Eingaben Start/ Ziel Bahnhofsnamen exakt aus dem Dropdown
@@ -142,99 +293,133 @@ def suche_verbindungen(
     datum: date,
     ab_zeit: Optional[time] = None,
     snapshot: Optional[Dict[str, Any]] = None,     # für Test: bereits übergebenen Snapshot nutzen
+    modus: str = "standard",                       # "standard" oder "csa"
+    max_umstiege: int = 1,                         # nur für modus="csa"
+    fahrplan: Optional["FahrplanModell"] = None,   # bereits geladenes Modell (sonst Cache)
 ) -> List[VerbindungHit]:
 
-# SNAPSHOT HOLEN (von extern Fahrplan...) bzw den gegebenen hernehmen
-    snap = snapshot if snapshot is not None else fahrplan_snapshot()
+    # import hier, weil fahrplan_cache / verbindungen_csa selbst aus diesem Modul importieren
+    from app.services.fahrplan_cache import build_fahrplan_modell, get_fahrplan
 
-    # den Snapshot in die oben definierte interne Struktur umwandlen
-    rides = _build_rides(snap)
+    if modus not in SUCHMODI:
+        raise ValueError(f"Unbekannter Suchmodus: {modus}")
 
-    hits: List[VerbindungHit] = []
+# FAHRPLAN HOLEN: übergebener Snapshot (Test) bzw. Modell aus dem prozessweiten Cache
+    if fahrplan is None:
+        fahrplan = build_fahrplan_modell(snapshot) if snapshot is not None else get_fahrplan()
 
-    # ----------------------------
-    # 1) Direktfahrten
-    # ----------------------------
-    for r in rides:
-        stops = r["stops"]
-
-        # alle Indizes wo Start/Ziel vorkommen
-        idx_starts = r["idx_map"].get(start_name) or []
-        idx_ziels = r["idx_map"].get(ziel_name) or []
-
-        # wenn start/ziel gar nicht vorkommen KEINE Direktverbindung
-        if not idx_starts or not idx_ziels:
-            continue
-
-        # Nimm frühesten Start; Ziel muss danach liegen -> nimm erstes Ziel > Start
-        idx_start = min(idx_starts)
-        # Ziel muss nach Start liegen, erstes Ziel j > idx_start
-        idx_ziel = next((j for j in sorted(idx_ziels) if j > idx_start), None)
-        if idx_ziel is None:
-            continue
-
-        # Abfahrt / Ankunft Zeiten aus stops ziehen
-        dt_ab = stops[idx_start]["dep"] or stops[idx_start]["arr"]
-        dt_an = stops[idx_ziel]["arr"] or stops[idx_ziel]["dep"]
-        if not dt_ab or not dt_an:
-            continue
-
-        # Datum muss passen
-        if dt_ab.date() != datum:
-            continue
-
-        # Ab-Zeit prüfen optional
-        if ab_zeit and dt_ab.time() < ab_zeit:
-            continue
-
-        # Preis für Segment berechnen
-        preis = _preis_segment(stops, idx_start, idx_ziel)
-
-        # ergebnis speichern
-        hits.append(
-            VerbindungHit(
-                fahrtdurchfuehrung_id=r["id"],
-                halteplan_id=r["halteplan_id"],
-                zug_id=r["zug_id"],
-                start_name=start_name,
-                ziel_name=ziel_name,
-                abfahrt=dt_ab,
-                ankunft=dt_an,
-                preis=preis,
-                umstiege=0,
-            )
+    # Erreichbarkeits-Tabelle: gibt es sicher nichts, gar nicht erst suchen
+    if fahrplan.erreichbar is not None and not fahrplan.erreichbar.moeglich(
+        start_name, ziel_name, datum, max_umstiege if modus == "csa" else 1
+    ):
+        return []
+
+    if modus == "csa":
+        from app.services.verbindungen_csa import suche_verbindungen_csa
+        return suche_verbindungen_csa(
+            start_name, ziel_name, datum, ab_zeit=ab_zeit, max_umstiege=max_umstiege, fahrplan=fahrplan
         )
 
-    # ----------------------------
-    # 2) 1 Umstieg 
-    # ----------------------------
+    hits = [h for gruppe in _standard_gruppen(fahrplan, start_name, ziel_name, datum, ab_zeit) for h in gruppe]
+
+    # Sortierung: zuerst früh dann direkt vor umstieg dann Ankunft (Rest siehe sortier_schluessel)
+    hits.sort(key=sortier_schluessel)
+    return hits
+
+
+def _standard_gruppen(
+    fahrplan: "FahrplanModell",
+    start_name: str,
+    ziel_name: str,
+    datum: date,
+    ab_zeit: Optional[time],
+) -> Iterator[List[VerbindungHit]]:
+    """
+    Standardsuche (Direkt + 1 Umstieg), Treffer gruppiert nach Abfahrt am Start, aufsteigend
+    (alle Treffer einer Gruppe haben dieselbe Abfahrt, spätere Gruppen eine spätere)
+    -> wer nur die nächsten N Verbindungen braucht, hört einfach auf weiterzulesen
+    """
+    # rides + Abfahrts-Index sind im Modell schon fertig gebaut
+    rides = fahrplan.rides
+    abfahrts_index = fahrplan.abfahrts_index
+    # Start/Ziel/Datum/Ab-Zeit filtern vektorisiert über den spaltenweisen Fahrplan
+    sp = fahrplan.spalten if fahrplan.spalten is not None else build_spalten(rides)
+    # kumulierte Tarife pro ride: Preis = kum[j] - kum[i]
+    tarif_kum = fahrplan.tarif_kum
+
+    # Umstiegsbahnhöfe, von denen das Ziel überhaupt direkt erreichbar ist (sonst alle)
+    erreichbar = fahrplan.erreichbar
+    if erreichbar is not None:
+        if not erreichbar.moeglich(start_name, ziel_name, datum, 1):
+            return
+        umstieg_ok = erreichbar.umstieg_zum_ziel(ziel_name, datum).tolist()
+        bahnhof_nr = sp.bahnhof_nr
+    else:
+        umstieg_ok = None
+
+    # nur rides die den Start (frühester Halt) am Datum ab ab_zeit verlassen, nach Abfahrt sortiert
+    start_halte = fahrten_ab_start(sp, start_name, datum, ab_zeit)
+    start_halte = start_halte[np.lexsort((start_halte, sp.ab[start_halte]))]
+    # Direktfahrten: die davon, die danach das Ziel anfahren (erstes Ziel > Start)
+    direkt_start, direkt_ziel = fahrten_a_vor_b(sp, start_name, ziel_name, datum, ab_zeit)
+    direkt = dict(zip(direkt_start.tolist(), direkt_ziel.tolist()))
+
     min_buf = timedelta(minutes=MIN_UMSTIEG_MIN)
     max_buf = timedelta(minutes=MAX_UMSTIEG_MIN)
 
     # duplikate vermeiden 
     seen_keys: set[Tuple[int, int, str, datetime]] = set()
 
-    # Erste Fahrt 
-    for r1 in rides:
-        s1 = r1["stops"]
+    gruppe: List[VerbindungHit] = []
+    gruppe_ab = None
+    for g_start, ab in zip(start_halte.tolist(), sp.ab[start_halte].tolist()):
+        if ab != gruppe_ab:
+            if gruppe:
+                yield gruppe
+            gruppe, gruppe_ab = [], ab
 
-        # start muss in r1 vorkommen
-        idx_start_list = r1["idx_map"].get(start_name) or []
-        if not idx_start_list:            continue
+        pos1 = int(sp.halt_ride[g_start])
+        r1 = rides[pos1]
+        s1 = r1["stops"]
+        kum1 = tarif_kum[pos1]
 
-        idx_start_1 = min(idx_start_list)
-        
-        # Abfahrt von erster Fahrt
+        # frühester Start-Halt in r1 + Abfahrt von erster Fahrt
+        idx_start_1 = int(sp.halt_idx[g_start])
         dt_start = s1[idx_start_1]["dep"] or s1[idx_start_1]["arr"]
-        if not dt_start:
-            continue
 
-        # Datum bzw ab zeit prüfen
-        if dt_start.date() != datum:
-            continue
-        if ab_zeit and dt_start.time() < ab_zeit:
-            continue
+        # ----------------------------
+        # 1) Direktfahrt
+        # ----------------------------
+        g_ziel = direkt.get(g_start)
+        if g_ziel is not None:
+            idx_ziel = int(sp.halt_idx[g_ziel])
+            # Ankunft aus stops ziehen
+            dt_an = s1[idx_ziel]["arr"] or s1[idx_ziel]["dep"]
+
+            # Preis für Segment berechnen (Präfixsummen aus dem Modell)
+            preis = _preis_kum(kum1, idx_start_1, idx_ziel)
+
+            gruppe.append(
+                VerbindungHit(
+                    fahrtdurchfuehrung_id=r1["id"],
+                    halteplan_id=r1["halteplan_id"],
+                    zug_id=r1["zug_id"],
+                    start_name=start_name,
+                    ziel_name=ziel_name,
+                    abfahrt=dt_start,
+                    ankunft=dt_an,
+                    preis=preis,
+                    umstiege=0,
+                    teilfahrten=[
+                        Teilfahrt(r1["id"], r1["halteplan_id"], r1["zug_id"], start_name, ziel_name,
+                                  dt_start, dt_an, preis, idx_start_1, idx_ziel),
+                    ],
+                )
+            )
 
+        # ----------------------------
+        # 2) 1 Umstieg 
+        # ----------------------------
         # potenzielle Umstiegsbahnhöfe = jeder Halt NACH dem Start in r1
         for idx_t1 in range(idx_start_1 + 1, len(s1)):
             t_name = s1[idx_t1]["name"]
@@ -242,86 +427,186 @@ def suche_verbindungen(
             arr_t1 = s1[idx_t1]["arr"] or s1[idx_t1]["dep"]
             if not t_name or not arr_t1:
                 continue
+            if umstieg_ok is not None and not umstieg_ok[bahnhof_nr[t_name]]:
+                continue
 
             # Preis 1. Leg Start -> Umstieg
-            preis1 = _preis_segment(s1, idx_start_1, idx_t1)
+            preis1 = _preis_kum(kum1, idx_start_1, idx_t1)
+
+            # suche 2. Fahrt: nur Abfahrten am Umstieg im Fenster [MIN, MAX] (Index)
+            # Reihenfolge wie früher: rides-Reihenfolge, dann Halt-Index
+            fenster = _abfahrten_im_fenster(abfahrts_index, t_name, arr_t1 + min_buf, arr_t1 + max_buf)
+            for _dep, pos2, idx_t2 in sorted(fenster, key=lambda e: (e[1], e[2])):
+                r2 = rides[pos2]
 
-            # suche 2. Fahrt, die an t_norm startet (bzw. dort einsteigt) und später Ziel enthält
-            for r2 in rides:
                 # gleiche Fahrt überspringen
                 if r2["id"] == r1["id"]:
                     continue
 
                 s2 = r2["stops"]
 
-                # Umstieg muss in r2 vorkommen
-                idx_ts2 = r2["idx_map"].get(t_name) or []
-                if not idx_ts2:
-                    continue
-
                 # Ziel muss in r2 vorkommen
                 idx_z2 = r2["idx_map"].get(ziel_name) or []
                 if not idx_z2:
                     continue
 
-                # nimm erstes Transfer-Index in r2 und erstes Ziel danach
-                # (falls Bahnhof mehrfach vorkommt, probieren aller t-indizes)
-                # Für jeden möglichen Umstieg-Index in r2 prüfen
-                for idx_t2 in idx_ts2:
-                    # ziel muss NACH umstieg liegen
-                    idx_ziel_2 = next((j for j in sorted(idx_z2) if j > idx_t2), None)
-                    if idx_ziel_2 is None:
-                        continue
-                    # Abfahrt 2. fahrt am Umstieg
-                    dep_t2 = s2[idx_t2]["dep"]  # beim Umstieg - Abfahrt
-                    if not dep_t2:
-                        continue
-
-
-                    # Umstiegszeit prüfen mit oben eingegebenen Werten
-                    wait = dep_t2 - arr_t1
-                    if wait < min_buf:
-                        continue
-                    if wait > max_buf:
-                        continue
-                    # Ankunft am finalen ziel
-                    dt_arr_final = s2[idx_ziel_2]["arr"] or s2[idx_ziel_2]["dep"]
-                    if not dt_arr_final:
-                        continue
-
-                    # Preis für 2. Segment (umstieg->ziel)
-                    preis2 = _preis_segment(s2, idx_t2, idx_ziel_2)
-                    
-                    # Gesamtpreis
-                    total = round(preis1 + preis2, 2)
-
-                    # Duplikate vermeiden
-                    key = (r1["id"], r2["id"], t_name, dt_start)
-                    if key in seen_keys:
-                        continue
-                    seen_keys.add(key)
-
-                    # Treffer "Hit" speichern
-                    hits.append(
-                        VerbindungHit(
-                            fahrtdurchfuehrung_id=r1["id"],
-                            halteplan_id=r1["halteplan_id"],
-                            zug_id=r1["zug_id"],
-                            start_name=start_name,
-                            ziel_name=ziel_name,
-                            abfahrt=dt_start,
-                            ankunft=dt_arr_final,
-                            preis=total,
-                            umstiege=1,
-                            umstieg_bahnhof=t_name,
-                            umstieg_ankunft=arr_t1,
-                            umstieg_abfahrt=dep_t2,
-                            fahrtdurchfuehrung_id2=r2["id"],
-                            halteplan_id2=r2["halteplan_id"],
-                            zug_id2=r2["zug_id"],
-                        )
+                # ziel muss NACH umstieg liegen
+                idx_ziel_2 = next((j for j in sorted(idx_z2) if j > idx_t2), None)
+                if idx_ziel_2 is None:
+                    continue
+
+                # Abfahrt 2. fahrt am Umstieg (Umstiegszeit passt schon durch das Fenster)
+                dep_t2 = s2[idx_t2]["dep"]
+
+                # Ankunft am finalen ziel
+                dt_arr_final = s2[idx_ziel_2]["arr"] or s2[idx_ziel_2]["dep"]
+                if not dt_arr_final:
+                    continue
+
+                # Preis für 2. Segment (umstieg->ziel)
+                preis2 = _preis_kum(tarif_kum[pos2], idx_t2, idx_ziel_2)
+                
+                # Gesamtpreis
+                total = round(preis1 + preis2, 2)
+
+                # Duplikate vermeiden
+                key = (r1["id"], r2["id"], t_name, dt_start)
+                if key in seen_keys:
+                    continue
+                seen_keys.add(key)
+
+                # Treffer "Hit" speichern
+                gruppe.append(
+                    VerbindungHit(
+                        fahrtdurchfuehrung_id=r1["id"],
+                        halteplan_id=r1["halteplan_id"],
+                        zug_id=r1["zug_id"],
+                        start_name=start_name,
+                        ziel_name=ziel_name,
+                        abfahrt=dt_start,
+                        ankunft=dt_arr_final,
+                        preis=total,
+                        umstiege=1,
+                        umstieg_bahnhof=t_name,
+                        umstieg_ankunft=arr_t1,
+                        umstieg_abfahrt=dep_t2,
+                        fahrtdurchfuehrung_id2=r2["id"],
+                        halteplan_id2=r2["halteplan_id"],
+                        zug_id2=r2["zug_id"],
+                        teilfahrten=[
+                            Teilfahrt(r1["id"], r1["halteplan_id"], r1["zug_id"], start_name, t_name,
+                                      dt_start, arr_t1, preis1, idx_start_1, idx_t1),
+                            Teilfahrt(r2["id"], r2["halteplan_id"], r2["zug_id"], t_name, ziel_name,
+                                      dep_t2, dt_arr_final, preis2, idx_t2, idx_ziel_2),
+                        ],
                     )
+                )
 
-    # Sortierung: zuerst früh dann direkt vor umstieg dann Ankunft
-    hits.sort(key=lambda x: (x.abfahrt, x.umstiege, x.ankunft))
-    return hits
+    if gruppe:
+        yield gruppe
+
+
+# ----------------------------
+# Seitenweise Suche ("nächste N Verbindungen nach X")
+# ----------------------------
+
+MAX_SEITE = 50
+
+
+# eine Seite Suchergebnisse + Cursor für die nächste Seite (None = keine weiteren)
+@dataclass
+class VerbindungsSeite:
+    hits: List[VerbindungHit]
+    next_cursor: Optional[str] = None
+
+
+def sortier_schluessel(h: VerbindungHit) -> Tuple:
+    """
+    Abfahrt, Umstiege, Ankunft - bei Gleichstand nach Fahrt-Ids / Halt-Indizes der Teilfahrten,
+    damit die Reihenfolge eindeutig ist und ein Cursor genau eine Stelle bezeichnet
+    """
+    return (
+        h.abfahrt,
+        h.umstiege,
+        h.ankunft,
+        tuple((t.fahrtdurchfuehrung_id, t.von_idx, t.nach_idx) for t in h.teilfahrten),
+    )
+
+
+def encode_cursor(h: VerbindungHit) -> str:
+    abfahrt, umstiege, ankunft, legs = sortier_schluessel(h)
+    roh = json.dumps([abfahrt.isoformat(), umstiege, ankunft.isoformat(), legs], separators=(",", ":"))
+    return base64.urlsafe_b64encode(roh.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    """ValueError bei kaputtem Cursor"""
+    try:
+        roh = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        abfahrt, umstiege, ankunft, legs = json.loads(roh)
+        return (
+            datetime.fromisoformat(abfahrt),
+            int(umstiege),
+            datetime.fromisoformat(ankunft),
+            tuple((int(f), int(i), int(j)) for f, i, j in legs),
+        )
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise ValueError(f"Ungültiger Cursor: {cursor!r}") from e
+
+
+def suche_verbindungen_seite(
+    start_name: str,
+    ziel_name: str,
+    datum: date,
+    ab_zeit: Optional[time] = None,
+    limit: int = 10,
+    cursor: Optional[str] = None,                  # next_cursor der vorigen Seite
+    snapshot: Optional[Dict[str, Any]] = None,
+    modus: str = "standard",
+    max_umstiege: int = 1,
+    fahrplan: Optional["FahrplanModell"] = None,
+) -> VerbindungsSeite:
+    """
+    die nächsten limit Verbindungen (Reihenfolge wie suche_verbindungen) nach dem Cursor
+
+    Standard-Modus: rides werden nach Abfahrt am Start abgearbeitet und es wird aufgehört,
+    sobald limit Treffer da sind und die nächste Abfahrt später ist - für "die nächsten
+    paar Züge" wird also nicht der ganze Tag durchsucht.
+    Mit Cursor wird erst ab dessen Abfahrt gesucht.
+    CSA sucht immer den ganzen Tag (Pareto-Labels brauchen alles), dort wird nur geschnitten.
+    """
+    from app.services.fahrplan_cache import build_fahrplan_modell, get_fahrplan
+
+    if modus not in SUCHMODI:
+        raise ValueError(f"Unbekannter Suchmodus: {modus}")
+    limit = max(1, min(int(limit), MAX_SEITE))
+    nach = decode_cursor(cursor) if cursor else None
+
+    if fahrplan is None:
+        fahrplan = build_fahrplan_modell(snapshot) if snapshot is not None else get_fahrplan()
+
+    if modus == "csa":
+        alle = suche_verbindungen(start_name, ziel_name, datum, ab_zeit=ab_zeit, modus=modus,
+                                  max_umstiege=max_umstiege, fahrplan=fahrplan)
+        hits = [h for h in alle if nach is None or sortier_schluessel(h) > nach]
+        seite = hits[:limit]
+        return VerbindungsSeite(seite, encode_cursor(seite[-1]) if len(hits) > limit else None)
+
+    # alles vor der Cursor-Abfahrt kann gar nicht mehr kommen
+    if nach is not None and nach[0].date() == datum:
+        cursor_zeit = nach[0].time()
+        ab_zeit = max(ab_zeit, cursor_zeit) if ab_zeit else cursor_zeit
+
+    hits: List[VerbindungHit] = []
+    mehr = False
+    for gruppe in _standard_gruppen(fahrplan, start_name, ziel_name, datum, ab_zeit):
+        if len(hits) >= limit:
+            # diese Gruppe liegt komplett hinter der Seite
+            mehr = True
+            break
+        hits.extend(h for h in gruppe if nach is None or sortier_schluessel(h) > nach)
+
+    hits.sort(key=sortier_schluessel)
+    if len(hits) > limit:
+        hits, mehr = hits[:limit], True
+    return VerbindungsSeite(hits, encode_cursor(hits[-1]) if mehr else None)
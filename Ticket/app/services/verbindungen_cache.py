@@ -0,0 +1,173 @@
+"""
+Ergebnis-Cache für die JSON-Verbindungssuche (/api/verbindungen)
+
+Schlüssel: (start, ziel, datum, ab-Bucket, Modus, Fahrplan-Version)
+    ab wird auf VERBINDUNGEN_CACHE_BUCKET_MIN abgerundet (08:07 -> 08:00 bei 15 Minuten),
+    gespeichert werden die ersten TIEFE Verbindungen ab Bucket-Anfang.
+    Eine Anfrage (ab, limit, cursor) wird daraus beantwortet, wenn nach dem Filtern
+    (Abfahrt >= ab, nach dem Cursor) genug übrig ist oder der Eintrag den Tag komplett hat -
+    sonst normal suchen (ohne Cache).
+
+Gültigkeit: LRU mit Maximalgröße + TTL. Neue Fahrplan-Version -> anderer Schlüssel;
+sobald ein anderes Fahrplan-Modell kommt, wird der ganze Cache geleert (alte Einträge
+würden nie mehr getroffen, nur Speicher belegen).
+Aktions-Preise hängen nicht am Fahrplan und werden deshalb erst beim Ausliefern gerechnet.
+"""
+
+from __future__ import annotations
+
+import threading
+import time as time_mod
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from flask import current_app
+
+from app.services.verbindungen import (
+    MAX_SEITE,
+    VerbindungHit,
+    VerbindungsSeite,
+    decode_cursor,
+    encode_cursor,
+    sortier_schluessel,
+    suche_verbindungen_seite,
+)
+
+if TYPE_CHECKING:
+    from app.services.fahrplan_cache import FahrplanModell
+
+# so viele Verbindungen ab Bucket-Anfang werden gespeichert
+TIEFE = 2 * MAX_SEITE
+
+DEFAULT_GROESSE = 512
+DEFAULT_TTL_SEK = 300.0
+DEFAULT_BUCKET_MIN = 15
+
+
+@dataclass(frozen=True)
+class _Eintrag:
+    hits: Tuple[VerbindungHit, ...]
+    komplett: bool               # True = es gibt ab Bucket-Anfang keine weiteren Verbindungen
+    erstellt_mono: float
+
+
+def _bucket(ab_zeit: Optional[time], bucket_min: int) -> Optional[time]:
+    if ab_zeit is None:
+        return None
+    minuten = (ab_zeit.hour * 60 + ab_zeit.minute) // bucket_min * bucket_min
+    return time(minuten // 60, minuten % 60)
+
+
+class VerbindungenCache:
+    def __init__(self, groesse: int = DEFAULT_GROESSE, ttl_sek: float = DEFAULT_TTL_SEK):
+        self.groesse = groesse
+        self.ttl_sek = ttl_sek
+        self._lock = threading.Lock()
+        self._eintraege: "OrderedDict[Tuple, _Eintrag]" = OrderedDict()
+        self._modell: Optional["FahrplanModell"] = None    # Modell, zu dem die Einträge gehören
+        self.stats = {"hits": 0, "misses": 0, "durchgereicht": 0, "geleert": 0}
+
+    def _get(self, key: Tuple) -> Optional[_Eintrag]:
+        with self._lock:
+            e = self._eintraege.get(key)
+            if e is None:
+                return None
+            if time_mod.monotonic() - e.erstellt_mono > self.ttl_sek:
+                del self._eintraege[key]
+                return None
+            self._eintraege.move_to_end(key)
+            return e
+
+    def _put(self, key: Tuple, e: _Eintrag) -> None:
+        with self._lock:
+            self._eintraege[key] = e
+            self._eintraege.move_to_end(key)
+            while len(self._eintraege) > self.groesse:
+                self._eintraege.popitem(last=False)
+
+    def _modell_pruefen(self, fahrplan: "FahrplanModell") -> None:
+        with self._lock:
+            if self._modell is not fahrplan:
+                if self._eintraege:
+                    self.stats["geleert"] += 1
+                self._eintraege.clear()
+                self._modell = fahrplan
+
+    def seite(
+        self,
+        fahrplan: "FahrplanModell",
+        start_name: str,
+        ziel_name: str,
+        datum: date,
+        ab_zeit: Optional[time],
+        limit: int,
+        cursor: Optional[str],
+        modus: str,
+        bucket_min: int = DEFAULT_BUCKET_MIN,
+    ) -> VerbindungsSeite:
+        """wie suche_verbindungen_seite, aber wenn möglich aus dem Cache"""
+        limit = max(1, min(int(limit), MAX_SEITE))
+        nach = decode_cursor(cursor) if cursor else None   # ValueError wie bei der Suche
+
+        self._modell_pruefen(fahrplan)
+        bucket = _bucket(ab_zeit, bucket_min)
+        key = (start_name, ziel_name, datum, bucket, modus, fahrplan.version)
+
+        e = self._get(key)
+        if e is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            voll = suche_verbindungen_seite(start_name, ziel_name, datum, ab_zeit=bucket, limit=TIEFE,
+                                            modus=modus, max_umstiege=1, fahrplan=fahrplan)
+            e = _Eintrag(tuple(voll.hits), voll.next_cursor is None, time_mod.monotonic())
+            self._put(key, e)
+        else:
+            with self._lock:
+                self.stats["hits"] += 1
+
+        ab_dt = datetime.combine(datum, ab_zeit) if ab_zeit else None
+        rest: List[VerbindungHit] = [
+            h for h in e.hits
+            if (ab_dt is None or h.abfahrt >= ab_dt) and (nach is None or sortier_schluessel(h) > nach)
+        ]
+        if len(rest) > limit:
+            return VerbindungsSeite(rest[:limit], encode_cursor(rest[limit - 1]))
+        if e.komplett:
+            return VerbindungsSeite(rest, None)
+
+        # Cache reicht nicht so weit (z. B. tief hineingeblättert) -> normal suchen
+        with self._lock:
+            self.stats["durchgereicht"] += 1
+        return suche_verbindungen_seite(start_name, ziel_name, datum, ab_zeit=ab_zeit, limit=limit,
+                                        cursor=cursor, modus=modus, max_umstiege=1, fahrplan=fahrplan)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._eintraege.clear()
+            self._modell = None
+
+    def stats_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "eintraege": len(self._eintraege)}
+
+
+_cache: Optional[VerbindungenCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_verbindungen_cache() -> VerbindungenCache:
+    global _cache
+    cfg = current_app.config
+    with _cache_lock:
+        if _cache is None:
+            _cache = VerbindungenCache(
+                groesse=int(cfg.get("VERBINDUNGEN_CACHE_GROESSE", DEFAULT_GROESSE)),
+                ttl_sek=float(cfg.get("VERBINDUNGEN_CACHE_TTL_SEK", DEFAULT_TTL_SEK)),
+            )
+        return _cache
+
+
+def verbindungen_cache_stats() -> Dict[str, Any]:
+    return _cache.stats_dict() if _cache is not None else {}
@@ -0,0 +1,234 @@
+"""
+Verbindungssuche mit dem Connection Scan Algorithmus (CSA)
+
+Statt Fahrten ineinander zu verschachteln wird der Fahrplan in "Elementarverbindungen"
+zerlegt (ein Stück Fahrt von Halt i nach Halt i+1) und diese nach Abfahrt sortiert
+genau einmal durchlaufen.
+
+ Ablauf grob:
+    - rides + connections kommen fertig aus dem Fahrplan-Modell (fahrplan_cache.py)
+    - connections ab Datum/Ab-Zeit der Reihe nach durchgehen:
+        Einsteigen: am Start, oder an einem Bahnhof wo man vorher angekommen ist
+                    (Umstiegszeit zwischen MIN und MAX, max_umstiege nicht überschritten)
+        Fahren: alle "im Zug" Labels erzeugen Ankunfts-Labels am nächsten Halt
+    - Labels = (Abfahrt am Start, Ankunft, Umstiege, Preis) + Teilfahrten
+      es werden nur Pareto-optimale Labels gehalten:
+        spätere Abfahrt, frühere Ankunft, weniger Umstiege, günstiger
+
+ An Umstiegsbahnhöfen darf ein Label ein anderes nur bei GLEICHER Ankunft verdrängen,
+ weil wegen MAX_UMSTIEG_MIN eine frühere Ankunft nicht automatisch besser ist.
+
+ Ergebnis: VerbindungHit Liste (Teilfahrten in hit.teilfahrten,
+ die 1./2. Teilfahrt zusätzlich in den alten Feldern), sortiert wie suche_verbindungen
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from app.services.verbindungen import (
+    MAX_UMSTIEG_MIN,
+    MIN_UMSTIEG_MIN,
+    Teilfahrt,
+    VerbindungHit,
+    _preis_kum,
+    sortier_schluessel,
+)
+
+if TYPE_CHECKING:
+    from app.services.fahrplan_cache import FahrplanModell
+
+
+# Elementarverbindung: (Abfahrt, Ankunft, ride-Position, Halt-Index von)
+Connection = Tuple[datetime, datetime, int, int]
+
+
+# Label an einem Bahnhof (angekommen)
+@dataclass(frozen=True)
+class _Label:
+    abfahrt: datetime        # Abfahrt am Start der ganzen Verbindung
+    ankunft: datetime        # Ankunft an diesem Bahnhof
+    umstiege: int
+    preis: float
+    teilfahrten: Tuple[Teilfahrt, ...]
+
+
+# Label "sitzt im Zug" (pro ride)
+@dataclass(frozen=True)
+class _ImZug:
+    abfahrt: datetime
+    umstiege: int
+    preis_vorher: float      # Preis der bisherigen Teilfahrten
+    einstieg_idx: int
+    einstieg_zeit: datetime
+    teilfahrten: Tuple[Teilfahrt, ...]
+
+
+def _build_connections(rides: List[Dict[str, Any]]) -> List[Connection]:
+    """
+    zerlegt alle rides in Elementarverbindungen, sortiert nach Abfahrt
+    (bei Gleichstand nach ride + Halt-Index, damit die Reihenfolge in einer Fahrt stimmt)
+    """
+    conns: List[Connection] = []
+    for pos, r in enumerate(rides):
+        stops = r["stops"]
+        for i in range(len(stops) - 1):
+            dep = stops[i]["dep"]
+            arr = stops[i + 1]["arr"] or stops[i + 1]["dep"]
+            if not dep or not arr or not stops[i]["name"] or not stops[i + 1]["name"]:
+                continue
+            conns.append((dep, arr, pos, i))
+    conns.sort()
+    return conns
+
+
+def _dominiert_imzug(a: _ImZug, b: _ImZug, kum: List[float]) -> bool:
+    return (
+        a.abfahrt >= b.abfahrt
+        and a.umstiege <= b.umstiege
+        and a.preis_vorher - kum[a.einstieg_idx] <= b.preis_vorher - kum[b.einstieg_idx] + 1e-9
+    )
+
+
+def _dominiert(a: _Label, b: _Label, gleiche_ankunft: bool) -> bool:
+    if gleiche_ankunft and a.ankunft != b.ankunft:
+        return False
+    return (
+        a.abfahrt >= b.abfahrt
+        and a.ankunft <= b.ankunft
+        and a.umstiege <= b.umstiege
+        and a.preis <= b.preis + 1e-9
+    )
+
+
+def _pareto_einfuegen(bag: list, neu, dominiert) -> bool:
+    """fügt neu in bag ein, falls nicht dominiert; entfernt dabei dominierte Einträge"""
+    for alt in bag:
+        if dominiert(alt, neu):
+            return False
+    bag[:] = [alt for alt in bag if not dominiert(neu, alt)]
+    bag.append(neu)
+    return True
+
+
+def _hit_aus_label(start_name: str, ziel_name: str, lab: _Label) -> VerbindungHit:
+    legs = list(lab.teilfahrten)
+    erste = legs[0]
+    zweite = legs[1] if len(legs) > 1 else None
+    return VerbindungHit(
+        fahrtdurchfuehrung_id=erste.fahrtdurchfuehrung_id,
+        halteplan_id=erste.halteplan_id,
+        zug_id=erste.zug_id,
+        start_name=start_name,
+        ziel_name=ziel_name,
+        abfahrt=lab.abfahrt,
+        ankunft=lab.ankunft,
+        preis=round(lab.preis, 2),
+        umstiege=lab.umstiege,
+        umstieg_bahnhof=zweite.von_name if zweite else None,
+        umstieg_ankunft=erste.ankunft if zweite else None,
+        umstieg_abfahrt=zweite.abfahrt if zweite else None,
+        fahrtdurchfuehrung_id2=zweite.fahrtdurchfuehrung_id if zweite else None,
+        halteplan_id2=zweite.halteplan_id if zweite else None,
+        zug_id2=zweite.zug_id if zweite else None,
+        teilfahrten=legs,
+    )
+
+
+def suche_verbindungen_csa(
+    start_name: str,
+    ziel_name: str,
+    datum: date,
+    ab_zeit: Optional[time] = None,
+    snapshot: Optional[Dict[str, Any]] = None,
+    max_umstiege: int = 2,
+    fahrplan: Optional["FahrplanModell"] = None,
+) -> List[VerbindungHit]:
+
+    from app.services.fahrplan_cache import build_fahrplan_modell, get_fahrplan
+
+    if max_umstiege < 0:
+        raise ValueError("max_umstiege muss >= 0 sein.")
+    if start_name == ziel_name:
+        return []
+
+    if fahrplan is None:
+        fahrplan = build_fahrplan_modell(snapshot) if snapshot is not None else get_fahrplan()
+    rides = fahrplan.rides
+    conns = fahrplan.connections
+    kum = fahrplan.tarif_kum
+
+    min_buf = timedelta(minutes=MIN_UMSTIEG_MIN)
+    max_buf = timedelta(minutes=MAX_UMSTIEG_MIN)
+
+    # letzte Abfahrt pro ride: solange man in einem ride sitzt muss weitergescannt werden
+    ride_ende: Dict[int, datetime] = {}
+    for dep, _arr, pos, _i in conns:
+        ride_ende[pos] = dep
+
+    start_dt = datetime.combine(datum, ab_zeit or time.min)
+    horizont = datetime.combine(datum, time.max)
+
+    bags: Dict[str, List[_Label]] = {}          # Bahnhof -> Ankunfts-Labels
+    im_zug: Dict[int, List[_ImZug]] = {}        # ride-Position -> Labels im Zug
+    ergebnis: List[_Label] = []
+
+    for dep, arr, pos, i in conns[bisect_left(conns, (start_dt,)):]:
+        if dep > horizont:
+            break
+
+        r = rides[pos]
+        stops = r["stops"]
+        von = stops[i]["name"]
+        nach = stops[i + 1]["name"]
+        k = kum[pos]
+
+        # 1) Einsteigen
+        neue: List[_ImZug] = []
+        if von == start_name and dep.date() == datum:
+            neue.append(_ImZug(dep, 0, 0.0, i, dep, ()))
+
+        bag = bags.get(von)
+        if bag:
+            # Labels deren Umstiegsfenster schon vorbei ist werden nie mehr gebraucht
+            bag[:] = [lab for lab in bag if lab.ankunft + max_buf >= dep]
+            for lab in bag:
+                if lab.umstiege >= max_umstiege:
+                    continue
+                if dep - lab.ankunft < min_buf:
+                    continue
+                if any(t.fahrtdurchfuehrung_id == r["id"] for t in lab.teilfahrten):
+                    continue
+                neue.append(_ImZug(lab.abfahrt, lab.umstiege + 1, lab.preis, i, dep, lab.teilfahrten))
+
+        if neue:
+            labels = im_zug.setdefault(pos, [])
+            for n in neue:
+                _pareto_einfuegen(labels, n, lambda a, b: _dominiert_imzug(a, b, k))
+            horizont = max(horizont, ride_ende[pos])
+
+        # 2) Fahren: Ankunft am nächsten Halt
+        labels = im_zug.get(pos)
+        if not labels or nach == start_name:
+            continue
+
+        for t in labels:
+            preis_leg = _preis_kum(k, t.einstieg_idx, i + 1)
+            leg = Teilfahrt(
+                r["id"], r["halteplan_id"], r["zug_id"], stops[t.einstieg_idx]["name"], nach,
+                t.einstieg_zeit, arr, preis_leg, t.einstieg_idx, i + 1,
+            )
+            lab = _Label(t.abfahrt, arr, t.umstiege, t.preis_vorher + preis_leg, t.teilfahrten + (leg,))
+
+            if nach == ziel_name:
+                _pareto_einfuegen(ergebnis, lab, lambda a, b: _dominiert(a, b, False))
+            elif t.umstiege < max_umstiege:
+                if _pareto_einfuegen(bags.setdefault(nach, []), lab, lambda a, b: _dominiert(a, b, True)):
+                    horizont = max(horizont, arr + max_buf)
+
+    hits = [_hit_aus_label(start_name, ziel_name, lab) for lab in ergebnis]
+    hits.sort(key=sortier_schluessel)
+    return hits
@@ -0,0 +1,160 @@
+"""
+Vorkompilierte Warnungen für die Verbindungssuche
+
+Bisher wurde pro Treffer jede Warnung durchgegangen und startZeit/endZeit jedes Mal neu
+geparst. Hier wird die Warnungs-Liste einmal pro Refresh übersetzt:
+
+    global_      Warnungen ohne Abschnitte (gelten überall, nur Zeit zählt)
+    nach_paar    (Bahnhof, Bahnhof) ungerichtet -> Warnungen auf diesem Abschnitt
+
+jeweils als nach Start sortierte Intervalle (naive UTC) + laufendes Maximum der Enden:
+Überlappung mit [von, bis] = alle mit start <= bis (bisect rechts) und ab dem ersten,
+dessen laufendes Max-Ende >= von ist (bisect links) - dazwischen nur noch ende prüfen.
+
+Gleiche Regeln wie vorher in routes.py:
+    - ohne startZeit passt eine Warnung nie, ohne endZeit gilt sie unbefristet
+    - Abschnitte ohne vonName/nachName werden ignoriert; hat eine Warnung nur solche,
+      passt sie nie
+    - Ergebnis in der Reihenfolge der Warnungs-Liste, jede Warnung einmal
+
+Der Index wird wie der Fahrplan zwischengespeichert (WARNUNGEN_CACHE_TTL_SEK).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from flask import current_app
+
+from app.services.external_clients import parse_gmt_dt, strecken_warnungen
+
+DEFAULT_TTL_SEK = 30.0
+
+Paar = Tuple[str, str]
+
+
+def _naiv_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    if dt is not None and dt.tzinfo:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def paar(a: str, b: str) -> Paar:
+    """ungerichteter Abschnitt"""
+    return (a, b) if a <= b else (b, a)
+
+
+@dataclass
+class _Intervalle:
+    starts: List[datetime] = field(default_factory=list)
+    max_ende: List[datetime] = field(default_factory=list)   # laufendes Maximum der Enden
+    enden: List[datetime] = field(default_factory=list)
+    pos: List[int] = field(default_factory=list)             # Position in items
+
+    @classmethod
+    def aus(cls, eintraege: List[Tuple[datetime, datetime, int]]) -> "_Intervalle":
+        iv = cls()
+        for start, ende, pos in sorted(eintraege):
+            iv.starts.append(start)
+            iv.enden.append(ende)
+            iv.pos.append(pos)
+            iv.max_ende.append(max(ende, iv.max_ende[-1]) if iv.max_ende else ende)
+        return iv
+
+    def ueberlappend(self, von: datetime, bis: datetime) -> Iterable[int]:
+        hi = bisect_right(self.starts, bis)
+        lo = bisect_left(self.max_ende, von, 0, hi)
+        for k in range(lo, hi):
+            if self.enden[k] >= von:
+                yield self.pos[k]
+
+
+@dataclass(frozen=True)
+class WarnungsIndex:
+    items: List[Dict[str, Any]]
+    global_: _Intervalle
+    nach_paar: Dict[Paar, _Intervalle]
+
+    def passende(self, seg_pairs: Iterable[Paar], von: datetime, bis: datetime) -> List[Dict[str, Any]]:
+        """Warnungen die zeitlich mit [von, bis] überlappen und global sind oder einen der Abschnitte betreffen"""
+        treffer = set(self.global_.ueberlappend(von, bis))
+        for a, b in seg_pairs:
+            iv = self.nach_paar.get(paar(a, b))
+            if iv is not None:
+                treffer.update(iv.ueberlappend(von, bis))
+        return [self.items[p] for p in sorted(treffer)]
+
+
+def build_warnungs_index(warn_items: List[Dict[str, Any]]) -> WarnungsIndex:
+    global_: List[Tuple[datetime, datetime, int]] = []
+    nach_paar: Dict[Paar, List[Tuple[datetime, datetime, int]]] = {}
+
+    for pos, w in enumerate(warn_items):
+        start = _naiv_utc(parse_gmt_dt(w.get("startZeit")))
+        if start is None:
+            continue
+        ende = _naiv_utc(parse_gmt_dt(w.get("endZeit"))) or datetime.max
+
+        abschnitte = w.get("abschnitte") or []
+        if not abschnitte:
+            global_.append((start, ende, pos))
+            continue
+
+        paare = {
+            paar(a["vonName"], a["nachName"])
+            for a in abschnitte
+            if a.get("vonName") and a.get("nachName")
+        }
+        for p in paare:
+            nach_paar.setdefault(p, []).append((start, ende, pos))
+
+    return WarnungsIndex(
+        items=list(warn_items),
+        global_=_Intervalle.aus(global_),
+        nach_paar={p: _Intervalle.aus(e) for p, e in nach_paar.items()},
+    )
+
+
+class _WarnungsCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index: Optional[WarnungsIndex] = None
+        self._geladen_mono = 0.0
+
+    def get(self, ttl_sek: float) -> WarnungsIndex:
+        with self._lock:
+            if self._index is not None and time.monotonic() - self._geladen_mono <= ttl_sek:
+                return self._index
+        try:
+            items = strecken_warnungen().get("items") or []
+        except Exception as e:
+            # Strecken-Service weg: alter Index bleibt gültig bis es wieder klappt
+            if self._index is None:
+                raise
+            current_app.logger.warning("Warnungen Refresh fehlgeschlagen: %s", e)
+            return self._index
+        index = build_warnungs_index(items)
+        with self._lock:
+            self._index = index
+            self._geladen_mono = time.monotonic()
+        return index
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._index = None
+
+
+_cache = _WarnungsCache()
+
+
+def get_warnungs_index() -> WarnungsIndex:
+    return _cache.get(float(current_app.config.get("WARNUNGEN_CACHE_TTL_SEK", DEFAULT_TTL_SEK)))
+
+
+def invalidate_warnungen() -> None:
+    _cache.invalidate()
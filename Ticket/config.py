@@ -11,3 +11,52 @@ class Config:
     STRECKEN_API_BASE = "http://127.0.0.1:5001"
     FAHRPLAN_API_BASE = "http://127.0.0.1:5002"
     FLOTTEN_API_BASE = "http://127.0.0.1:5003"
+
+    # Verbindungssuche: "standard" (Direkt + 1 Umstieg) oder "csa" (Connection Scan)
+    VERBINDUNGSSUCHE_MODUS = "standard"
+
+    # Fahrplan-Cache: nach TTL wird im Hintergrund neu geladen (ETag / If-None-Match)
+    FAHRPLAN_CACHE_TTL_SEK = 60
+    FAHRPLAN_CACHE_HINTERGRUND = True
+    # Format für den vollen Snapshot: "kompakt" (binär), "ndjson" (gestreamt) oder "json"
+    FAHRPLAN_SNAPSHOT_FORMAT = "kompakt"
+
+    # Aufrufe an die anderen Services (services/http_client.py)
+    HTTP_TIMEOUT_SEK = (3.05, 8)      # (connect, read), einzelne Endpunkte setzen eigene
+    HTTP_WIEDERHOLUNGEN = 2
+    HTTP_BREAKER_FEHLER = 5           # so viele Fehler hintereinander -> Service wird pausiert
+    HTTP_BREAKER_PAUSE_SEK = 30
+
+    # Verbindungssuche: gemeinsame Frist für alle Upstream-Aufrufe (laufen parallel)
+    VERBINDUNGSSUCHE_FRIST_SEK = 10
+    # so viele Verbindungen pro Seite, danach "Spätere Verbindungen" (Cursor)
+    VERBINDUNGSSUCHE_SEITE = 20
+    # Ergebnis-Cache für /api/verbindungen (LRU + TTL, Schlüssel mit Fahrplan-Version)
+    VERBINDUNGEN_CACHE_GROESSE = 512
+    VERBINDUNGEN_CACHE_TTL_SEK = 300
+    VERBINDUNGEN_CACHE_BUCKET_MIN = 15
+    # Warnungen vom Strecken-Service: so lange wird der kompilierte Index wiederverwendet
+    WARNUNGEN_CACHE_TTL_SEK = 30
+    # Aktionen-Index (Rabatte): Änderungen im selben Prozess wirken sofort, andere Worker nach der TTL
+    AKTIONEN_CACHE_TTL_SEK = 60
+    # Sitzplätze pro Zug von Flotten: so lange gilt der Wert, bevor wieder gefragt wird
+    SITZPLATZ_KAPAZITAET_TTL_SEK = 300
+    # /api/tickets/sammelbuchung: so viele Tickets (Summe der anzahl) pro Request
+    SAMMELBUCHUNG_MAX_TICKETS = 1000
+    # Hintergrund-Job: aktive Tickets mit Abfahrt in der Vergangenheit -> "verbraucht"
+    TICKET_ABLAUF_JOB = True
+    TICKET_ABLAUF_INTERVALL_SEK = 60
+    # Meine Tickets: so viele pro Seite, danach "Ältere Tickets" (Keyset-Cursor)
+    MEINE_TICKETS_SEITE = 20
+
+
+class TestConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    FAHRPLAN_CACHE_HINTERGRUND = False
+    FAHRPLAN_SNAPSHOT_FORMAT = "json"
+    WARNUNGEN_CACHE_TTL_SEK = 0
+    AKTIONEN_CACHE_TTL_SEK = 0
+    SITZPLATZ_KAPAZITAET_TTL_SEK = 0
+    TICKET_ABLAUF_JOB = False
@@ -0,0 +1,31 @@
+"""sitzplatz_kontingent: Belegung pro Segment
+
+Revision ID: a7b8c9d0e1f2
+Revises: f2a3b4c5d6e7
+Create Date: 2026-10-17 14:05:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "a7b8c9d0e1f2"
+down_revision = "f2a3b4c5d6e7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # belegung bleibt NULL: die Segmente kennt nur der Fahrplan, die Belegung wird beim
+    # nächsten Buchen der Fahrt aus den Tickets aufgebaut
+    with op.batch_alter_table("sitzplatz_kontingent") as batch:
+        batch.add_column(sa.Column("segmente", sa.Integer(), nullable=True))
+        batch.add_column(sa.Column("belegung", sa.Text(), nullable=True))
+        batch.add_column(sa.Column("version", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade():
+    with op.batch_alter_table("sitzplatz_kontingent") as batch:
+        batch.drop_column("version")
+        batch.drop_column("belegung")
+        batch.drop_column("segmente")
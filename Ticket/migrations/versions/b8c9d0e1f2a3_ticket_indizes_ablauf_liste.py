@@ -0,0 +1,25 @@
+"""ticket: Indizes für Ablauf-Job (status, abfahrt) und Meine Tickets (user_id, erstelltAm, id)
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-17 16:40:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "b8c9d0e1f2a3"
+down_revision = "a7b8c9d0e1f2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_ticket_status_abfahrt", "ticket", ["status", "abfahrt"])
+    op.create_index("ix_ticket_user_erstellt", "ticket", ["user_id", "erstelltAm", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_ticket_user_erstellt", table_name="ticket")
+    op.drop_index("ix_ticket_status_abfahrt", table_name="ticket")
@@ -0,0 +1,54 @@
+"""sitzplatz_kontingent: reservierte Sitzplätze pro Fahrt
+
+Revision ID: f2a3b4c5d6e7
+Revises: e1b2c3d4e5f6
+Create Date: 2026-10-17 10:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "f2a3b4c5d6e7"
+down_revision = "e1b2c3d4e5f6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "sitzplatz_kontingent",
+        sa.Column("fahrt_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("zug_id", sa.Integer(), nullable=True),
+        sa.Column("kapazitaet", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("reserviert", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+    # schon gebuchte Sitzplätze übernehmen; kapazitaet kommt bei der nächsten Buchung von Flotten
+    ticket = sa.table(
+        "ticket",
+        sa.column("fahrt_id", sa.Integer),
+        sa.column("zug_id", sa.Integer),
+        sa.column("status", sa.String),
+        sa.column("sitzplatzReservierung", sa.Boolean),
+    )
+    kontingent = sa.table(
+        "sitzplatz_kontingent",
+        sa.column("fahrt_id", sa.Integer),
+        sa.column("zug_id", sa.Integer),
+        sa.column("kapazitaet", sa.Integer),
+        sa.column("reserviert", sa.Integer),
+    )
+    anzahl = sa.func.count()
+    op.execute(
+        kontingent.insert().from_select(
+            ["fahrt_id", "zug_id", "kapazitaet", "reserviert"],
+            sa.select(ticket.c.fahrt_id, sa.func.max(ticket.c.zug_id), anzahl, anzahl)
+            .where(ticket.c.status == "aktiv", ticket.c.sitzplatzReservierung.is_(True))
+            .group_by(ticket.c.fahrt_id),
+        )
+    )
+
+
+def downgrade():
+    op.drop_table("sitzplatz_kontingent")
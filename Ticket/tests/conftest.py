@@ -0,0 +1,155 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from app import create_app, db
+from config import TestConfig
+
+
+# Flask App mit leerer In-Memory Datenbank - nach jedem Test wieder weg
+@pytest.fixture(scope='function')
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+# Test client
+@pytest.fixture(scope='function')
+def client(app):
+    return app.test_client()
+
+# Test Datenbank session
+@pytest.fixture(scope='function')
+def session(app):
+    return db.session
+
+# eingeloggter User für @login_required Routen
+@pytest.fixture(scope='function')
+def eingeloggt(client, session):
+    from app.models import User
+
+    user = User(username="anna", email="anna@example.com")
+    user.set_password("pw")
+    session.add(user)
+    session.commit()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user.id)
+    return user
+
+
+################
+## TEST-DATEN ##
+################
+
+BAHNHOEFE = ["Wien", "St. Pölten", "Amstetten", "Linz", "Wels", "Attnang", "Salzburg", "Passau"]
+
+
+def make_fahrt(fahrt_id: int, halteplan_id: int, zug_id: int, halte: list[tuple[str, datetime, float]]) -> dict:
+    """
+    baut eine Fahrt im Format vom Fahrplan-Snapshot
+    halte = [(bahnhofName, zeit, tarif), ...] - Ankunft = Abfahrt = zeit
+    """
+    haltepunkte = []
+    for pos, (name, zeit, tarif) in enumerate(halte, start=1):
+        is_last = pos == len(halte)
+        haltepunkte.append({
+            "haltId": fahrt_id * 100 + pos,
+            "order": pos,
+            "bahnhofId": BAHNHOEFE.index(name) + 1 if name in BAHNHOEFE else 0,
+            "bahnhofName": name,
+            "planAnkunft": zeit.isoformat(),
+            "planAbfahrt": None if is_last else zeit.isoformat(),
+            "tarif": 0.0 if pos == 1 else tarif,
+        })
+    return {
+        "fahrtdurchfuehrungId": fahrt_id,
+        "halteplanId": halteplan_id,
+        "zugId": zug_id,
+        "haltepunkte": haltepunkte,
+    }
+
+
+def make_random_snapshot(seed: int, anzahl_fahrten: int, tag: datetime) -> dict:
+    """
+    Zufälliger Fahrplan: Fahrten laufen in beide Richtungen über Teilstrecken von BAHNHOEFE
+    """
+    rng = random.Random(seed)
+    items = []
+    for fid in range(1, anzahl_fahrten + 1):
+        linie = BAHNHOEFE if rng.random() < 0.5 else list(reversed(BAHNHOEFE))
+        a = rng.randrange(0, len(linie) - 1)
+        b = rng.randrange(a + 1, len(linie))
+        t = tag + timedelta(minutes=rng.randrange(0, 24 * 60))
+        halte = []
+        for name in linie[a:b + 1]:
+            halte.append((name, t, round(rng.uniform(1.0, 15.0), 2)))
+            t += timedelta(minutes=rng.randrange(5, 40))
+        items.append(make_fahrt(fid, rng.randrange(1, 6), rng.randrange(1, 20), halte))
+    return {"total": len(items), "items": items}
+
+
+@pytest.fixture
+def test_tag():
+    return datetime(2026, 3, 2)
+
+
+@pytest.fixture
+def test_snapshot(test_tag):
+    t = test_tag
+    return {
+        "total": 3,
+        "items": [
+            make_fahrt(1, 10, 100, [
+                ("Wien", t.replace(hour=8), 0.0),
+                ("St. Pölten", t.replace(hour=8, minute=30), 10.0),
+                ("Linz", t.replace(hour=9, minute=30), 20.0),
+            ]),
+            make_fahrt(2, 11, 101, [
+                ("Linz", t.replace(hour=9, minute=40), 0.0),
+                ("Wels", t.replace(hour=10), 5.0),
+                ("Salzburg", t.replace(hour=11), 15.0),
+            ]),
+            make_fahrt(3, 12, 102, [
+                ("Wien", t.replace(hour=9), 0.0),
+                ("Linz", t.replace(hour=10, minute=30), 25.0),
+                ("Salzburg", t.replace(hour=12), 20.0),
+            ]),
+        ],
+    }
+
+
+# Fahrplan in der Zukunft (buchbar): Fahrt 1 Wien - St. Pölten - Linz, Fahrt 2 Linz - Salzburg
+@pytest.fixture
+def zukunft_fahrplan(monkeypatch):
+    import app.routes as routes
+    from app.services.fahrplan_cache import build_fahrplan_modell
+
+    t = datetime(2030, 5, 6)
+    snap = {"items": [
+        make_fahrt(1, 10, 100, [("Wien", t.replace(hour=8), 0.0), ("St. Pölten", t.replace(hour=8, minute=30), 10.0),
+                                ("Linz", t.replace(hour=9, minute=30), 20.0)]),
+        make_fahrt(2, 11, 101, [("Linz", t.replace(hour=9, minute=40), 0.0), ("Salzburg", t.replace(hour=11), 15.0)]),
+    ]}
+    fp = build_fahrplan_modell(snap)
+    monkeypatch.setattr(routes, "get_fahrplan", lambda: fp)
+    return t
+
+
+@pytest.fixture
+def flotte(monkeypatch):
+    """Flotten-Service: Zug hat plaetze Sitzplätze, zählt die Aufrufe"""
+    import app.services.sitzplaetze as sitzplaetze
+
+    zustand = {"plaetze": 2, "aufrufe": 0}
+
+    def kapazitaet(zug_id):
+        zustand["aufrufe"] += 1
+        return {"zugId": zug_id, "personenwagen": [{"kapazitaet": zustand["plaetze"]}]}
+
+    monkeypatch.setattr(sitzplaetze, "flotte_kapazitaet", kapazitaet)
+    sitzplaetze.kapazitaet_cache_leeren()
+    yield zustand
+    sitzplaetze.kapazitaet_cache_leeren()
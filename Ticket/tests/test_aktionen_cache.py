@@ -0,0 +1,100 @@
+import random
+from datetime import datetime, timedelta
+
+import app.services.aktionen_cache as aktionen_cache
+from app.models import Aktion
+from app.services.aktionen_cache import AktionenIndex, get_aktionen_index, invalidate_aktionen
+from sqlalchemy import event
+
+T0 = datetime(2026, 3, 1)
+
+
+def _alt_beste_aktion(aktionen, verbindungs_datum, halteplan_id):
+    """alte Logik aus routes.py als Referenz"""
+    kandidaten = []
+    for a in aktionen:
+        if not a.aktiv:
+            continue
+        sd, ed = a.startZeit.date(), a.endeZeit.date()
+        if sd <= verbindungs_datum.date() <= ed:
+            if a.typ == "global":
+                kandidaten.append(a)
+            elif a.typ == "halteplan" and halteplan_id is not None and a.halteplanId == halteplan_id:
+                kandidaten.append(a)
+    if not kandidaten:
+        return None
+    return max(kandidaten, key=lambda a: (float(a.rabattWert or 0.0), 1 if a.typ == "halteplan" else 0))
+
+
+def make_aktionen(seed: int, n: int) -> list[Aktion]:
+    rnd = random.Random(seed)
+    out = []
+    for k in range(1, n + 1):
+        start = T0 + timedelta(days=rnd.randrange(0, 60))
+        hp = rnd.random() < 0.6
+        out.append(Aktion(
+            id=k, name=f"A{k}", aktiv=rnd.random() < 0.8,
+            startZeit=start, endeZeit=start + timedelta(days=rnd.randrange(-2, 20)),
+            rabattWert=float(rnd.choice([5, 10, 15, 20, 25])),
+            typ="halteplan" if hp else "global",
+            halteplanId=rnd.randint(1, 5) if hp else None,
+        ))
+    return out
+
+
+def test_index_wie_vorher():
+    aktionen = make_aktionen(1, 80)
+    index = AktionenIndex(aktionen)
+    for tag in range(-3, 85):
+        d = T0 + timedelta(days=tag, hours=9)
+        for hp in [None, 1, 2, 3, 4, 5, 6]:
+            alt = _alt_beste_aktion(aktionen, d, hp)
+            neu = index.best_for(d, hp)
+            assert (neu.id if neu else None) == (alt.id if alt else None), (d, hp)
+
+
+def test_eine_abfrage_pro_version(app, session):
+    session.add(Aktion(name="Sommer", startZeit=T0, endeZeit=T0 + timedelta(days=30),
+                       aktiv=True, rabattWert=10.0, typ="global"))
+    session.commit()
+    app.config["AKTIONEN_CACHE_TTL_SEK"] = 60
+    invalidate_aktionen()
+
+    queries = []
+    engine = session.get_bind()
+    zaehlen = lambda *args: queries.append(args[2])
+    event.listen(engine, "before_cursor_execute", zaehlen)
+    try:
+        for tag in range(200):
+            get_aktionen_index().best_for(T0 + timedelta(days=tag % 40), 3)
+        assert len(queries) == 1
+
+        # Änderung + invalidieren -> neu laden
+        session.add(Aktion(name="Herbst", startZeit=T0, endeZeit=T0 + timedelta(days=30),
+                           aktiv=True, rabattWert=30.0, typ="halteplan", halteplanId=3))
+        session.commit()
+        invalidate_aktionen()
+        queries.clear()
+        assert get_aktionen_index().best_for(T0, 3).name == "Herbst"
+        assert get_aktionen_index().best_for(T0, 4).name == "Sommer"
+        assert len([q for q in queries if q.lstrip().upper().startswith("SELECT")]) == 1
+    finally:
+        event.remove(engine, "before_cursor_execute", zaehlen)
+        invalidate_aktionen()
+
+
+def test_routen_invalidieren(app, client, session, eingeloggt):
+    app.config["AKTIONEN_CACHE_TTL_SEK"] = 60
+    invalidate_aktionen()
+    assert get_aktionen_index().best_for(datetime(2030, 5, 6), None) is None
+
+    client.post("/aktionen/global/new", data={
+        "name": "Neu", "startZeit": "2030-05-01", "endeZeit": "2030-05-31", "aktiv": "y", "rabattWert": "15",
+    })
+    assert get_aktionen_index().best_for(datetime(2030, 5, 6), None).name == "Neu"
+
+    aktion_id = Aktion.query.one().id
+    client.post(f"/aktionen/{aktion_id}/delete")
+    assert get_aktionen_index().best_for(datetime(2030, 5, 6), None) is None
+    assert aktionen_cache._cache.stats["ladevorgaenge"] >= 3
+    invalidate_aktionen()
@@ -0,0 +1,234 @@
+import json
+
+import pytest
+import app.services.fahrplan_cache as fahrplan_cache
+from app.services.external_clients import _ndjson_objekte
+from app.services.fahrplan_cache import (
+    get_fahrplan, invalidate_fahrplan, cache_stats, build_fahrplan_modell, build_fahrplan_modell_stream, apply_delta,
+)
+from app.services.verbindungen import suche_verbindungen
+from tests.conftest import make_fahrt, make_random_snapshot
+
+
+@pytest.fixture
+def fake_fahrplan_service(app, monkeypatch, test_snapshot):
+    """ersetzt den HTTP-Call: zählt Aufrufe, antwortet mit 304 wenn ETag gleich"""
+    calls = []
+    state = {"snap": test_snapshot, "etag": "v1"}
+
+    def fake(etag=None):
+        calls.append(etag)
+        if etag == state["etag"]:
+            return None, etag
+        return state["snap"], state["etag"]
+
+    monkeypatch.setattr(fahrplan_cache, "fahrplan_snapshot_bedingt", fake)
+    invalidate_fahrplan()
+    for k in fahrplan_cache._cache.stats:
+        fahrplan_cache._cache.stats[k] = 0
+    yield calls, state
+    invalidate_fahrplan()
+
+
+def test_cache_miss_dann_hit(app, fake_fahrplan_service):
+    calls, _state = fake_fahrplan_service
+
+    m1 = get_fahrplan()
+    m2 = get_fahrplan()
+    assert m1 is m2
+    assert len(calls) == 1
+    stats = cache_stats()
+    assert stats["misses"] == 1 and stats["hits"] == 1
+    assert stats["version"] == "v1"
+    assert set(m1.namen) == {1, 2, 3}
+    assert m1.namen[1] == ["Wien", "St. Pölten", "Linz"]
+
+
+def test_cache_refresh_nach_ttl(app, fake_fahrplan_service, test_snapshot):
+    calls, state = fake_fahrplan_service
+    app.config["FAHRPLAN_CACHE_TTL_SEK"] = 0
+
+    m1 = get_fahrplan()
+    # TTL abgelaufen, Server sagt 304 -> gleiches Modell
+    assert get_fahrplan() is m1
+    assert calls[-1] == "v1"
+    assert cache_stats()["refresh_unveraendert"] == 1
+
+    # neue Version -> neues Modell (abgelaufener Stand wird noch einmal ausgeliefert)
+    state["snap"] = {"items": test_snapshot["items"][:1]}
+    state["etag"] = "v2"
+    assert get_fahrplan() is m1
+    m3 = get_fahrplan()
+    assert m3.version == "v2"
+    assert len(m3.rides) == 1
+
+
+def test_suche_nutzt_cache(app, fake_fahrplan_service, test_tag):
+    calls, _state = fake_fahrplan_service
+    for _ in range(3):
+        hits = suche_verbindungen("Wien", "Salzburg", test_tag.date())
+        assert len(hits) == 2
+    assert len(calls) == 1
+
+
+def test_modell_ride_lookup(test_snapshot):
+    m = build_fahrplan_modell(test_snapshot, "x")
+    assert m.ride(2)["id"] == 2
+    assert m.ride(99) is None
+    assert m.tarif_kum[0] == [0.0, 10.0, 30.0]
+
+
+def test_kalter_cache_laedt_nur_einmal(app, fake_fahrplan_service, monkeypatch):
+    """viele gleichzeitige Anfragen auf leeren Cache: ein Snapshot-Abruf, alle bekommen dasselbe Modell"""
+    import threading
+    import time as pytime
+    from concurrent.futures import ThreadPoolExecutor
+
+    calls, state = fake_fahrplan_service
+    langsam = fahrplan_cache.fahrplan_snapshot_bedingt
+
+    def verzoegert(etag=None):
+        pytime.sleep(0.2)
+        return langsam(etag)
+
+    monkeypatch.setattr(fahrplan_cache, "fahrplan_snapshot_bedingt", verzoegert)
+    start = threading.Barrier(8)
+
+    def holen(_):
+        with app.app_context():
+            start.wait()
+            return get_fahrplan()
+
+    with ThreadPoolExecutor(8) as pool:
+        modelle = list(pool.map(holen, range(8)))
+    assert len(calls) == 1
+    assert all(m is modelle[0] for m in modelle)
+
+    # Fehler beim ersten Laden geht an alle Wartenden, danach neuer Versuch
+    invalidate_fahrplan()
+    calls.clear()
+
+    def kaputt(etag=None):
+        calls.append(etag)
+        pytime.sleep(0.2)
+        raise ConnectionError("Fahrplan down")
+
+    monkeypatch.setattr(fahrplan_cache, "fahrplan_snapshot_bedingt", kaputt)
+
+    def versuchen(_):
+        with app.app_context():
+            start.wait()
+            try:
+                get_fahrplan()
+            except ConnectionError:
+                return "fehler"
+
+    with ThreadPoolExecutor(8) as pool:
+        assert list(pool.map(versuchen, range(8))) == ["fehler"] * 8
+    assert len(calls) == 1
+
+
+def test_delta_einarbeiten(test_snapshot, test_tag):
+    alt = build_fahrplan_modell(dict(test_snapshot, version=5), "x")
+    assert alt.seq == 5
+
+    t = test_tag
+    delta = {
+        "version": 7,
+        "since": 5,
+        # Fahrt 2 fährt später, Fahrt 4 ist neu, Fahrt 3 gelöscht
+        "items": [
+            make_fahrt(2, 11, 101, [("Linz", t.replace(hour=9, minute=50), 0.0), ("Salzburg", t.replace(hour=11), 30.0)]),
+            make_fahrt(4, 13, 103, [("Wels", t.replace(hour=12), 0.0), ("Passau", t.replace(hour=13), 12.0)]),
+        ],
+        "deleted": [3],
+    }
+    neu = apply_delta(alt, delta)
+
+    assert (neu.seq, neu.version) == (7, "seq-7")
+    assert [r["id"] for r in neu.rides] == [1, 2, 4]
+    assert neu.namen[2] == ["Linz", "Salzburg"]
+    assert neu.ride(3) is None
+    assert neu.tarif_kum[neu.ride_pos[4]] == [0.0, 12.0]
+
+    # Suche auf dem neuen Modell: nur noch der Umstieg, jetzt mit 20 Minuten in Linz
+    hits = suche_verbindungen("Wien", "Salzburg", t.date(), fahrplan=neu)
+    assert [(h.fahrtdurchfuehrung_id, h.fahrtdurchfuehrung_id2) for h in hits] == [(1, 2)]
+
+
+def test_cache_refresh_per_delta(app, fake_fahrplan_service, monkeypatch, test_snapshot):
+    calls, state = fake_fahrplan_service
+    app.config["FAHRPLAN_CACHE_TTL_SEK"] = 0
+    state["snap"] = dict(test_snapshot, version=5)
+
+    deltas = []
+
+    def fake_delta(since):
+        deltas.append(since)
+        if since == 5:
+            return {"version": 6, "since": 5, "items": [], "deleted": [1]}
+        return {"version": since, "since": since, "items": [], "deleted": []}
+
+    monkeypatch.setattr(fahrplan_cache, "fahrplan_snapshot_delta", fake_delta)
+
+    m1 = get_fahrplan()
+    assert get_fahrplan() is m1         # TTL 0: alter Stand, danach Delta seit 5
+    m2 = get_fahrplan()                 # Stand nach Delta, danach leeres Delta seit 6
+    assert m2.seq == 6 and [r["id"] for r in m2.rides] == [2, 3]
+    assert m1.seq == 5 and len(m1.rides) == 3
+
+    assert get_fahrplan() is m2         # leeres Delta -> Modell bleibt
+    assert deltas == [5, 6, 6]
+    # voller Snapshot wurde nur einmal geholt
+    assert len(calls) == 1
+    assert cache_stats()["deltas"] == 1
+
+
+def test_delta_fehler_faellt_auf_vollen_snapshot_zurueck(app, fake_fahrplan_service, monkeypatch, test_snapshot):
+    calls, state = fake_fahrplan_service
+    app.config["FAHRPLAN_CACHE_TTL_SEK"] = 0
+    state["snap"] = dict(test_snapshot, version=5)
+
+    def kaputt(since):
+        raise RuntimeError("400 since ist neuer als die aktuelle Version")
+
+    monkeypatch.setattr(fahrplan_cache, "fahrplan_snapshot_delta", kaputt)
+
+    get_fahrplan()
+    get_fahrplan()
+    assert calls == [None, "v1"]
+
+
+def _als_ndjson(snap: dict) -> list[bytes]:
+    zeilen = [json.dumps(f).encode() for f in snap["items"]]
+    zeilen.append(b"")      # Keep-Alive Leerzeilen werden ignoriert
+    zeilen.append(json.dumps({"version": snap.get("version", 0), "total": len(snap["items"])}).encode())
+    return zeilen
+
+
+def test_ndjson_stream_gleich_wie_json(test_tag):
+    snap = dict(make_random_snapshot(7, 200, test_tag), version=42)
+
+    voll = build_fahrplan_modell(snap, "etag")
+    stream = build_fahrplan_modell_stream(_ndjson_objekte(_als_ndjson(snap)))
+
+    assert stream.rides == voll.rides
+    assert stream.abfahrts_index == voll.abfahrts_index
+    assert stream.connections == voll.connections
+    assert (stream.seq, stream.version) == (42, "seq-42")
+
+
+def test_cache_laedt_per_stream(app, fake_fahrplan_service, monkeypatch, test_snapshot):
+    calls, _state = fake_fahrplan_service
+    app.config["FAHRPLAN_SNAPSHOT_FORMAT"] = "ndjson"
+    streams = []
+
+    def fake_stream():
+        streams.append(1)
+        yield from _ndjson_objekte(_als_ndjson(dict(test_snapshot, version=3)))
+
+    monkeypatch.setattr(fahrplan_cache, "fahrplan_snapshot_stream", fake_stream)
+
+    m = get_fahrplan()
+    assert streams == [1] and calls == []
+    assert m.seq == 3 and set(m.namen) == {1, 2, 3}
@@ -0,0 +1,195 @@
+import time as pytime
+from datetime import datetime, time, timedelta
+
+import pytest
+from app.services.fahrplan_spalten import (
+    build_spalten,
+    fahrten_a_vor_b,
+    fahrten_ab_start,
+)
+from app.services.verbindungen import _build_rides
+from tests.conftest import make_random_snapshot
+
+
+def _direkt_dict(rides, start_name, ziel_name, datum, ab_zeit):
+    """Filter der Direktsuche auf den dict-rides (so wie vor den Spalten) -> [(ride-Pos, i_start, i_ziel)]"""
+    out = []
+    for pos, r in enumerate(rides):
+        stops = r["stops"]
+        idx_starts = r["idx_map"].get(start_name) or []
+        idx_ziels = r["idx_map"].get(ziel_name) or []
+        if not idx_starts or not idx_ziels:
+            continue
+        idx_start = min(idx_starts)
+        idx_ziel = next((j for j in sorted(idx_ziels) if j > idx_start), None)
+        if idx_ziel is None:
+            continue
+        dt_ab = stops[idx_start]["dep"] or stops[idx_start]["arr"]
+        dt_an = stops[idx_ziel]["arr"] or stops[idx_ziel]["dep"]
+        if not dt_ab or not dt_an or dt_ab.date() != datum:
+            continue
+        if ab_zeit and dt_ab.time() < ab_zeit:
+            continue
+        out.append((pos, idx_start, idx_ziel))
+    return out
+
+
+def _als_tripel(sp, start_halte, ziel_halte):
+    return [(int(sp.halt_ride[a]), int(sp.halt_idx[a]), int(sp.halt_idx[b])) for a, b in zip(start_halte, ziel_halte)]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_a_vor_b_wie_dict_version(seed, test_tag):
+    rides = _build_rides(make_random_snapshot(seed, 400, test_tag))
+    sp = build_spalten(rides)
+
+    for start, ziel in [("Wien", "Salzburg"), ("Passau", "Linz"), ("Wels", "Attnang"), ("Wien", "Graz")]:
+        for ab_zeit in (None, time(9, 30), time(23, 59)):
+            erwartet = _direkt_dict(rides, start, ziel, test_tag.date(), ab_zeit)
+            assert _als_tripel(sp, *fahrten_a_vor_b(sp, start, ziel, test_tag.date(), ab_zeit)) == erwartet
+
+
+def test_ab_start(test_snapshot, test_tag):
+    rides = _build_rides(test_snapshot)
+    sp = build_spalten(rides)
+
+    # Wien: Fahrt 1 (8:00) und Fahrt 3 (9:00), ab 8:30 nur noch Fahrt 3
+    assert [rides[sp.halt_ride[g]]["id"] for g in fahrten_ab_start(sp, "Wien", test_tag.date())] == [1, 3]
+    assert [rides[sp.halt_ride[g]]["id"] for g in fahrten_ab_start(sp, "Wien", test_tag.date(), time(8, 30))] == [3]
+    assert len(fahrten_ab_start(sp, "Wien", test_tag.date() + timedelta(days=1))) == 0
+
+
+def test_benchmark_spalten_vs_dict(test_tag):
+    """Micro-Benchmark: Direkt-Filter, dict-rides vs. numpy-Spalten (5 000 Fahrten)"""
+    rides = _build_rides(make_random_snapshot(21, 5000, test_tag))
+    t0 = pytime.perf_counter()
+    sp = build_spalten(rides)
+    t_build = pytime.perf_counter() - t0
+    datum = test_tag.date()
+    paare = [("Wien", "Salzburg"), ("Salzburg", "Wien"), ("Linz", "Passau"), ("Amstetten", "Wels")]
+    runden = 20
+
+    t0 = pytime.perf_counter()
+    for _ in range(runden):
+        for a, b in paare:
+            _direkt_dict(rides, a, b, datum, time(6, 0))
+    t_dict = (pytime.perf_counter() - t0) / (runden * len(paare))
+
+    t0 = pytime.perf_counter()
+    for _ in range(runden):
+        for a, b in paare:
+            fahrten_a_vor_b(sp, a, b, datum, time(6, 0))
+    t_np = (pytime.perf_counter() - t0) / (runden * len(paare))
+
+    print(f"\nbuild_spalten 5000 Fahrten: {t_build * 1000:.1f} ms")
+    print(f"A vor B     : dict {t_dict * 1e6:8.0f} us | numpy {t_np * 1e6:8.0f} us")
+    assert t_np < t_dict
+
+
+def _snapshot_zwei_netze(seed, tag):
+    """zufälliges Netz + eine Insel-Linie (Nord -> Süd) die mit dem Rest nichts zu tun hat"""
+    from tests.conftest import make_fahrt
+
+    snap = make_random_snapshot(seed, 300, tag)
+    snap["items"].append(make_fahrt(9001, 1, 1, [("Nord", tag.replace(hour=7), 0.0), ("Süd", tag.replace(hour=8), 5.0)]))
+    return snap
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_erreichbarkeit_schneidet_nichts_weg(seed, test_tag):
+    from dataclasses import replace
+    from app.services.fahrplan_cache import build_fahrplan_modell
+    from app.services.verbindungen import suche_verbindungen
+    from tests.conftest import BAHNHOEFE
+
+    fp = build_fahrplan_modell(_snapshot_zwei_netze(seed, test_tag))
+    ohne = replace(fp, erreichbar=None)
+    er = fp.erreichbar
+    namen = BAHNHOEFE + ["Nord", "Süd"]
+
+    for tag in (test_tag.date(), (test_tag + timedelta(days=1)).date()):
+        for a in namen:
+            for b in namen:
+                if a == b:
+                    continue
+                erwartet = suche_verbindungen(a, b, tag, fahrplan=ohne)
+                assert suche_verbindungen(a, b, tag, fahrplan=fp) == erwartet
+                if any(h.umstiege == 0 for h in erwartet):
+                    assert er.moeglich(a, b, tag, 0)
+                if erwartet:
+                    assert er.moeglich(a, b, tag, 1)
+
+    assert not er.moeglich("Wien", "Süd", test_tag.date())
+    assert not er.moeglich("Nord", "Süd", test_tag.date() - timedelta(days=1))
+    assert er.moeglich("Nord", "Süd", test_tag.date(), 0)
+    assert er.moeglich("Wien", "Süd", test_tag.date(), max_umstiege=2)   # mehr Umstiege: unbekannt
+
+
+def test_erreichbarkeit_lazy_und_delta(test_tag):
+    from app.services.fahrplan_cache import apply_delta, build_fahrplan_modell
+    from tests.conftest import BAHNHOEFE, make_fahrt
+
+    spaeter = test_tag + timedelta(days=10)
+    snap = make_random_snapshot(5, 150, test_tag)
+    for r in make_random_snapshot(6, 150, spaeter)["items"]:
+        fid = r["fahrtdurchfuehrungId"] + 1000
+        snap["items"].append(dict(r, fahrtdurchfuehrungId=fid, haltepunkte=[
+            dict(h, haltId=fid * 100 + h["order"]) for h in r["haltepunkte"]
+        ]))
+    alt = build_fahrplan_modell(dict(snap, version=1))
+    er = alt.erreichbar
+
+    # nichts vorab gebaut, nur der abgefragte Tag (+ Folgetage für den Umstieg)
+    assert not er._direkt and not er._umstieg
+    er.moeglich("Wien", "Salzburg", test_tag.date())
+    er.moeglich("Wien", "Salzburg", spaeter.date())
+    tag_alt, tag_spaet = (test_tag - datetime(1970, 1, 1)).days, (spaeter - datetime(1970, 1, 1)).days
+    assert set(er._umstieg) == {tag_alt, tag_spaet}
+    assert max(er._direkt) <= tag_spaet + er.folgetage
+
+    # Delta ändert nur eine Fahrt 10 Tage später -> der erste Tag wird übernommen, nicht neu gebaut
+    linie = BAHNHOEFE[:3]
+    delta = {"version": 2, "items": [
+        make_fahrt(1001, 1, 1, [(n, spaeter.replace(hour=5) + timedelta(minutes=20 * k), 3.0) for k, n in enumerate(linie)]),
+    ], "deleted": []}
+    neu = apply_delta(alt, delta)
+    assert neu.erreichbar._umstieg[tag_alt] is er._umstieg[tag_alt]
+    assert tag_spaet not in neu.erreichbar._umstieg
+
+    frisch = build_fahrplan_modell(dict(snap, items=[r for r in snap["items"] if r["fahrtdurchfuehrungId"] != 1001]
+                                        + delta["items"])).erreichbar
+    for tag in (test_tag.date(), spaeter.date()):
+        for a in BAHNHOEFE:
+            for b in BAHNHOEFE:
+                for n in (0, 1):
+                    assert neu.erreichbar.moeglich(a, b, tag, n) == frisch.moeglich(a, b, tag, n)
+            assert (neu.erreichbar.umstieg_zum_ziel(a, tag) == frisch.umstieg_zum_ziel(a, tag)).all()
+
+
+def test_benchmark_unmoegliche_anfrage(test_tag):
+    from dataclasses import replace
+    from app.services.fahrplan_cache import build_fahrplan_modell
+    from app.services.verbindungen import suche_verbindungen
+
+    snap = _snapshot_zwei_netze(3, test_tag)
+    snap["items"].extend(make_random_snapshot(4, 3000, test_tag)["items"][300:])
+    t0 = pytime.perf_counter()
+    fp = build_fahrplan_modell(snap)
+    t_laden = pytime.perf_counter() - t0
+    ohne = replace(fp, erreichbar=None)
+
+    def messen(modell, start, ziel):
+        t0 = pytime.perf_counter()
+        for _ in range(5):
+            hits = suche_verbindungen(start, ziel, test_tag.date(), fahrplan=modell)
+        return (pytime.perf_counter() - t0) / 5 * 1000, hits
+
+    t_ohne, hits_ohne = messen(ohne, "Wien", "Süd")
+    t_mit, hits_mit = messen(fp, "Wien", "Süd")
+    t_moeglich_ohne, a = messen(ohne, "Wien", "Salzburg")
+    t_moeglich_mit, b = messen(fp, "Wien", "Salzburg")
+    print(f"\nErreichbarkeit (Aufbau im Modell, gesamt Laden {t_laden * 1000:.0f} ms): "
+          f"Wien->Süd {t_ohne:.1f} ms -> {t_mit:.3f} ms, Wien->Salzburg {t_moeglich_ohne:.1f} ms -> {t_moeglich_mit:.1f} ms")
+    assert hits_ohne == hits_mit == []
+    assert a == b
+    assert t_mit < t_ohne / 10
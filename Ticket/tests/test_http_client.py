@@ -0,0 +1,112 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from app.services.http_client import CircuitBreaker, DienstClient, DienstNichtErreichbar
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # Keep-Alive
+
+    def do_GET(self):
+        srv = self.server
+        srv.aufrufe += 1
+        srv.verbindungen.add(self.client_address)
+        status = srv.antworten.pop(0) if srv.antworten else 200
+        body = json.dumps({"aufruf": srv.aufrufe}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.aufrufe, srv.verbindungen, srv.antworten = 0, set(), []
+    t = threading.Thread(target=srv.serve_forever, daemon=True)
+    t.start()
+    srv.url = f"http://127.0.0.1:{srv.server_address[1]}/x"
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_verbindung_wird_wiederverwendet(server):
+    c = DienstClient("test")
+    for _ in range(5):
+        c.get_json(server.url)
+    assert server.aufrufe == 5
+    assert len(server.verbindungen) == 1
+
+
+def test_wiederholung_bei_503(server):
+    server.antworten = [503, 503]
+    c = DienstClient("test", wiederholungen=2, backoff_sek=0)
+    assert c.get_json(server.url) == {"aufruf": 3}
+    assert c.breaker.zustand == "zu"
+
+
+def test_letzte_gute_antwort_bei_fehler(server):
+    c = DienstClient("test", wiederholungen=0)
+    assert c.get_json(server.url, params={"q": "a"}) == {"aufruf": 1}
+
+    server.antworten = [500, 500]
+    assert c.get_json(server.url, params={"q": "a"}) == {"aufruf": 1}
+    # andere Parameter: nichts gemerkt -> Fehler
+    with pytest.raises(requests.HTTPError):
+        c.get_json(server.url, params={"q": "b"})
+
+
+def test_breaker_oeffnet_und_schliesst(server):
+    c = DienstClient("test", wiederholungen=0, fehler_schwelle=2, pause_sek=60)
+    server.antworten = [500, 500]
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            c.get_json(server.url)
+    assert c.breaker.zustand == "offen"
+
+    # offen: kein Aufruf mehr beim Service
+    with pytest.raises(DienstNichtErreichbar):
+        c.get_json(server.url)
+    assert server.aufrufe == 2
+
+    # nach der Pause: ein Probe-Aufruf, Erfolg schließt den Breaker
+    c.breaker.pause_sek = 0
+    c.breaker.fehler()
+    assert c.breaker.zustand == "halb-offen"
+    assert c.get_json(server.url) == {"aufruf": 3}
+    assert c.breaker.zustand == "zu"
+
+
+def test_service_weg_schnell_fehlschlagen():
+    # Port ohne Server: Connection refused
+    c = DienstClient("test", wiederholungen=0, fehler_schwelle=1, pause_sek=60)
+    with pytest.raises(requests.ConnectionError):
+        c.get_json("http://127.0.0.1:9/x")
+    with pytest.raises(DienstNichtErreichbar):
+        c.get_json("http://127.0.0.1:9/x")
+
+
+def test_halb_offen_nur_ein_probe_aufruf():
+    b = CircuitBreaker(fehler_schwelle=1, pause_sek=0)
+    b.fehler()
+    assert b.darf_anfragen()
+    assert not b.darf_anfragen()
+    b.fehler()
+    assert b.darf_anfragen()
+
+
+def test_external_clients_ein_client_pro_dienst(app):
+    from app.services.external_clients import _client
+
+    with app.app_context():
+        assert _client("strecken") is _client("strecken")
+        assert _client("strecken") is not _client("flotten")
@@ -0,0 +1,121 @@
+import time as pytime
+
+from app.models import SitzplatzKontingent, Ticket
+from tests.test_ticket_buchen import _buchen
+
+
+def _position(t, **extra):
+    pos = {
+        "fahrt_id": 1, "start_halt": "Wien", "ziel_halt": "Linz",
+        "abfahrt": t.replace(hour=8).isoformat(), "ankunft": t.replace(hour=9, minute=30).isoformat(),
+        "umstiege": 0, "halteplan_id": 10, "zug_id": 100, "preis": 30.0,
+    }
+    pos.update(extra)
+    return pos
+
+
+def test_sammelbuchung_ergebnis_pro_position(client, session, eingeloggt, zukunft_fahrplan, flotte):
+    t = zukunft_fahrplan
+    res = client.post("/api/tickets/sammelbuchung", json={"buchungen": [
+        _position(t, anzahl=2),
+        _position(t, preis=1.0),
+        _position(t, anzahl=3, sitzplatz=True),     # nur 2 Plätze
+        _position(t, abfahrt="kaputt"),
+    ]})
+    assert res.status_code == 201
+    data = res.get_json()
+    ok = [e["ok"] for e in data["ergebnisse"]]
+    assert ok == [True, False, False, False]
+    assert "Preis" in data["ergebnisse"][1]["fehler"]
+    assert "ausgebucht" in data["ergebnisse"][2]["fehler"]
+    assert len(data["ergebnisse"][0]["ticket_ids"]) == 2
+    assert data["gebucht"] == 2
+    assert Ticket.query.count() == 2
+    assert {t.gesamtPreis for t in Ticket.query.all()} == {30.0}
+
+
+def test_sammelbuchung_umstiege_ungueltig(client, session, eingeloggt, zukunft_fahrplan):
+    t = zukunft_fahrplan
+    res = client.post("/api/tickets/sammelbuchung", json={"buchungen": [
+        _position(t, umstiege=-3),
+        _position(t, umstiege=1),                   # 1 Umstieg, aber keine zweite Fahrt
+        _position(t, ziel_halt="Salzburg", preis=45.0, ankunft=t.replace(hour=11).isoformat(),
+                  fahrt_id2=2, halteplan_id2=11, zug_id2=101, umstieg_bahnhof="Linz",
+                  umstieg_ankunft=t.replace(hour=9, minute=30).isoformat(),
+                  umstieg_abfahrt=t.replace(hour=9, minute=40).isoformat()),   # zweite Fahrt, umstiege 0
+    ]})
+    data = res.get_json()
+    assert [e["ok"] for e in data["ergebnisse"]] == [False, False, False]
+    assert Ticket.query.count() == 0
+
+
+def test_sammelbuchung_sitzplaetze_pro_segment(client, session, eingeloggt, zukunft_fahrplan, flotte):
+    t = zukunft_fahrplan
+    flotte["plaetze"] = 5
+    res = client.post("/api/tickets/sammelbuchung", json={"buchungen": [
+        _position(t, anzahl=3, sitzplatz=True, ziel_halt="St. Pölten", preis=10.0,
+                  ankunft=t.replace(hour=8, minute=30).isoformat()),
+        _position(t, anzahl=3, sitzplatz=True, start_halt="St. Pölten", preis=20.0,
+                  abfahrt=t.replace(hour=8, minute=30).isoformat()),
+        _position(t, anzahl=3, sitzplatz=True),
+        _position(t, anzahl=2, sitzplatz=True),
+    ]})
+    ok = [e["ok"] for e in res.get_json()["ergebnisse"]]
+    assert ok == [True, True, False, True]
+    assert session.get(SitzplatzKontingent, 1).belegung == "5,5"
+    assert Ticket.query.filter_by(sitzplatzReservierung=True).count() == 8
+    # eine Kapazitäts-Abfrage für den ganzen Request
+    assert flotte["aufrufe"] == 1
+
+
+def test_sammelbuchung_zu_gross(client, eingeloggt, zukunft_fahrplan, app):
+    app.config["SAMMELBUCHUNG_MAX_TICKETS"] = 10
+    res = client.post("/api/tickets/sammelbuchung", json={"buchungen": [_position(zukunft_fahrplan, anzahl=11)]})
+    assert res.status_code == 400
+    assert client.post("/api/tickets/sammelbuchung", json={}).status_code == 400
+
+
+def test_sammelbuchung_negative_anzahl_umgeht_limit_nicht(client, session, eingeloggt, zukunft_fahrplan, app):
+    app.config["SAMMELBUCHUNG_MAX_TICKETS"] = 5
+    res = client.post("/api/tickets/sammelbuchung", json={"buchungen": [
+        _position(zukunft_fahrplan, anzahl=-50), _position(zukunft_fahrplan, anzahl=50),
+    ]})
+    assert res.status_code == 400
+    assert Ticket.query.count() == 0
+
+
+def test_benchmark_sammelbuchung_vs_einzeln(client, session, eingeloggt, zukunft_fahrplan, flotte):
+    """
+    1 000 Tickets mit Sitzplatz als 1 000 Positionen in einer Sammelbuchung vs. einzeln über
+    ticket_buchen (einzeln nur 200 gemessen und hochgerechnet, sonst dauert der Test ~10 s)
+    """
+    t = zukunft_fahrplan
+    flotte["plaetze"] = 5000
+    n, n_einzeln = 1000, 200
+
+    t0 = pytime.perf_counter()
+    for _ in range(n_einzeln):
+        _buchen(client, t, sitzplatz="1")
+    t_einzeln = (pytime.perf_counter() - t0) * n / n_einzeln
+    assert Ticket.query.count() == n_einzeln
+
+    t0 = pytime.perf_counter()
+    res = client.post("/api/tickets/sammelbuchung", json={"buchungen": [_position(t, sitzplatz=True)] * n})
+    t_sammel = pytime.perf_counter() - t0
+    assert res.get_json()["gebucht"] == n
+    assert session.get(SitzplatzKontingent, 1).reserviert == n_einzeln + n
+
+    print(f"\n{n} Tickets: einzeln ~{t_einzeln * 1000:.0f} ms | Sammelbuchung {t_sammel * 1000:.0f} ms")
+    assert t_sammel < t_einzeln
+
+
+def test_sammelbuchung_fremder_zug(client, session, eingeloggt, zukunft_fahrplan, flotte):
+    t = zukunft_fahrplan
+    res = client.post("/api/tickets/sammelbuchung", json={"buchungen": [
+        _position(t, zug_id=999, sitzplatz=True), _position(t, zug_id=None, sitzplatz=True),
+    ]})
+    ergebnisse = res.get_json()["ergebnisse"]
+    assert [e["ok"] for e in ergebnisse] == [False, True]
+    assert ergebnisse[0]["fehler"] == "Verbindungsdaten ungültig"
+    assert Ticket.query.one().zug_id == 100
+    assert session.get(SitzplatzKontingent, 1).zug_id == 100
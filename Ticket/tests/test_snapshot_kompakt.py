@@ -0,0 +1,98 @@
+import json
+import struct
+import time as pytime
+from array import array
+from datetime import datetime, timedelta
+
+import pytest
+import app.services.fahrplan_cache as fahrplan_cache
+from app.services.fahrplan_cache import get_fahrplan
+from app.services.snapshot_kompakt import EPOCH, KompaktFormatFehler, decode_rides
+from app.services.verbindungen import _build_rides
+from tests.conftest import make_random_snapshot
+
+
+def make_kompakt(snap: dict) -> bytes:
+    """baut aus einem JSON-Snapshot das Kompaktformat (so wie es der Fahrplan-Service sendet)"""
+    def minuten(s):
+        return -1 if not s else (datetime.fromisoformat(s) - EPOCH) // timedelta(minutes=1)
+
+    bahnhoefe, bhf_idx = [], {}
+    fids, hps, zuege, offsets = array("i"), array("i"), array("i"), array("i", [0])
+    halt_ids, bhf, ank, abf, tarif = array("i"), array("i"), array("i"), array("i"), array("f")
+    for f in snap["items"]:
+        fids.append(f["fahrtdurchfuehrungId"])
+        hps.append(f["halteplanId"])
+        zuege.append(f["zugId"])
+        for h in f["haltepunkte"]:
+            if h["bahnhofId"] not in bhf_idx:
+                bhf_idx[h["bahnhofId"]] = len(bahnhoefe)
+                bahnhoefe.append([h["bahnhofId"], h["bahnhofName"]])
+            halt_ids.append(h["haltId"])
+            bhf.append(bhf_idx[h["bahnhofId"]])
+            ank.append(minuten(h["planAnkunft"]))
+            abf.append(minuten(h["planAbfahrt"]))
+            tarif.append(h["tarif"])
+        offsets.append(len(halt_ids))
+
+    header = json.dumps({"version": snap.get("version", 0), "total": len(fids), "halte": len(halt_ids),
+                         "bahnhoefe": bahnhoefe}).encode()
+    spalten = b"".join(a.tobytes() for a in (fids, hps, zuege, offsets, halt_ids, bhf, ank, abf, tarif))
+    return b"FPK1" + struct.pack("<I", len(header)) + header + spalten
+
+
+def test_kompakt_gleich_wie_json(test_tag):
+    snap = dict(make_random_snapshot(3, 300, test_tag), version=9)
+
+    rides, meta = decode_rides(make_kompakt(snap))
+    assert rides == _build_rides(snap)
+    assert meta["version"] == 9 and meta["total"] == 300
+
+
+def test_kaputte_daten():
+    with pytest.raises(KompaktFormatFehler):
+        decode_rides(b'{"items": []}')
+
+    snap = {"items": []}
+    data = make_kompakt(snap)
+    with pytest.raises(KompaktFormatFehler):
+        decode_rides(data[:-2])
+
+
+def test_cache_laedt_kompakt(app, monkeypatch, test_snapshot):
+    app.config["FAHRPLAN_SNAPSHOT_FORMAT"] = "kompakt"
+    calls = []
+
+    def fake(etag=None):
+        calls.append(etag)
+        return make_kompakt(dict(test_snapshot, version=4)), "k1"
+
+    monkeypatch.setattr(fahrplan_cache, "fahrplan_snapshot_kompakt", fake)
+    fahrplan_cache.invalidate_fahrplan()
+    try:
+        m = get_fahrplan()
+        assert calls == [None]
+        assert (m.version, m.seq) == ("k1", 4)
+        assert m.namen[1] == ["Wien", "St. Pölten", "Linz"]
+    finally:
+        fahrplan_cache.invalidate_fahrplan()
+
+
+def test_benchmark_kompakt_vs_json(test_tag):
+    """5 000 Fahrten: Payload-Größe und Parse-Zeit (bis rides) JSON vs. Kompaktformat"""
+    snap = dict(make_random_snapshot(11, 5000, test_tag), version=1)
+    json_bytes = json.dumps(snap, separators=(",", ":")).encode()
+    kompakt = make_kompakt(snap)
+
+    t0 = pytime.perf_counter()
+    rides_json = _build_rides(json.loads(json_bytes))
+    t_json = pytime.perf_counter() - t0
+
+    t0 = pytime.perf_counter()
+    rides_kompakt, _meta = decode_rides(kompakt)
+    t_kompakt = pytime.perf_counter() - t0
+
+    assert rides_kompakt == rides_json
+    print(f"\nJSON   : {len(json_bytes) / 1024:7.0f} KiB, parse {t_json * 1000:6.0f} ms")
+    print(f"kompakt: {len(kompakt) / 1024:7.0f} KiB, parse {t_kompakt * 1000:6.0f} ms")
+    assert len(kompakt) * 4 < len(json_bytes)
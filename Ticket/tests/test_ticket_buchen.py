@@ -0,0 +1,234 @@
+from datetime import datetime
+
+import pytest
+from app.models import Aktion, Ticket
+
+
+def _buchen(client, t, fahrt_id=1, **extra):
+    form = {
+        "start_halt": "Wien", "ziel_halt": "Linz",
+        "abfahrt": t.replace(hour=8).isoformat(), "ankunft": t.replace(hour=9, minute=30).isoformat(),
+        "umstiege": "0", "halteplan_id": "10", "zug_id": "100", "preis": "30.0",
+    }
+    form.update(extra)
+    return client.post(f"/tickets/buchen/{fahrt_id}", data=form)
+
+
+def test_preis_passt(client, session, eingeloggt, zukunft_fahrplan):
+    _buchen(client, zukunft_fahrplan)
+    ticket = session.scalars(Ticket.query.statement).one()
+    assert ticket.gesamtPreis == 30.0
+
+
+def test_manipulierter_preis_wird_abgelehnt(client, session, eingeloggt, zukunft_fahrplan):
+    _buchen(client, zukunft_fahrplan, preis="1.0")
+    assert Ticket.query.count() == 0
+
+
+def test_mehr_als_ein_umstieg_wird_abgelehnt(client, session, eingeloggt, zukunft_fahrplan):
+    # umstiege kommt vom Client -> darf den Preis-Check nicht aushebeln
+    _buchen(client, zukunft_fahrplan, umstiege="2", preis="0.01")
+    _buchen(client, zukunft_fahrplan, umstiege="-1", preis="0.01")
+    assert Ticket.query.count() == 0
+
+
+def test_fahrplan_nicht_erreichbar_bucht_nicht(client, session, eingeloggt, monkeypatch):
+    import app.routes as routes
+
+    def kaputt():
+        raise ConnectionError("Fahrplan down")
+
+    monkeypatch.setattr(routes, "get_fahrplan", kaputt)
+    r = _buchen(client, datetime(2030, 5, 6), preis="0.01")
+    assert r.status_code == 302
+    assert Ticket.query.count() == 0
+
+
+def test_umstieg_mit_aktion(client, session, eingeloggt, zukunft_fahrplan):
+    t = zukunft_fahrplan
+    aktion = Aktion(name="Sommer", startZeit=datetime(2030, 5, 1), endeZeit=datetime(2030, 5, 31),
+                    aktiv=True, rabattWert=10.0, typ="global")
+    session.add(aktion)
+    session.commit()
+
+    # 30 + 15 = 45, minus 10 % = 40.50; aktion_id wird vom Server gesetzt
+    _buchen(client, t, ziel_halt="Salzburg", umstiege="1", preis="40.5", ankunft=t.replace(hour=11).isoformat(),
+            fahrt_id2="2", halteplan_id2="11", zug_id2="101", umstieg_bahnhof="Linz",
+            umstieg_ankunft=t.replace(hour=9, minute=30).isoformat(),
+            umstieg_abfahrt=t.replace(hour=9, minute=40).isoformat())
+    ticket = Ticket.query.one()
+    assert ticket.gesamtPreis == 40.5
+    assert ticket.aktion_id == aktion.id
+
+
+def _sitzplaetze(fahrt_id=1):
+    return Ticket.query.filter_by(fahrt_id=fahrt_id, status="aktiv", sitzplatzReservierung=True).count()
+
+
+def test_sitzplatz_ausgebucht_und_storno(client, session, eingeloggt, zukunft_fahrplan, flotte):
+    from app.models import SitzplatzKontingent
+
+    for _ in range(3):
+        _buchen(client, zukunft_fahrplan, sitzplatz="1")
+    assert _sitzplaetze() == 2
+    assert session.get(SitzplatzKontingent, 1).reserviert == 2
+
+    # Storno gibt den Platz wieder frei
+    ticket = Ticket.query.first()
+    client.post(f"/tickets/{ticket.id}/storno")
+    session.expire_all()
+    assert session.get(SitzplatzKontingent, 1).reserviert == 1
+    _buchen(client, zukunft_fahrplan, sitzplatz="1")
+    assert _sitzplaetze() == 2
+
+
+def test_fremder_zug_hebt_kapazitaet_nicht(client, session, eingeloggt, zukunft_fahrplan, flotte, monkeypatch):
+    """zug_id aus dem Formular darf die Kapazität (Flotten-Abfrage pro Zug) nicht bestimmen"""
+    import app.routes as routes
+    from app.models import SitzplatzKontingent
+
+    angefragt = []
+    original = routes.zug_kapazitaet
+    monkeypatch.setattr(routes, "zug_kapazitaet", lambda zug_id: angefragt.append(zug_id) or original(zug_id))
+
+    _buchen(client, zukunft_fahrplan, sitzplatz="1", zug_id="999")
+    assert Ticket.query.count() == 0
+    _buchen(client, zukunft_fahrplan, sitzplatz="1", zug_id="")
+    assert Ticket.query.one().zug_id == 100
+    assert angefragt == [100]
+    assert session.get(SitzplatzKontingent, 1).zug_id == 100
+
+
+def test_sitzplatz_pro_segment(client, session, eingeloggt, zukunft_fahrplan, flotte):
+    """1 Platz: Wien -> St. Pölten und St. Pölten -> Linz gehen beide, Wien -> Linz dann nicht mehr"""
+    from app.models import SitzplatzKontingent
+
+    t = zukunft_fahrplan
+    flotte["plaetze"] = 1
+    _buchen(client, t, sitzplatz="1", ziel_halt="St. Pölten", preis="10.0",
+            ankunft=t.replace(hour=8, minute=30).isoformat())
+    _buchen(client, t, sitzplatz="1", start_halt="St. Pölten", preis="20.0",
+            abfahrt=t.replace(hour=8, minute=30).isoformat())
+    assert _sitzplaetze() == 2
+    _buchen(client, t, sitzplatz="1")
+    assert _sitzplaetze() == 2
+    assert session.get(SitzplatzKontingent, 1).belegung == "1,1"
+
+
+def _umstieg(client, t, **extra):
+    return _buchen(client, t, ziel_halt="Salzburg", umstiege="1", preis="45.0", ankunft=t.replace(hour=11).isoformat(),
+                   fahrt_id2="2", halteplan_id2="11", zug_id2="101", umstieg_bahnhof="Linz",
+                   umstieg_ankunft=t.replace(hour=9, minute=30).isoformat(),
+                   umstieg_abfahrt=t.replace(hour=9, minute=40).isoformat(), **extra)
+
+
+def test_sitzplatz_umstieg_prueft_zweite_fahrt(client, session, eingeloggt, zukunft_fahrplan, flotte):
+    from app.models import SitzplatzKontingent
+
+    t = zukunft_fahrplan
+    flotte["plaetze"] = 1
+    # zweite Fahrt (Linz -> Salzburg) ist schon voll
+    _buchen(client, t, fahrt_id=2, sitzplatz="1", start_halt="Linz", ziel_halt="Salzburg", preis="15.0",
+            abfahrt=t.replace(hour=9, minute=40).isoformat(), ankunft=t.replace(hour=11).isoformat(),
+            halteplan_id="11", zug_id="101")
+    _umstieg(client, t, sitzplatz="1")
+    assert Ticket.query.count() == 1
+    assert session.get(SitzplatzKontingent, 2).belegung == "1"
+    # Fahrt 1 wurde nicht belegt (rollback)
+    kontingent = session.get(SitzplatzKontingent, 1)
+    assert kontingent is None or kontingent.reserviert == 0
+
+    # Storno vom Linz -> Salzburg Ticket macht den Umstieg buchbar, beide Fahrten belegt
+    client.post(f"/tickets/{Ticket.query.one().id}/storno")
+    _umstieg(client, t, sitzplatz="1")
+    session.expire_all()
+    assert session.get(SitzplatzKontingent, 1).belegung == "1,1"
+    assert session.get(SitzplatzKontingent, 2).belegung == "1"
+
+
+def test_belegung_segmentbaum_wie_liste():
+    import random
+    from app.services.sitzplaetze import Belegung
+
+    rng = random.Random(3)
+    for n in (1, 2, 7, 16, 23):
+        liste = [rng.randrange(0, 4) for _ in range(n)]
+        baum = Belegung(liste)
+        for _ in range(300):
+            von = rng.randrange(0, n)
+            bis = rng.randrange(von + 1, n + 1)
+            if rng.random() < 0.5:
+                delta = rng.choice([-1, 1, 2])
+                baum.addieren(von, bis, delta)
+                for i in range(von, bis):
+                    liste[i] += delta
+            else:
+                assert baum.maximum(von, bis) == max(liste[von:bis])
+        assert baum.werte() == liste
+        assert Belegung.aus_text(baum.text()).werte() == liste
+
+
+def test_kapazitaet_wird_zwischengespeichert(app, flotte):
+    from app.services.sitzplaetze import zug_kapazitaet
+
+    app.config["SITZPLATZ_KAPAZITAET_TTL_SEK"] = 60
+    assert zug_kapazitaet(100) == 2
+    flotte["plaetze"] = 5
+    assert zug_kapazitaet(100) == 2
+    assert flotte["aufrufe"] == 1
+
+    app.config["SITZPLATZ_KAPAZITAET_TTL_SEK"] = 0
+    assert zug_kapazitaet(100) == 5
+
+
+def test_parallele_buchungen_ueberbuchen_nicht(tmp_path, zukunft_fahrplan, flotte):
+    """
+    viele gleichzeitige Sitzplatz-Buchungen auf dieselbe Fahrt (eigene SQLite-Datei, damit
+    jeder Thread eine eigene Verbindung hat): genau kapazitaet Tickets, Rest ausgebucht
+    """
+    import threading
+    import time as pytime
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app import create_app, db
+    from app.models import SitzplatzKontingent, User
+    from config import TestConfig
+
+    class DateiConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + str(tmp_path / "tickets.db")
+        SQLALCHEMY_ENGINE_OPTIONS = {"connect_args": {"timeout": 30}}
+
+    app = create_app(DateiConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(username="anna", email="anna@example.com")
+        user.set_password("pw")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    plaetze, buchungen, threads = 25, 80, 8
+    flotte["plaetze"] = plaetze
+    start = threading.Barrier(threads)
+
+    def buchen_lassen(n):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(user_id)
+        start.wait()
+        for _ in range(n):
+            _buchen(client, zukunft_fahrplan, sitzplatz="1")
+
+    t0 = pytime.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(buchen_lassen, [buchungen // threads] * threads))
+    dauer = pytime.perf_counter() - t0
+
+    with app.app_context():
+        gebucht = _sitzplaetze()
+        kontingent = db.session.get(SitzplatzKontingent, 1)
+        print(f"\n{buchungen} Buchungen, {threads} Threads: {dauer * 1000:.0f} ms ({buchungen / dauer:.0f}/s)")
+        assert gebucht == plaetze
+        assert kontingent.reserviert == plaetze
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,86 @@
+import time as pytime
+from datetime import datetime, timedelta
+
+from app.models import Ticket
+from app.services.tickets import (
+    ablauf_job_starten,
+    ablauf_job_stats,
+    ablauf_job_stoppen,
+    tickets_ablaufen_lassen,
+    tickets_seite,
+)
+
+
+def _ticket(user, abfahrt, status="aktiv", erstellt=None):
+    return Ticket(
+        user_id=user.id, status=status, start_halt="Wien", ziel_halt="Linz",
+        abfahrt=abfahrt, ankunft=abfahrt + timedelta(hours=1), fahrt_id=1,
+        gesamtPreis=30.0, erstelltAm=erstellt or datetime.utcnow(),
+    )
+
+
+def test_ablauf_nur_vergangene_aktive(session, eingeloggt):
+    jetzt = datetime(2030, 1, 1, 12)
+    vergangen = _ticket(eingeloggt, jetzt - timedelta(hours=1))
+    zukunft = _ticket(eingeloggt, jetzt + timedelta(hours=1))
+    storniert = _ticket(eingeloggt, jetzt - timedelta(hours=1), status="storniert")
+    session.add_all([vergangen, zukunft, storniert])
+    session.commit()
+
+    assert tickets_ablaufen_lassen(jetzt) == 1
+    session.expire_all()
+    assert [vergangen.status, zukunft.status, storniert.status] == ["verbraucht", "aktiv", "storniert"]
+    assert tickets_ablaufen_lassen(jetzt) == 0
+
+
+def test_meine_tickets_schreibt_nicht(client, session, eingeloggt):
+    t = _ticket(eingeloggt, datetime.utcnow() - timedelta(hours=1))
+    session.add(t)
+    session.commit()
+
+    res = client.get("/meine-tickets")
+    assert res.status_code == 200
+    assert "Verbraucht" in res.get_data(as_text=True)
+    session.expire_all()
+    assert t.status == "aktiv"
+
+
+def test_keyset_seiten(client, session, eingeloggt, app):
+    basis = datetime(2030, 1, 1)
+    # je 3 Tickets mit gleichem erstelltAm (wie bei einer Sammelbuchung)
+    session.add_all([_ticket(eingeloggt, basis, erstellt=basis + timedelta(minutes=i // 3)) for i in range(25)])
+    session.commit()
+
+    gesehen, cursor, seiten = [], None, 0
+    while True:
+        tickets, cursor = tickets_seite(eingeloggt.id, 10, cursor)
+        gesehen.extend((t.erstelltAm, t.id) for t in tickets)
+        seiten += 1
+        if cursor is None:
+            break
+    assert seiten == 3
+    assert len(set(gesehen)) == 25
+    assert gesehen == sorted(gesehen, reverse=True)
+
+    app.config["MEINE_TICKETS_SEITE"] = 10
+    html = client.get("/meine-tickets").get_data(as_text=True)
+    assert "Ältere Tickets" in html
+    assert client.get("/meine-tickets?vor=kaputt").status_code == 302
+
+
+def test_ablauf_job_laeuft_im_hintergrund(app, session, eingeloggt):
+    t = _ticket(eingeloggt, datetime.utcnow() - timedelta(hours=1))
+    session.add(t)
+    session.commit()
+
+    app.config["TICKET_ABLAUF_INTERVALL_SEK"] = 0.01
+    vorher = ablauf_job_stats()["laeufe"]
+    ablauf_job_starten(app)
+    try:
+        ende = pytime.monotonic() + 5
+        while ablauf_job_stats()["laeufe"] <= vorher and pytime.monotonic() < ende:
+            pytime.sleep(0.01)
+    finally:
+        ablauf_job_stoppen()
+    session.expire_all()
+    assert t.status == "verbraucht"
@@ -0,0 +1,215 @@
+from dataclasses import replace
+from datetime import time, timedelta
+
+import pytest
+from app.services.verbindungen import (
+    suche_verbindungen,
+    _build_rides,
+    _build_abfahrts_index,
+    _abfahrten_im_fenster,
+    VerbindungHit,
+    MIN_UMSTIEG_MIN,
+    MAX_UMSTIEG_MIN,
+)
+from tests.conftest import make_random_snapshot
+
+
+def _preis_segment(stops, i_from, i_to):
+    """alte Preisberechnung: Summe der Segment-Tarife stops[from+1 .. to]"""
+    p = 0.0
+    for i in range(i_from + 1, i_to + 1):
+        p += float(stops[i].get("tarif") or 0.0)
+    return round(p, 2)
+
+
+def _referenz_umstiege(start_name, ziel_name, datum, ab_zeit, snap):
+    """
+    alte Umstiegs-Suche (verschachtelte Schleife über alle rides) als Referenz,
+    damit der Index-Umbau gegen das alte Verhalten verglichen werden kann
+    """
+    rides = _build_rides(snap)
+    min_buf = timedelta(minutes=MIN_UMSTIEG_MIN)
+    max_buf = timedelta(minutes=MAX_UMSTIEG_MIN)
+    seen_keys = set()
+    hits = []
+    for r1 in rides:
+        s1 = r1["stops"]
+        idx_start_list = r1["idx_map"].get(start_name) or []
+        if not idx_start_list:
+            continue
+        idx_start_1 = min(idx_start_list)
+        dt_start = s1[idx_start_1]["dep"] or s1[idx_start_1]["arr"]
+        if not dt_start or dt_start.date() != datum:
+            continue
+        if ab_zeit and dt_start.time() < ab_zeit:
+            continue
+        for idx_t1 in range(idx_start_1 + 1, len(s1)):
+            t_name = s1[idx_t1]["name"]
+            arr_t1 = s1[idx_t1]["arr"] or s1[idx_t1]["dep"]
+            if not t_name or not arr_t1:
+                continue
+            preis1 = _preis_segment(s1, idx_start_1, idx_t1)
+            for r2 in rides:
+                if r2["id"] == r1["id"]:
+                    continue
+                s2 = r2["stops"]
+                idx_ts2 = r2["idx_map"].get(t_name) or []
+                idx_z2 = r2["idx_map"].get(ziel_name) or []
+                if not idx_ts2 or not idx_z2:
+                    continue
+                for idx_t2 in idx_ts2:
+                    idx_ziel_2 = next((j for j in sorted(idx_z2) if j > idx_t2), None)
+                    if idx_ziel_2 is None:
+                        continue
+                    dep_t2 = s2[idx_t2]["dep"]
+                    if not dep_t2:
+                        continue
+                    wait = dep_t2 - arr_t1
+                    if wait < min_buf or wait > max_buf:
+                        continue
+                    dt_arr_final = s2[idx_ziel_2]["arr"] or s2[idx_ziel_2]["dep"]
+                    if not dt_arr_final:
+                        continue
+                    total = round(preis1 + _preis_segment(s2, idx_t2, idx_ziel_2), 2)
+                    key = (r1["id"], r2["id"], t_name, dt_start)
+                    if key in seen_keys:
+                        continue
+                    seen_keys.add(key)
+                    hits.append(VerbindungHit(
+                        fahrtdurchfuehrung_id=r1["id"], halteplan_id=r1["halteplan_id"], zug_id=r1["zug_id"],
+                        start_name=start_name, ziel_name=ziel_name, abfahrt=dt_start, ankunft=dt_arr_final,
+                        preis=total, umstiege=1, umstieg_bahnhof=t_name, umstieg_ankunft=arr_t1,
+                        umstieg_abfahrt=dep_t2, fahrtdurchfuehrung_id2=r2["id"],
+                        halteplan_id2=r2["halteplan_id"], zug_id2=r2["zug_id"],
+                    ))
+    return hits
+
+
+def test_direkt_und_umstieg(test_snapshot, test_tag):
+    hits = suche_verbindungen("Wien", "Salzburg", test_tag.date(), snapshot=test_snapshot)
+
+    # Fahrt 3 direkt, Fahrt 1 -> Fahrt 2 mit Umstieg in Linz (10 Minuten)
+    assert [(h.fahrtdurchfuehrung_id, h.umstiege) for h in hits] == [(1, 1), (3, 0)]
+    umstieg = hits[0]
+    assert umstieg.umstieg_bahnhof == "Linz"
+    assert umstieg.fahrtdurchfuehrung_id2 == 2
+    assert umstieg.preis == 50.0
+    assert hits[1].preis == 45.0
+
+
+def test_ab_zeit_filtert(test_snapshot, test_tag):
+    hits = suche_verbindungen("Wien", "Salzburg", test_tag.date(), ab_zeit=time(8, 30), snapshot=test_snapshot)
+    assert [h.fahrtdurchfuehrung_id for h in hits] == [3]
+
+
+def test_abfahrten_im_fenster(test_snapshot, test_tag):
+    rides = _build_rides(test_snapshot)
+    index = _build_abfahrts_index(rides)
+
+    fenster = _abfahrten_im_fenster(index, "Linz", test_tag.replace(hour=9, minute=35), test_tag.replace(hour=10))
+    assert [(rides[pos]["id"], idx) for _dep, pos, idx in fenster] == [(2, 0)]
+
+    # Grenzen sind inklusive
+    fenster = _abfahrten_im_fenster(index, "Linz", test_tag.replace(hour=9, minute=40), test_tag.replace(hour=10, minute=30))
+    assert [rides[pos]["id"] for _dep, pos, _idx in fenster] == [2, 3]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3, 4, 5])
+def test_umstiege_identisch_mit_referenz(seed, test_tag):
+    snap = make_random_snapshot(seed, 300, test_tag)
+
+    for start, ziel in [("Wien", "Salzburg"), ("Salzburg", "Wien"), ("Linz", "Passau"), ("Amstetten", "Wels")]:
+        for ab_zeit in (None, time(12, 0)):
+            # teilfahrten gab es in der alten Suche noch nicht
+            neu = [
+                replace(h, teilfahrten=[])
+                for h in suche_verbindungen(start, ziel, test_tag.date(), ab_zeit=ab_zeit, snapshot=snap)
+                if h.umstiege == 1
+            ]
+            alt = _referenz_umstiege(start, ziel, test_tag.date(), ab_zeit, snap)
+            alt.sort(key=lambda x: (x.abfahrt, x.umstiege, x.ankunft))
+            assert neu == alt
+
+
+def test_preis_zwischen(test_snapshot, test_tag):
+    from app.services.fahrplan_cache import build_fahrplan_modell
+    from app.services.verbindungen import preis_zwischen
+
+    fp = build_fahrplan_modell(test_snapshot)
+    assert preis_zwischen(1, "Wien", "Linz", fahrplan=fp) == 30.0
+    assert preis_zwischen(1, "St. Pölten", "Linz", fahrplan=fp) == 20.0
+    assert preis_zwischen(3, "Wien", "Salzburg", abfahrt=test_tag.replace(hour=9), fahrplan=fp) == 45.0
+
+    # falsche Richtung, falsche Abfahrt, unbekannte Fahrt
+    assert preis_zwischen(1, "Linz", "Wien", fahrplan=fp) is None
+    assert preis_zwischen(3, "Wien", "Salzburg", abfahrt=test_tag.replace(hour=8), fahrplan=fp) is None
+    assert preis_zwischen(99, "Wien", "Linz", fahrplan=fp) is None
+
+
+@pytest.mark.parametrize("seed", [6, 7])
+def test_preis_zwischen_wie_suche(seed, test_tag):
+    from app.services.fahrplan_cache import build_fahrplan_modell
+    from app.services.verbindungen import preis_zwischen
+
+    fp = build_fahrplan_modell(make_random_snapshot(seed, 300, test_tag))
+    for h in suche_verbindungen("Wien", "Salzburg", test_tag.date(), fahrplan=fp):
+        summe = sum(
+            preis_zwischen(t.fahrtdurchfuehrung_id, t.von_name, t.nach_name, t.abfahrt, fp)
+            for t in h.teilfahrten
+        )
+        assert round(summe, 2) == h.preis
+
+
+@pytest.mark.parametrize("modus", ["standard", "csa"])
+@pytest.mark.parametrize("limit", [1, 7, 50])
+def test_seiten_ergeben_komplette_suche(modus, limit, test_tag):
+    from app.services.fahrplan_cache import build_fahrplan_modell
+    from app.services.verbindungen import suche_verbindungen_seite
+
+    fp = build_fahrplan_modell(make_random_snapshot(8, 300, test_tag))
+    for start, ziel, ab_zeit in [("Wien", "Salzburg", None), ("Linz", "Passau", time(10, 0))]:
+        alle = suche_verbindungen(start, ziel, test_tag.date(), ab_zeit=ab_zeit, modus=modus, fahrplan=fp)
+
+        gesammelt, cursor = [], None
+        while True:
+            seite = suche_verbindungen_seite(start, ziel, test_tag.date(), ab_zeit=ab_zeit, limit=limit,
+                                             cursor=cursor, modus=modus, fahrplan=fp)
+            assert len(seite.hits) <= limit
+            gesammelt.extend(seite.hits)
+            if seite.next_cursor is None:
+                break
+            cursor = seite.next_cursor
+
+        assert gesammelt == alle
+
+
+def test_seite_hoert_frueh_auf(test_tag, monkeypatch):
+    """für die nächsten 5 Verbindungen werden nicht alle Abfahrten am Start angeschaut"""
+    import app.services.verbindungen as verbindungen
+    from app.services.fahrplan_cache import build_fahrplan_modell
+    from app.services.verbindungen import suche_verbindungen_seite
+
+    fp = build_fahrplan_modell(make_random_snapshot(9, 2000, test_tag))
+    gelesen = []
+    original = verbindungen._standard_gruppen
+
+    def zaehlen(*args, **kwargs):
+        for gruppe in original(*args, **kwargs):
+            gelesen.append(gruppe)
+            yield gruppe
+
+    monkeypatch.setattr(verbindungen, "_standard_gruppen", zaehlen)
+    seite = suche_verbindungen_seite("Wien", "Salzburg", test_tag.date(), limit=5, fahrplan=fp)
+    erste_seite = len(gelesen)
+    gelesen.clear()
+    suche_verbindungen("Wien", "Salzburg", test_tag.date(), fahrplan=fp)
+
+    assert len(seite.hits) == 5 and seite.next_cursor
+    assert erste_seite < len(gelesen) / 10
+
+
+def test_kaputter_cursor(test_snapshot, test_tag):
+    from app.services.verbindungen import suche_verbindungen_seite
+
+    with pytest.raises(ValueError):
+        suche_verbindungen_seite("Wien", "Linz", test_tag.date(), cursor="kaputt", snapshot=test_snapshot)
@@ -0,0 +1,87 @@
+import random
+from datetime import time
+
+import pytest
+from app.services.fahrplan_cache import build_fahrplan_modell
+from app.services.verbindungen import suche_verbindungen_seite
+from app.services.verbindungen_cache import VerbindungenCache
+from tests.conftest import make_fahrt, make_random_snapshot
+
+
+@pytest.fixture
+def fahrplan(test_tag):
+    return build_fahrplan_modell(make_random_snapshot(11, 400, test_tag), version="v1")
+
+
+def test_cache_wie_direkte_suche(fahrplan, test_tag):
+    cache = VerbindungenCache()
+    rnd = random.Random(1)
+    for _ in range(60):
+        start, ziel = rnd.choice([("Wien", "Salzburg"), ("Linz", "Passau"), ("Wels", "Wien")])
+        ab = rnd.choice([None, time(rnd.randrange(24), rnd.randrange(60))])
+        limit = rnd.choice([1, 5, 20])
+
+        direkt = suche_verbindungen_seite(start, ziel, test_tag.date(), ab_zeit=ab, limit=limit, fahrplan=fahrplan)
+        aus_cache = cache.seite(fahrplan, start, ziel, test_tag.date(), ab, limit, None, "standard")
+        assert aus_cache.hits == direkt.hits
+
+        # weiterblättern mit dem Cursor aus dem Cache
+        if aus_cache.next_cursor:
+            direkt2 = suche_verbindungen_seite(start, ziel, test_tag.date(), ab_zeit=ab, limit=limit,
+                                               cursor=aus_cache.next_cursor, fahrplan=fahrplan)
+            assert cache.seite(fahrplan, start, ziel, test_tag.date(), ab, limit,
+                               aus_cache.next_cursor, "standard").hits == direkt2.hits
+
+    assert cache.stats["hits"] > 0
+
+
+def test_gleicher_bucket_ein_eintrag(fahrplan, test_tag):
+    cache = VerbindungenCache()
+    for minute in (0, 3, 7, 14):
+        cache.seite(fahrplan, "Wien", "Salzburg", test_tag.date(), time(8, minute), 5, None, "standard")
+    cache.seite(fahrplan, "Wien", "Salzburg", test_tag.date(), time(8, 15), 5, None, "standard")
+    assert cache.stats["misses"] == 2
+    assert cache.stats["hits"] == 3
+
+
+def test_neue_fahrplan_version_leert_cache(fahrplan, test_tag):
+    cache = VerbindungenCache()
+    t = test_tag
+    cache.seite(fahrplan, "Wien", "Linz", t.date(), time(8), 5, None, "standard")
+    assert cache.stats_dict()["eintraege"] == 1
+
+    neu = build_fahrplan_modell({"items": [
+        make_fahrt(999, 1, 1, [("Wien", t.replace(hour=8, minute=1), 0.0), ("Linz", t.replace(hour=9), 9.0)]),
+    ]}, version="v2")
+    seite = cache.seite(neu, "Wien", "Linz", t.date(), time(8), 5, None, "standard")
+    assert [h.fahrtdurchfuehrung_id for h in seite.hits] == [999]
+    assert cache.stats["geleert"] == 1
+    assert cache.stats_dict()["eintraege"] == 1
+
+
+def test_lru_und_ttl(fahrplan, test_tag):
+    cache = VerbindungenCache(groesse=2)
+    for stunde in (6, 7, 8):
+        cache.seite(fahrplan, "Wien", "Linz", test_tag.date(), time(stunde), 5, None, "standard")
+    assert cache.stats_dict()["eintraege"] == 2
+    # 06:00 ist rausgefallen
+    cache.seite(fahrplan, "Wien", "Linz", test_tag.date(), time(6), 5, None, "standard")
+    assert cache.stats["misses"] == 4
+
+    cache.ttl_sek = -1
+    cache.seite(fahrplan, "Wien", "Linz", test_tag.date(), time(6), 5, None, "standard")
+    assert cache.stats["misses"] == 5
+
+
+def test_api_nutzt_cache(app, client, monkeypatch, fahrplan, test_tag):
+    import app.routes as routes
+    import app.services.verbindungen_cache as verbindungen_cache
+
+    monkeypatch.setattr(routes, "get_fahrplan", lambda: fahrplan)
+    monkeypatch.setattr(verbindungen_cache, "_cache", VerbindungenCache())
+    params = {"start": "Wien", "ziel": "Salzburg", "datum": test_tag.date().isoformat(), "ab": "08:05", "limit": 3}
+
+    a = client.get("/api/verbindungen", query_string=params).get_json()
+    b = client.get("/api/verbindungen", query_string={**params, "ab": "08:10"}).get_json()
+    assert a["items"] and all(v["abfahrt"] >= test_tag.replace(hour=8, minute=10).isoformat() for v in b["items"])
+    assert verbindungen_cache.verbindungen_cache_stats()["hits"] == 1
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+import pytest
+from app.services.verbindungen import suche_verbindungen
+from app.services.verbindungen_csa import suche_verbindungen_csa
+from tests.conftest import make_fahrt, make_random_snapshot
+
+
+def _dominiert(a, b) -> bool:
+    return (
+        a.abfahrt >= b.abfahrt
+        and a.ankunft <= b.ankunft
+        and a.umstiege <= b.umstiege
+        and a.preis <= b.preis + 1e-6
+    )
+
+
+def test_csa_direkt_und_umstieg(test_snapshot, test_tag):
+    hits = suche_verbindungen("Wien", "Salzburg", test_tag.date(), snapshot=test_snapshot, modus="csa")
+
+    # beide Verbindungen sind Pareto-optimal (Umstieg früher, Direkt später + billiger)
+    assert [(h.fahrtdurchfuehrung_id, h.umstiege) for h in hits] == [(1, 1), (3, 0)]
+    umstieg = hits[0]
+    assert umstieg.umstieg_bahnhof == "Linz"
+    assert umstieg.fahrtdurchfuehrung_id2 == 2
+    assert umstieg.preis == 50.0
+    assert [t.fahrtdurchfuehrung_id for t in umstieg.teilfahrten] == [1, 2]
+
+
+def test_csa_zwei_umstiege(test_tag):
+    t = test_tag
+    snap = {"items": [
+        make_fahrt(1, 1, 1, [("Wien", t.replace(hour=8), 0.0), ("St. Pölten", t.replace(hour=8, minute=30), 10.0)]),
+        make_fahrt(2, 2, 2, [("St. Pölten", t.replace(hour=8, minute=40), 0.0), ("Linz", t.replace(hour=9, minute=30), 12.0)]),
+        make_fahrt(3, 3, 3, [("Linz", t.replace(hour=9, minute=45), 0.0), ("Salzburg", t.replace(hour=11), 14.0)]),
+    ]}
+
+    assert suche_verbindungen_csa("Wien", "Salzburg", t.date(), snapshot=snap, max_umstiege=1) == []
+
+    hits = suche_verbindungen_csa("Wien", "Salzburg", t.date(), snapshot=snap, max_umstiege=2)
+    assert len(hits) == 1
+    h = hits[0]
+    assert h.umstiege == 2
+    assert [x.fahrtdurchfuehrung_id for x in h.teilfahrten] == [1, 2, 3]
+    assert [x.von_name for x in h.teilfahrten] == ["Wien", "St. Pölten", "Linz"]
+    assert h.preis == 36.0
+    assert h.ankunft == t.replace(hour=11)
+
+
+def test_csa_umstiegsfenster(test_tag):
+    t = test_tag
+    snap = {"items": [
+        make_fahrt(1, 1, 1, [("Wien", t.replace(hour=8), 0.0), ("Linz", t.replace(hour=9), 10.0)]),
+        # zu knapp (3 min) und zu lang (45 min)
+        make_fahrt(2, 2, 2, [("Linz", t.replace(hour=9, minute=3), 0.0), ("Wels", t.replace(hour=9, minute=30), 5.0)]),
+        make_fahrt(3, 3, 3, [("Linz", t.replace(hour=9, minute=45), 0.0), ("Wels", t.replace(hour=10), 5.0)]),
+    ]}
+    assert suche_verbindungen_csa("Wien", "Wels", t.date(), snapshot=snap) == []
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_csa_deckt_standard_suche_ab(seed, test_tag):
+    snap = make_random_snapshot(seed, 200, test_tag)
+
+    for start, ziel in [("Wien", "Salzburg"), ("Linz", "Passau"), ("Wels", "Amstetten")]:
+        standard = suche_verbindungen(start, ziel, test_tag.date(), snapshot=snap)
+        csa = suche_verbindungen(start, ziel, test_tag.date(), snapshot=snap, modus="csa", max_umstiege=1)
+
+        # jede Standard-Verbindung ist durch eine CSA-Verbindung (mind. gleich gut) abgedeckt
+        for h in standard:
+            assert any(_dominiert(c, h) for c in csa), h
+
+        # CSA-Ergebnisse dominieren sich nicht gegenseitig
+        for a in csa:
+            assert not any(b is not a and _dominiert(b, a) and
+                           (b.abfahrt, b.ankunft, b.umstiege, b.preis) != (a.abfahrt, a.ankunft, a.umstiege, a.preis)
+                           for b in csa)
+
+        for c in csa:
+            assert c.umstiege == len(c.teilfahrten) - 1 <= 1
+            for x, y in zip(c.teilfahrten, c.teilfahrten[1:]):
+                assert timedelta(minutes=5) <= y.abfahrt - x.ankunft <= timedelta(minutes=30)
+
+
+def test_unbekannter_modus(test_snapshot, test_tag):
+    with pytest.raises(ValueError):
+        suche_verbindungen("Wien", "Linz", test_tag.date(), snapshot=test_snapshot, modus="xyz")
@@ -0,0 +1,106 @@
+import time
+from datetime import datetime
+
+import pytest
+import app.routes as routes
+from app.services.fahrplan_cache import build_fahrplan_modell
+from app.services.warnungen_index import build_warnungs_index
+from tests.conftest import make_fahrt
+
+TAG = datetime(2030, 5, 6)
+VERZOEGERUNG = 0.3
+
+
+@pytest.fixture
+def langsame_services(monkeypatch):
+    """jeder Upstream braucht VERZOEGERUNG Sekunden"""
+    fp = build_fahrplan_modell({"items": [
+        make_fahrt(1, 10, 100, [("Wien", TAG.replace(hour=8), 0.0), ("Linz", TAG.replace(hour=9, minute=30), 30.0)]),
+    ]})
+    aufrufe = []
+
+    def langsam(name, wert):
+        def f():
+            aufrufe.append(name)
+            time.sleep(VERZOEGERUNG)
+            return wert
+        return f
+
+    monkeypatch.setattr(routes, "strecken_bahnhoefe", langsam("bahnhoefe", {"items": [{"name": "Wien"}, {"name": "Linz"}]}))
+    monkeypatch.setattr(routes, "get_warnungs_index", langsam("warnungen", build_warnungs_index([])))
+    monkeypatch.setattr(routes, "get_fahrplan", langsam("fahrplan", fp))
+    return aufrufe
+
+
+def _suchen(client):
+    return client.post("/verbindungssuche", data={
+        "startbahnhof": "Wien", "zielbahnhof": "Linz", "datum": TAG.date().isoformat(),
+    })
+
+
+def test_upstreams_laufen_parallel(client, eingeloggt, langsame_services):
+    t0 = time.perf_counter()
+    r = _suchen(client)
+    dauer = time.perf_counter() - t0
+
+    assert r.status_code == 200
+    assert "06.05.2030 08:00" in r.get_data(as_text=True)
+    assert sorted(langsame_services) == ["bahnhoefe", "fahrplan", "warnungen"]
+    # hintereinander wären es 3 * VERZOEGERUNG
+    assert dauer < 2 * VERZOEGERUNG
+
+
+def test_frist_ueberschritten(app, client, eingeloggt, langsame_services, monkeypatch):
+    app.config["VERBINDUNGSSUCHE_FRIST_SEK"] = VERZOEGERUNG / 3
+    monkeypatch.setattr(routes, "strecken_bahnhoefe", lambda: {"items": [{"name": "Wien"}, {"name": "Linz"}]})
+
+    t0 = time.perf_counter()
+    r = _suchen(client)
+    assert time.perf_counter() - t0 < VERZOEGERUNG
+    assert "Fahrplan-Service nicht erreichbar" in r.get_data(as_text=True)
+
+
+def test_warnungen_fehler_ist_kein_abbruch(client, eingeloggt, langsame_services, monkeypatch):
+    def kaputt():
+        raise ConnectionError("Strecken down")
+
+    monkeypatch.setattr(routes, "get_warnungs_index", kaputt)
+    r = _suchen(client)
+    assert "06.05.2030 08:00" in r.get_data(as_text=True)
+
+
+def test_api_verbindungen_seitenweise(client, monkeypatch, test_tag):
+    from tests.conftest import make_random_snapshot
+
+    fp = build_fahrplan_modell(make_random_snapshot(3, 200, test_tag))
+    monkeypatch.setattr(routes, "get_fahrplan", lambda: fp)
+
+    params = {"start": "Wien", "ziel": "Salzburg", "datum": test_tag.date().isoformat(), "ab": "06:00", "limit": 4}
+    erste = client.get("/api/verbindungen", query_string=params).get_json()
+    assert len(erste["items"]) == 4
+    abfahrten = [v["abfahrt"] for v in erste["items"]]
+    assert abfahrten == sorted(abfahrten) and abfahrten[0] >= test_tag.replace(hour=6).isoformat()
+
+    zweite = client.get("/api/verbindungen", query_string={**params, "cursor": erste["next_cursor"]}).get_json()
+    assert zweite["items"][0]["abfahrt"] >= abfahrten[-1]
+    assert not [v for v in zweite["items"] if v in erste["items"]]
+
+
+@pytest.mark.parametrize("query", [
+    {"start": "Wien", "datum": "2030-05-06"},
+    {"start": "Wien", "ziel": "Linz", "datum": "morgen"},
+    {"start": "Wien", "ziel": "Linz", "datum": "2030-05-06", "cursor": "kaputt"},
+])
+def test_api_verbindungen_fehler(client, query, monkeypatch):
+    monkeypatch.setattr(routes, "get_fahrplan", lambda: build_fahrplan_modell({"items": []}))
+    assert client.get("/api/verbindungen", query_string=query).status_code == 400
+
+
+def test_api_verbindungen_fahrplan_down(client, monkeypatch):
+    def kaputt():
+        raise ConnectionError("Fahrplan down")
+
+    monkeypatch.setattr(routes, "get_fahrplan", kaputt)
+    r = client.get("/api/verbindungen", query_string={"start": "Wien", "ziel": "Linz", "datum": "2030-05-06"})
+    assert r.status_code == 503
+    assert r.get_json() == {"error": "Fahrplan nicht erreichbar"}
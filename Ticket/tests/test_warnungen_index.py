@@ -0,0 +1,155 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import app.services.warnungen_index as warnungen_index
+from app.routes import _slice_between, warnungen_fuer_verbindung
+from app.services.external_clients import parse_gmt_dt
+from app.services.warnungen_index import build_warnungs_index, get_warnungs_index
+from tests.conftest import BAHNHOEFE
+
+T0 = datetime(2026, 3, 2)
+
+
+# --- alte Logik als Referenz (vorher in routes.py) ---
+
+def _alt_slice_between(names, start_name, end_name):
+    starts = [i for i, n in enumerate(names) if n == start_name]
+    ends = [j for j, n in enumerate(names) if n == end_name]
+    best = None
+    for i in starts:
+        for j in ends:
+            if j > i and (best is None or (j - i) < (best[1] - best[0])):
+                best = (i, j)
+    return names[best[0]:best[1] + 1] if best else []
+
+
+def _alt_warnungen(warn_items, seg_pairs, travel_start, travel_end):
+    def norm(dt):
+        return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt and dt.tzinfo else dt
+
+    out = []
+    for w in warn_items:
+        ws = norm(parse_gmt_dt(w.get("startZeit")))
+        we = norm(parse_gmt_dt(w.get("endZeit"))) or datetime.max
+        if ws is None or not (ws <= travel_end and travel_start <= we):
+            continue
+        abschnitte = w.get("abschnitte") or []
+        if abschnitte:
+            if not any(
+                a.get("vonName") and a.get("nachName")
+                and ((a["vonName"], a["nachName"]) in seg_pairs or (a["nachName"], a["vonName"]) in seg_pairs)
+                for a in abschnitte
+            ):
+                continue
+        out.append(w)
+    return out
+
+
+def _gmt(dt):
+    return format_datetime(dt.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def make_warnungen(seed: int, n: int) -> list[dict]:
+    rnd = random.Random(seed)
+    items = []
+    for k in range(n):
+        start = T0 + timedelta(minutes=rnd.randrange(0, 3 * 24 * 60))
+        w = {"id": k, "startZeit": _gmt(start)}
+        r = rnd.random()
+        if r < 0.8:
+            w["endZeit"] = _gmt(start + timedelta(minutes=rnd.randrange(10, 600)))
+        elif r < 0.9:
+            w["startZeit"] = None
+        if rnd.random() < 0.85:
+            w["abschnitte"] = []
+            for _ in range(rnd.randint(1, 3)):
+                a, b = rnd.sample(BAHNHOEFE, 2)
+                w["abschnitte"].append({"vonName": a, "nachName": b} if rnd.random() < 0.95 else {"vonName": a})
+        items.append(w)
+    return items
+
+
+def test_index_wie_vorher():
+    items = make_warnungen(1, 300)
+    index = build_warnungs_index(items)
+    rnd = random.Random(2)
+    for _ in range(500):
+        seq = rnd.sample(BAHNHOEFE, rnd.randint(2, 5))
+        pairs = {(seq[i], seq[i + 1]) for i in range(len(seq) - 1)}
+        von = T0 + timedelta(minutes=rnd.randrange(-120, 3 * 24 * 60))
+        bis = von + timedelta(minutes=rnd.randrange(10, 400))
+        assert index.passende(pairs, von, bis) == _alt_warnungen(items, pairs, von, bis)
+
+
+def test_slice_between_wie_vorher():
+    rnd = random.Random(3)
+    for _ in range(500):
+        names = [rnd.choice(BAHNHOEFE[:4]) for _ in range(rnd.randint(0, 10))]
+        a, b = rnd.choice(BAHNHOEFE[:4]), rnd.choice(BAHNHOEFE[:4])
+        assert _slice_between(names, a, b) == _alt_slice_between(names, a, b)
+
+
+def test_warnungen_fuer_verbindung_mit_umstieg():
+    items = [
+        {"id": 1, "startZeit": _gmt(T0), "endZeit": _gmt(T0 + timedelta(hours=24)),
+         "abschnitte": [{"vonName": "Wels", "nachName": "Linz"}]},
+        {"id": 2, "startZeit": _gmt(T0), "abschnitte": [{"vonName": "Wien", "nachName": "Passau"}]},
+        {"id": 3, "startZeit": _gmt(T0 + timedelta(hours=30))},
+    ]
+    snapshot_map = {1: ["Wien", "St. Pölten", "Linz"], 2: ["Linz", "Wels", "Salzburg"]}
+    v = {
+        "fahrt_id": 1, "fahrt_id2": 2, "anzahl_umstiege": 1, "umstieg_bahnhof": "Linz",
+        "start_halt": "Wien", "ziel_halt": "Salzburg",
+        "abfahrt": T0.replace(hour=8), "ankunft": T0.replace(hour=11),
+    }
+    assert [w["id"] for w in warnungen_fuer_verbindung(build_warnungs_index(items), snapshot_map, v)] == [1]
+
+
+def test_index_cache(app, monkeypatch):
+    aufrufe = []
+
+    def fake():
+        aufrufe.append(1)
+        if len(aufrufe) > 1:
+            raise ConnectionError("Strecken down")
+        return {"items": make_warnungen(4, 5)}
+
+    monkeypatch.setattr(warnungen_index, "strecken_warnungen", fake)
+    warnungen_index.invalidate_warnungen()
+    app.config["WARNUNGEN_CACHE_TTL_SEK"] = 60
+    with app.app_context():
+        a = get_warnungs_index()
+        assert get_warnungs_index() is a
+        assert len(aufrufe) == 1
+
+        # abgelaufen + Strecken down: alter Index bleibt
+        app.config["WARNUNGEN_CACHE_TTL_SEK"] = 0
+        assert get_warnungs_index() is a
+        assert len(aufrufe) == 2
+    warnungen_index.invalidate_warnungen()
+
+
+def test_benchmark_warnungen():
+    """300 Warnungen x 150 Treffer: Index gegen die alte Schleife"""
+    items = make_warnungen(5, 300)
+    rnd = random.Random(6)
+    anfragen = []
+    for _ in range(150):
+        seq = rnd.sample(BAHNHOEFE, 4)
+        von = T0 + timedelta(minutes=rnd.randrange(0, 3 * 24 * 60))
+        anfragen.append(({(seq[i], seq[i + 1]) for i in range(3)}, von, von + timedelta(hours=2)))
+
+    t0 = time.perf_counter()
+    alt = [_alt_warnungen(items, p, von, bis) for p, von, bis in anfragen]
+    t_alt = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    index = build_warnungs_index(items)
+    neu = [index.passende(p, von, bis) for p, von, bis in anfragen]
+    t_neu = time.perf_counter() - t0
+
+    print(f"\nWarnungen 300 x 150 Treffer: alt {t_alt * 1000:.1f} ms, Index (inkl. Aufbau) {t_neu * 1000:.1f} ms")
+    assert neu == alt
+    assert t_neu < t_alt